@@ -0,0 +1,165 @@
+import os
+import csv
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from interpreter import Interpreter
+import optimizer
+import vector
+
+# Runs one parsed program over many input records, e.g. 03_arith.lol over a
+# CSV of (x, y) pairs.
+#
+# A record is a sequence of strings, the answers to the program's GIMMEHs in
+# order (GIMMEHs past the end of the record get "", like stdin at EOF). Each
+# record's result is (output, error): the VISIBLE lines it printed and the
+# message of the error that ended it, or None.
+#
+# The program is optimized once here and compiled once per worker process.
+# Records go to the workers in chunks of chunk_size so the pickling and IPC
+# cost is paid per chunk rather than per record, and results come back in
+# record order. At most AHEAD chunks per worker are in flight, so a large CSV
+# is never held in memory whole.
+#
+# vectorize=True runs straight-line programs through vector.py (numpy), one
+# numpy pass per chunk instead of one run per record; chunks are then
+# VECTOR_CHUNK_SIZE records. Other programs, or when numpy isn't installed,
+# run as usual.
+
+CHUNK_SIZE = 256
+VECTOR_CHUNK_SIZE = 1 << 16
+AHEAD = 2
+
+class RecordSink:
+    # output/input of the worker's Interpreter, pointed at one record at a time
+    def __init__(self):
+        self.lines = []
+        self.answers = iter(())
+
+    def start(self, record):
+        self.lines = []
+        self.answers = iter(record)
+
+    def output(self, text):
+        self.lines.append(text)
+
+    def input(self, name):
+        return next(self.answers, "")
+
+class RecordRunner:
+    def __init__(self, ast, symbols, engine="closures", vectorize=False, budget=None):
+        self.sink = RecordSink()
+        # optimizing already happened in run_batch
+        lol = Interpreter(output=self.sink.output, input=self.sink.input, engine=engine, optimize=False, budget=budget)
+        self.program = lol.prepare(ast, symbols)
+        self.vector = None
+        # vector.py doesn't measure YARNs, and a straight-line program has
+        # no steps to count or time to run out of
+        if vectorize and use_vector(ast) and (budget is None or budget.yarn is None):
+            self.vector = vector.VectorProgram(ast, symbols)
+
+    def run(self, record):
+        self.sink.start(record)
+        try:
+            self.program()
+        except Exception as e:
+            return self.sink.lines, str(e)
+        return self.sink.lines, None
+
+    def run_chunk(self, records):
+        if self.vector is not None:
+            # records it can't vectorize come back through self.run
+            return self.vector.run_chunk(records, self.run)
+        return [self.run(record) for record in records]
+
+def use_vector(ast):
+    return vector.available() and vector.vectorizable(ast)
+
+# ---- worker process side, one RecordRunner per process
+worker = None
+
+def init_worker(flat_ast, symbols, engine, vectorize, budget):
+    global worker
+    worker = RecordRunner(unflatten(*flat_ast), symbols, engine, vectorize, budget)
+
+def run_chunk(records):
+    return worker.run_chunk(records)
+
+# ---- the AST on its way to the workers
+# pickle recurses into nested tuples, so a deeply nested expression can't be
+# sent as it is. It goes as two flat lists instead: the tree in postorder,
+# -1 for a non-tuple item (in atoms, in the same order) and n for a tuple
+# made of the n items before it
+def flatten(tup):
+    shape = []
+    atoms = []
+    stack = [(tup, False)]
+    while stack:
+        item, done = stack.pop()
+        if done:
+            shape.append(len(item))
+        elif type(item) is tuple:
+            stack.append((item, True))
+            stack.extend((child, False) for child in reversed(item))
+        else:
+            shape.append(-1)
+            atoms.append(item)
+    return shape, atoms
+
+def unflatten(shape, atoms):
+    values = []
+    atoms = iter(atoms)
+    for n in shape:
+        if n < 0:
+            values.append(next(atoms))
+        else:
+            node = tuple(values[len(values) - n:])
+            del values[len(values) - n:]
+            values.append(node)
+    return values[0]
+
+# ---- parent side
+def chunked(records, size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def run_batch(ast, symbols, records, workers=None, chunk_size=None, engine="closures", optimize=True, vectorize=False,
+              budget=None):
+    # generator of (output, error), one per record and in the same order.
+    # workers=None uses every core, workers=1 runs everything in this process;
+    # budget (a lol_runtime.Budget) limits each record's run
+    if optimize:
+        ast, eliminated = optimizer.optimize(ast, symbols, budget.yarn if budget is not None else None)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    # compile errors come out here, before any worker is started
+    runner = RecordRunner(ast, symbols, engine, vectorize, budget)
+    if chunk_size is None:
+        chunk_size = VECTOR_CHUNK_SIZE if runner.vector is not None else CHUNK_SIZE
+    chunks = chunked(records, chunk_size)
+
+    if workers <= 1:
+        for chunk in chunks:
+            yield from runner.run_chunk(chunk)
+        return
+
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(flatten(ast), symbols, engine, vectorize, budget)) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(run_chunk, chunk))
+            if len(pending) >= workers * AHEAD:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+def read_records(f, skip_header=False):
+    # one record per CSV row
+    rows = csv.reader(f)
+    if skip_header:
+        next(rows, None)
+    return rows
@@ -0,0 +1,158 @@
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import lol_lexer as lexer
+from dataclasses import dataclass
+from lol_lexer import MASTER_RE, ARITH_OPS, COMPARE_OPS, TYPECAST_OPS
+
+# Tokens per second of lol_lexer.clean_lex against the lexer it replaced
+# (re.sub on every keyword, then the if/elif chain over the finished list),
+# and the memory each one's token list takes.
+#
+#   python benchmarks/bench_lexer.py [megabytes]
+
+# one chunk of a generated program, repeated until the source is big enough
+CHUNK = """    I HAS A var{n} ITZ {n}
+    var{n} R SUM OF PRODUKT OF var{n} AN 2 AN QUOSHUNT OF 10 AN 3.5
+    BTW keep it busy
+    IM IN YR loop{n} UPPIN YR var{n} TIL BOTH SAEM var{n} AN 10
+        VISIBLE "value: " var{n} + SMOOSH "a" AN "b" MKAY
+        BOTH OF WIN AN EITHER OF FAIL AN NOT WIN
+        DIFFRINT var{n} AN BIGGR OF var{n} AN 4
+    IM OUTTA YR loop{n}
+    var{n} IS NOW A YARN
+    GIMMEH var{n}
+"""
+
+def generate(megabytes):
+    parts = ["HAI\n"]
+    size = 0
+    n = 0
+    while size < megabytes * 1024 * 1024:
+        chunk = CHUNK.format(n=n)
+        parts.append(chunk)
+        size += len(chunk)
+        n += 1
+    parts.append("KTHXBYE\n")
+    return "".join(parts)
+
+# ---- the lexer as it was before keywords were classified inside lex(),
+# with the Token it used (a plain dataclass, __dict__ and all)
+@dataclass
+class Token:
+    type: str
+    lexeme: str
+    line: int
+    col: int
+
+def legacy_lex(text):
+    line = 1
+    col_start_of_line = 0
+    for m in MASTER_RE.finditer(text):
+        type = m.lastgroup
+        lexeme = m.group()
+        if type == 'NEWLINE':
+            line += 1
+            col_start_of_line = m.end()
+            continue
+        if type in ('SKIP', 'LINE_COMMENT', 'BLOCK_COMMENT'):
+            continue
+        if type == 'MISMATCH':
+            c = m.start() - col_start_of_line + 1
+            yield Token('ERROR', lexeme, line, c)
+            continue
+        col = m.start() - col_start_of_line + 1
+        if type == 'KEYWORD':
+            lexeme = re.sub(r'\s+', ' ', lexeme)
+        yield Token(type, lexeme, line, col)
+
+def legacy_clean_lex(src):
+    tokens = list(legacy_lex(src))
+    for t in tokens:
+        k = t.lexeme
+        if t.type == 'KEYWORD':
+            if k == "HAI": t.type = "CODE_START"
+            elif k == "KTHXBYE": t.type = "CODE_END"
+            elif k == "WAZZUP": t.type = "VARLIST_START"
+            elif k == "BUHBYE": t.type = "VARLIST_END"
+            elif k == "I HAS A": t.type = "VAR_DECL"
+            elif k == "ITZ": t.type = "VAR_ASSIGN_ITZ"
+            elif k == "GIMMEH": t.type = "GIMMEH"
+            elif k == "VISIBLE": t.type = "VISIBLE"
+            elif k == "AN": t.type = "AN"
+            elif k in ARITH_OPS: t.type = ARITH_OPS[k]
+            elif k in COMPARE_OPS: t.type = COMPARE_OPS[k]
+            elif k == "+": t.type = "+"
+            elif k == "SMOOSH": t.type = "SMOOSH"
+            elif k == "R": t.type = "R"
+            elif k in TYPECAST_OPS: t.type = TYPECAST_OPS[k]
+            elif k == "MKAY": t.type = "MKAY"
+            elif k == "O RLY?": t.type = "O_RLY?"
+            elif k == "OIC": t.type = "OIC"
+            elif k == "YA RLY": t.type = "YA_RLY"
+            elif k == "NO WAI": t.type = "NO_WAI"
+            elif k == "WTF?": t.type = "WTF?"
+            elif k == "OMG": t.type = "OMG"
+            elif k == "OMGWTF": t.type = "OMGWTF"
+            elif k == "HOW IZ I": t.type = "HOW_IZ_I"
+            elif k == "IF U SAY SO": t.type = "IF_U_SAY_SO"
+            elif k == "FOUND YR": t.type = "FOUND_YR"
+            elif k == "GTFO": t.type = "GTFO"
+            elif k == "I IZ": t.type = "I_IZ"
+            elif k == "IM IN YR": t.type = "IM_IN_YR"
+            elif k == "IM OUTTA YR": t.type = "IM_OUTTA_YR"
+            elif k == "TIL": t.type = "TIL"
+            elif k == "WILE": t.type = "WILE"
+            elif k == "YR": t.type = "YR"
+            elif k == "UPPIN": t.type = "UPPIN"
+            elif k == "NERFIN": t.type = "NERFIN"
+    return tokens
+
+def best_of(func, src, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        tokens = func(src)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, tokens
+
+def held_memory(func, src):
+    # bytes still allocated once func's result is built
+    tracemalloc.start()
+    tokens = func(src)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del tokens
+    return size
+
+def main():
+    megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 4
+    src = generate(megabytes)
+    print(f"source: {len(src) / 1024 / 1024:.1f} MB")
+
+    old_time, old_tokens = best_of(legacy_clean_lex, src)
+    new_time, new_tokens = best_of(lexer.clean_lex, src)
+    if [(t.type, t.lexeme, t.line, t.col) for t in old_tokens] != \
+       [(t.type, t.lexeme, t.line, t.col) for t in new_tokens]:
+        sys.exit("token streams differ")
+
+    count = len(new_tokens)
+    print(f"tokens: {count}")
+    print(f"before: {old_time:.3f}s  {count / old_time:,.0f} tokens/s")
+    print(f"after:  {new_time:.3f}s  {count / new_time:,.0f} tokens/s")
+    print(f"speedup: {old_time / new_time:.2f}x")
+
+    old_size = held_memory(legacy_clean_lex, src)
+    new_size = held_memory(lexer.clean_lex, src)
+    print(f"memory before: {old_size / 1024 / 1024:.1f} MB  {old_size / count:.0f} bytes/token")
+    print(f"memory after:  {new_size / 1024 / 1024:.1f} MB  {new_size / count:.0f} bytes/token")
+    print(f"memory ratio: {old_size / new_size:.1f}x")
+
+if __name__ == '__main__':
+    main()
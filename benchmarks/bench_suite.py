@@ -0,0 +1,219 @@
+import io
+import os
+import sys
+import glob
+import json
+import time
+import platform
+import argparse
+from datetime import datetime, timezone
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+import lol_lexer as lexer
+from interpreter import Interpreter, ENGINES, parse_file
+
+# Times lexing, parsing, compiling and running, separately, for every program
+# in project-testcases/ and a few generated stress programs, on both engines.
+#
+#   python benchmarks/bench_suite.py [--json out.json] [--baseline FILE] [--save-baseline]
+#                                    [--repeat N] [--quick] [--only NAME]
+#
+# lex and parse time what `lolterpreter run` does with a file: lex is the
+# streaming lexer on its own, parse is parse_file, the parser taking tokens
+# from that lexer as it goes (so it includes lexing).
+#
+# Every timing is the best of --repeat runs. Results are compared against the
+# stored baseline (benchmarks/baseline.json unless --baseline says otherwise),
+# and the exit status is 1 if anything got more than --threshold slower.
+# No baseline is shipped, timings only compare on the machine they were made
+# on: --save-baseline stores this run as the baseline, do that on the machine
+# the releases are compared on. Without one nothing is compared.
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+TESTCASES = os.path.join(ROOT, "project-testcases")
+# answers for the testcases' GIMMEHs, used round robin
+ANSWERS = ("7", "3")
+# timings under this are mostly noise, they're never reported as regressions
+MIN_TIME = 0.002
+
+# ---- generated stress programs, sizes are (full, --quick)
+def nested_sum(depth):
+    # VISIBLE SUM OF x AN SUM OF x AN ... x, right nested
+    return ("HAI\nWAZZUP\nI HAS A x ITZ 1\nBUHBYE\n"
+            f"VISIBLE {'SUM OF x AN ' * depth}x\n"
+            "KTHXBYE\n")
+
+def smoosh_chain(length):
+    # one SMOOSH with length operands (this parser's SMOOSH takes no MKAY)
+    operands = " AN ".join(["x"] * length)
+    return ("HAI\nWAZZUP\nI HAS A x ITZ \"lol\"\nBUHBYE\n"
+            f"VISIBLE SMOOSH {operands}\n"
+            "KTHXBYE\n")
+
+def smoosh_report(lines):
+    # a report built up one SMOOSH at a time, then printed
+    return ("HAI\nWAZZUP\nI HAS A i ITZ 0\nI HAS A report ITZ \"\"\nBUHBYE\n"
+            f"IM IN YR loop UPPIN YR i TIL BOTH SAEM i AN {lines}\n"
+            "    report R SMOOSH report AN \"row \" AN i AN \":\"\n"
+            "IM OUTTA YR loop\n"
+            "VISIBLE report\n"
+            "KTHXBYE\n")
+
+def counting_loop(iterations):
+    return ("HAI\nWAZZUP\nI HAS A i ITZ 0\nI HAS A acc ITZ 0\nBUHBYE\n"
+            f"IM IN YR loop UPPIN YR i TIL BOTH SAEM i AN {iterations}\n"
+            "    acc R SUM OF acc AN i\n"
+            "IM OUTTA YR loop\n"
+            "VISIBLE acc\n"
+            "KTHXBYE\n")
+
+def wide_wazzup(count):
+    declarations = "".join(f"I HAS A var{n} ITZ {n}\n" for n in range(count))
+    return ("HAI\nWAZZUP\n" + declarations + "BUHBYE\n"
+            f"VISIBLE SUM OF var0 AN var{count - 1}\n"
+            "KTHXBYE\n")
+
+STRESS = {
+    "nested_sum":    (nested_sum, 50000, 2000),
+    "smoosh_chain":  (smoosh_chain, 10000, 1000),
+    "smoosh_report": (smoosh_report, 100000, 5000),
+    "counting_loop": (counting_loop, 1000000, 50000),
+    "wide_wazzup":   (wide_wazzup, 100000, 5000),
+}
+
+def programs(quick=False):
+    # (name, source) of everything the suite times
+    for path in sorted(glob.glob(os.path.join(TESTCASES, "*.lol"))):
+        with open(path, "r", encoding="utf-8") as f:
+            yield os.path.basename(path), f.read()
+    for name, (generate, size, quick_size) in STRESS.items():
+        yield name, generate(quick_size if quick else size)
+
+# ---- timing
+def best_of(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+def answers():
+    count = [0]
+    def input(name):
+        count[0] += 1
+        return ANSWERS[(count[0] - 1) % len(ANSWERS)]
+    return input
+
+def measure(src, repeat):
+    # {"lex": s, "parse": s, "<engine>.compile": s, "<engine>.run": s, ...},
+    # plus "error" naming the phase that failed, if one did
+    metrics = {}
+    phase = "lex"
+    try:
+        metrics["lex"], _ = best_of(lambda: sum(1 for token in lexer.lex_stream(io.StringIO(src))), repeat)
+        phase = "parse"
+        metrics["parse"], (ast, symbols) = best_of(lambda: parse_file(io.StringIO(src)), repeat)
+        for engine in ENGINES:
+            phase = f"{engine}.compile"
+            lol = Interpreter(output=lambda text: None, input=answers(), engine=engine)
+            # compile includes the optimizer, as Interpreter.run does
+            metrics[phase], program = best_of(lambda: lol.prepare(ast, symbols), repeat)
+            phase = f"{engine}.run"
+            metrics[phase], _ = best_of(program, repeat)
+    except Exception as e:
+        metrics["error"] = f"{phase}: {type(e).__name__}: {e}"
+    return metrics
+
+def run_suite(repeat=3, quick=False, only=None):
+    results = {}
+    for name, src in programs(quick):
+        if only and only not in name:
+            continue
+        results[name] = measure(src, repeat)
+        print(f"  {name}", file=sys.stderr)
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "repeat": repeat,
+        "quick": quick,
+        "results": results,
+    }
+
+# ---- reporting
+def show(report):
+    results = report["results"]
+    columns = ["lex", "parse"] + [f"{engine}.{phase}" for engine in ENGINES for phase in ("compile", "run")]
+    width = max(len(name) for name in results) if results else 10
+    print(f"{'program':<{width}}  " + "  ".join(f"{column:>16}" for column in columns))
+    for name, metrics in results.items():
+        cells = [f"{metrics[column] * 1000:14.2f}ms" if column in metrics else f"{'-':>16}" for column in columns]
+        print(f"{name:<{width}}  " + "  ".join(cells))
+        if "error" in metrics:
+            print(f"{'':<{width}}  error in {metrics['error']}")
+
+def compare(report, baseline, threshold):
+    # list of (program, metric, old, new) that got slower than threshold allows
+    if baseline.get("quick") != report["quick"]:
+        print("baseline was made with a different --quick setting, not comparing", file=sys.stderr)
+        return []
+    slower = []
+    for name, metrics in report["results"].items():
+        old_metrics = baseline["results"].get(name, {})
+        for metric, new in metrics.items():
+            old = old_metrics.get(metric)
+            if metric == "error" or old is None:
+                continue
+            if max(old, new) >= MIN_TIME and new > old * threshold:
+                slower.append((name, metric, old, new))
+        if "error" in metrics and "error" not in old_metrics and old_metrics:
+            slower.append((name, "error", None, metrics["error"]))
+    return slower
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Time the lexer, parser and both engines on LOLCODE programs")
+    ap.add_argument("--json", help="write the results to this file")
+    ap.add_argument("--baseline", default=BASELINE, help="results to compare against (default: benchmarks/baseline.json)")
+    ap.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    ap.add_argument("--threshold", type=float, default=1.25, help="slower than baseline by this factor is a regression (default: 1.25)")
+    ap.add_argument("--repeat", type=int, default=3, help="best of this many runs per timing (default: 3)")
+    ap.add_argument("--quick", action="store_true", help="much smaller stress programs")
+    ap.add_argument("--only", help="only programs whose name contains this")
+    args = ap.parse_args(argv)
+
+    report = run_suite(args.repeat, args.quick, args.only)
+    show(report)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"no baseline: {args.baseline} doesn't exist, nothing compared "
+              f"(run with --save-baseline to store one)")
+        return 0
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    slower = compare(report, baseline, args.threshold)
+    if not slower:
+        print(f"no regressions against {args.baseline} ({baseline.get('created', '?')})")
+        return 0
+    print(f"regressions against {args.baseline} ({baseline.get('created', '?')}):")
+    for name, metric, old, new in slower:
+        if metric == "error":
+            print(f"  {name}: now fails, {new}")
+        else:
+            print(f"  {name} {metric}: {old * 1000:.2f}ms -> {new * 1000:.2f}ms ({new / old:.2f}x)")
+    return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
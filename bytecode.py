@@ -0,0 +1,819 @@
+from array import array
+from bisect import bisect_right
+import spans
+from lol_runtime import RuntimeError, arith, troof, saem, yarn, smoosh, cast, case_key, ARITH_FUNCS, INT_FUNCS, \
+    Memo, memo_key, MISSING, CALL_DEPTH, BudgetExceeded, stopped
+
+# Bytecode compiler and stack VM for the parser_try AST.
+#
+# A program compiles to one CodeObject: opcodes in array('B'), one int argument
+# per instruction in array('i'), a constant pool, and variables resolved to slot
+# numbers up front. LOOPs and O RLY?s become plain jumps, so running one never
+# recurses, and a WTF? one lookup in a jump table.
+#
+# Functions are compiled after the program, into the same code. CALL saves the
+# function's slots (resolver.py) on the VM's own call stack, so recursion
+# doesn't recurse in Python either, and FOUND_YR puts them back. A FOUND YR
+# I IZ ... is a TAILCALL: the function called takes the place of the one
+# returning on that stack, so tail recursion runs in constant space. Other
+# recursion goes as deep as run()'s max_depth.
+#
+# Every instruction also gets the source position (spans.py) of the innermost
+# operation or statement it was compiled from, for RuntimeErrors and dis.
+#
+# A program compiled with a lol_runtime.Budget counts a STEP before every loop
+# step and call, and checks every SMOOSH's YARN (CHECK_YARN); without one
+# neither is emitted, like NOTIFY without a listener.
+#
+#   python -m lolterpreter dis <file.lol>   shows what a program compiled to
+
+OPNAMES = [
+    "NOP",
+    "LOAD_CONST",         # push consts[arg]
+    "LOAD_VAR",           # push slots[arg]
+    "STORE_VAR",          # slots[arg] = pop
+    "ARITH",              # b = pop, a = pop, push ARITH_OPS[arg](a, b)
+    "ARITH_VAR",          # same, b is slots[arg >> 3] and the op is arg & 7
+    "ARITH_CONST",        # same, b is consts[arg >> 3]
+    "BOOL",               # same with BOOL_OPS[arg & 3], bit 4/8 = a/b already a TROOF
+    "NOT",
+    "ALL_OF",             # pop arg values, push WIN if none of them is FAIL-ish
+    "ANY_OF",
+    "BOTH_SAEM",
+    "DIFFRINT",
+    "CONCAT",             # pop arg values, push them joined as one YARN
+    "CAST",               # cast top to the type name in consts[arg]
+    "PRINT",              # pop arg values, output them as one line
+    "INPUT",              # slots[arg] = GIMMEH
+    "INCR",               # slots[arg] += 1   (UPPIN)
+    "DECR",               # slots[arg] -= 1   (NERFIN)
+    "JUMP",               # pc = arg
+    "JUMP_IF_WIN",        # pc = arg if pop is WIN as a TROOF   (WILE loops again)
+    "JUMP_IF_FAIL",       # pc = arg if pop is FAIL as a TROOF  (TIL loops again)
+    "JUMP_IF_SAEM",       # b = pop, a = pop, pc = arg if BOTH SAEM a AN b
+    "JUMP_IF_DIFFRINT",   # b = pop, a = pop, pc = arg if DIFFRINT a AN b
+    "SWITCH",             # cases, default = tables[arg], pc = cases.get(case_key(pop), default)
+    "CALL",               # run functions[arg] on the values it takes off the stack
+    "TAILCALL",           # same, returning straight to where the function running was called
+    "FOUND_YR",           # return pop from the function running, to where it was called
+    "NOTIFY",             # tell the symbol table listener slots[arg] changed
+    "STEP",               # one loop step or call less left in the budget
+    "CHECK_YARN",         # fail if the YARN on top is longer than the budget allows
+    "HALT",
+    "RETURN",             # end, returning pop (compile_expression)
+    # superinstructions, only in CodeObject.program (see fuse()): each does
+    # its own instruction and the few after it in one dispatch, and those stay
+    # in the code for jumps that land between them
+    "ARITH_STORE",        # LOAD_VAR, ARITH_VAR or ARITH_CONST, STORE_VAR
+    "TEST_JUMP",          # LOAD_VAR, LOAD_VAR or LOAD_CONST, JUMP_IF_SAEM or JUMP_IF_DIFFRINT
+    "STEP_TEST_JUMP",     # INCR or DECR, then what a TEST_JUMP does (a counting loop's back edge)
+]
+for _i, _name in enumerate(OPNAMES):
+    globals()[_name] = _i
+# not an opcode, marks the end of an operation in BytecodeCompiler.expr's work
+LEAVE = -1
+
+ARITH_OPS = ("SUM_OF","DIFF_OF","PRODUKT_OF","QUOSHUNT_OF","MOD_OF","BIGGR_OF","SMALLR_OF")
+BOOL_OPS = ("BOTH_OF","EITHER_OF","WON_OF")
+LITERAL_TAGS = ("Integer", "Float", "String", "Boolean")
+
+# instructions whose argument is a jump target / slot / constant index
+JUMPS = (JUMP, JUMP_IF_WIN, JUMP_IF_FAIL, JUMP_IF_SAEM, JUMP_IF_DIFFRINT)
+SLOT_ARGS = (LOAD_VAR, STORE_VAR, INPUT, INCR, DECR, NOTIFY)
+CONST_ARGS = (LOAD_CONST, CAST)
+
+class CodeObject:
+    def __init__(self, ops, args, consts, names, initial, starts=None, positions=None, tables=None, functions=None):
+        self.ops = ops          # array('B') of opcodes
+        self.args = args        # array('i'), one argument per opcode
+        self.consts = consts    # constant pool
+        self.names = names      # slot number -> variable name
+        self.initial = initial  # starting value of every slot
+        # instructions from starts[i] on come from positions[i], (line, col) or None
+        self.starts = starts if starts is not None else array('i')
+        self.positions = positions if positions is not None else []
+        self.tables = tables if tables is not None else []     # WTF? jump tables
+        # (name, entry, first slot, slot count, Memo or None) per function
+        self.functions = functions if functions is not None else []
+        self.program = None     # (op, arg) pairs, made by the first run()
+
+    def __len__(self):
+        return len(self.ops)
+
+    def position(self, pc):
+        i = bisect_right(self.starts, pc) - 1
+        return self.positions[i] if i >= 0 else None
+
+class BytecodeCompiler:
+    def __init__(self, scope, notify=False, positions=None, memos=None, budget=None):
+        # variables already have their slots, see resolver.py
+        self.scope = scope
+        self.notify = notify
+        # the limits to emit STEP / CHECK_YARN for
+        self.steps = budget is not None and budget.steps is not None
+        self.yarns = budget is not None and budget.yarn is not None
+        # function name -> its Memo, shared with the closure compiler; None
+        # unless pure functions are memoized
+        self.memos = memos
+        self.ops = array('B')
+        self.args = array('i')
+        self.consts = []
+        self.const_index = {}
+        self.spans = spans.Cursor(positions if positions is not None else ())
+        self.position = None    # of the node being compiled
+        self.starts = array('i')
+        self.positions = []
+        self.marked = None      # the last of self.positions
+        self.tables = []
+        # per loop or WTF? being compiled, its GTFOs' JUMPs to the end of it;
+        # None for a function, where a GTFO returns
+        self.exits = []
+        self.functions = {}     # Function -> its number in CodeObject.functions
+        self.entries = {}       # Function -> where its code starts
+        self.queue = []         # Functions numbered but not compiled yet
+
+    def emit(self, op, arg=0):
+        if self.position is not self.marked:
+            # the first instruction from another node
+            self.marked = self.position
+            self.starts.append(len(self.ops))
+            self.positions.append(self.position)
+        self.ops.append(op)
+        self.args.append(arg)
+        return len(self.ops) - 1
+
+    def enter(self, tup):
+        # takes tup's position (spans.py), returns the one to go back to after it
+        outer = self.position
+        position = self.spans.take(tup)
+        if position is not None:
+            self.position = position
+        return outer
+
+    def patch(self, at, target):
+        self.args[at] = target
+
+    def const(self, value):
+        # 1 and 1.0 and True hash the same, so key on the type as well;
+        # 0.0 and -0.0 are equal too, floats go by their repr
+        key = (float, repr(value)) if type(value) is float else (type(value), value)
+        if key not in self.const_index:
+            self.const_index[key] = len(self.consts)
+            self.consts.append(value)
+        return self.const_index[key]
+
+    def slot(self, name):
+        return self.scope.slot(name)
+
+    def compile(self, ast):
+        # ("PROGRAM", <declarations>, ("STATEMENT_LIST", ...)[, <spans>])
+        self.block(ast[2][1:])
+        self.emit(HALT)
+        for function in self.scope.functions.values():
+            self.function(function)
+        self.bodies()
+        self.scope.check()
+        return self.code()
+
+    def code(self):
+        functions = [None] * len(self.functions)
+        for function, number in self.functions.items():
+            memo = None
+            if self.memos is not None and function.pure:
+                memo = self.memos.setdefault(function.name, Memo())
+            functions[number] = (function.name, self.entries[function], function.start, function.count, memo)
+        return CodeObject(self.ops, self.args, self.consts, self.scope.names, self.scope.initial,
+                          self.starts, self.positions, self.tables, functions)
+
+    def function(self, function):
+        # the number CALL knows function by, its code is compiled by bodies()
+        number = self.functions.get(function)
+        if number is None:
+            number = self.functions[function] = len(self.functions)
+            self.queue.append(function)
+        return number
+
+    def bodies(self):
+        # the code of every function numbered so far (and of the ones those call),
+        # each starting where its HOW IZ I is in the position table
+        spans = self.spans
+        scope = self.scope
+        while self.queue:
+            function = self.queue.pop(0)
+            self.entries[function] = len(self.ops)
+            resume, local = spans.next, scope.local
+            spans.next = function.index
+            scope.local = function
+            outer = self.enter(function.node)
+            self.exits.append(None)
+            self.block(function.body)
+            # the end of the body returns IT
+            self.emit(LOAD_VAR, function.start)
+            self.emit(FOUND_YR)
+            self.exits.pop()
+            self.position = outer
+            spans.next, scope.local = resume, local
+
+    # ------------------------------------------------------------ statements
+    def block(self, stmts):
+        # loops, O RLY?s and WTF?s are generators (loop, conditional, switch)
+        # that yield each of their blocks to be compiled where it goes, so
+        # blocks are compiled off an explicit stack however deep they nest
+        blocks = [(iter(stmts), None, None)]   # (rest of a block, the statement it's in, that one's outer position)
+        while blocks:
+            rest, compound, outer = blocks[-1]
+            stmt = next(rest, None)
+            if stmt is None:
+                blocks.pop()
+                if compound is not None:
+                    self.resume(compound, outer, blocks)
+                continue
+            outer = self.enter(stmt)
+            compound = self.stmt(stmt)
+            if compound is None:
+                self.position = outer
+            else:
+                self.resume(compound, outer, blocks)
+
+    def resume(self, compound, outer, blocks):
+        # runs a compound statement on to its next block, or to its end
+        try:
+            stmts = next(compound)
+        except StopIteration:
+            self.position = outer
+        else:
+            blocks.append((iter(stmts), compound, outer))
+
+    def stmt(self, stmt):
+        # None, or a generator for a compound statement, see block()
+        tag = stmt[0]
+        if tag == "PRINT":
+            for child in stmt[1:]:
+                self.expr(child)
+            self.emit(PRINT, len(stmt) - 1)
+        elif tag == "INPUT":
+            slot = self.slot(stmt[1])
+            self.emit(INPUT, slot)
+            self.changed(slot)
+        elif tag == "ASSIGN":
+            # ("ASSIGN", ("Identifier", name), ("Value", <expression>))
+            slot = self.slot(stmt[1][1])
+            self.expr(stmt[2][1])
+            self.emit(STORE_VAR, slot)
+            self.changed(slot)
+        elif tag == "PERM_CAST":
+            # ("PERM_CAST", ("Identifier", name), ("Target Type", type))
+            slot = self.slot(stmt[1][1])
+            self.emit(LOAD_VAR, slot)
+            self.emit(CAST, self.const(stmt[2][1]))
+            self.emit(STORE_VAR, slot)
+            self.changed(slot)
+        elif tag in ("ARITH_OPERATION", "BOOL_OPERATION", "EXPRESSION"):
+            self.expr(stmt[1])
+            self.emit(STORE_VAR, self.slot("IT"))
+            self.changed(self.slot("IT"))
+        elif tag == "LOOP":
+            return self.loop(stmt)
+        elif tag == "CONDITIONAL":
+            return self.conditional(stmt)
+        elif tag == "SWITCH":
+            return self.switch(stmt)
+        elif tag == "BREAK" and self.exits:
+            if self.exits[-1] is None:
+                # straight out of the function, with NOOB
+                self.emit(LOAD_CONST, self.const(None))
+                self.emit(FOUND_YR)
+            else:
+                self.exits[-1].append(self.emit(JUMP))
+        elif tag == "RETURN":
+            value = stmt[1]
+            if value[0] == "CALL":
+                # ("CALL", ("Identifier", name), ("Arguments", <expression>...)),
+                # FOUND YR I IZ ...: a tail call
+                outer = self.enter(value)
+                arguments = value[2][1:]
+                function = self.scope.function(value[1][1], len(arguments), self.position)
+                for argument in arguments:
+                    self.expr(argument)
+                self.step()
+                self.emit(TAILCALL, self.function(function))
+                self.position = outer
+            else:
+                self.expr(value)
+            # only reached after a TAILCALL when the memo had its value
+            self.emit(FOUND_YR)
+        elif tag == "FUNCTION":
+            # compiled after the program, see bodies()
+            self.skip_children(stmt)
+        else:
+            # statements the evaluator doesn't implement yet are skipped
+            self.skip_children(stmt)
+
+    def skip_children(self, tup):
+        for child in tup[1:]:
+            if type(child) is tuple:
+                self.spans.skip(child)
+
+    def loop(self, node):
+        # ("LOOP", ("Name", label), (UPPIN|NERFIN, ("Identifier", var)), (TIL|WILE, cond), ("CODE_BLOCK", ...))
+        operation, variable = node[2]
+        loop_type, expression = node[3]
+        slot = self.slot(variable[1])
+        self.spans.skip(variable)
+        # the condition comes before the body in the tree but after it in the
+        # code, its positions are taken out of order
+        cond_spans = self.spans.next
+        self.spans.skip(expression)
+
+        # the condition is tested once on the way in and then at the bottom of
+        # every iteration, so the back edge is a single conditional jump:
+        #
+        #       JUMP test
+        # body: <code block>
+        #       INCR/DECR var
+        # test: <condition>
+        #       jump to body while the loop should go on
+        entry = self.emit(JUMP)
+        body = len(self.ops)
+        self.exits.append([])
+        self.step()
+        yield node[4][1:]
+        self.emit(INCR if operation == "UPPIN" else DECR, slot)
+        self.changed(slot)
+        self.patch(entry, len(self.ops))
+        body_spans = self.spans.next
+        self.spans.next = cond_spans
+        self.branch(expression, loop_type == "WILE", body)
+        self.spans.next = body_spans
+        for at in self.exits.pop():
+            self.patch(at, len(self.ops))
+
+    def conditional(self, node):
+        # ("CONDITIONAL", ("YA_RLY", ("CODE_BLOCK", ...)),
+        #                 ("MEBBE", <expression>, ("CODE_BLOCK", ...))..., [("NO_WAI", ("CODE_BLOCK", ...))])
+        #
+        #       LOAD_VAR IT
+        #       JUMP_IF_FAIL next
+        #       <YA RLY block>
+        #       JUMP end
+        # next: <MEBBE condition>
+        #       JUMP_IF_FAIL next2
+        #       <MEBBE block>
+        #       JUMP end
+        # ...
+        #       <NO WAI block>
+        # end:
+        self.emit(LOAD_VAR, self.slot("IT"))
+        skip = self.emit(JUMP_IF_FAIL)
+        yield node[1][1][1:]
+        ends = []
+        for clause in node[2:]:
+            ends.append(self.emit(JUMP))
+            self.patch(skip, len(self.ops))
+            if clause[0] == "MEBBE":
+                skip = self.branch(clause[1], False, 0)
+                yield clause[2][1:]
+            else:
+                skip = None
+                yield clause[1][1:]
+        if skip is not None:
+            self.patch(skip, len(self.ops))
+        for at in ends:
+            self.patch(at, len(self.ops))
+
+    def switch(self, node):
+        # ("SWITCH", ("OMG", <literal>, ("CODE_BLOCK", ...))..., [("OMGWTF", ("CODE_BLOCK", ...))])
+        # the case blocks follow each other, so one falls through into the
+        # next; SWITCH jumps to the first one to run, a GTFO past the last
+        self.emit(LOAD_VAR, self.slot("IT"))
+        table = len(self.tables)
+        self.emit(SWITCH, table)
+        cases = {}
+        default = None
+        self.tables.append(None)
+        self.exits.append([])
+        for clause in node[1:]:
+            if clause[0] == "OMG":
+                # the first of two equal OMGs is the one that matches
+                cases.setdefault(case_key(clause[1][1]), len(self.ops))
+                body = clause[2]
+            else:
+                default = len(self.ops)
+                body = clause[1]
+            yield body[1:]
+        end = len(self.ops)
+        self.tables[table] = (cases, default if default is not None else end)
+        for at in self.exits.pop():
+            self.patch(at, end)
+
+    def branch(self, cond, when, target):
+        # jump to target if cond is WIN (when=True, WILE) or FAIL (when=False, TIL),
+        # returns where the jump is, to patch
+        tag = cond[0]
+        if tag in ("BOTH_SAEM", "DIFFRINT"):
+            # compare and jump in one instruction
+            outer = self.enter(cond)
+            self.expr(cond[1]); self.expr(cond[2])
+            same = (tag == "BOTH_SAEM") == when
+            at = self.emit(JUMP_IF_SAEM if same else JUMP_IF_DIFFRINT, target)
+            self.position = outer
+            return at
+        self.expr(cond)
+        return self.emit(JUMP_IF_WIN if when else JUMP_IF_FAIL, target)
+
+    def changed(self, slot):
+        if self.notify:
+            self.emit(NOTIFY, slot)
+
+    def step(self):
+        if self.steps:
+            self.emit(STEP)
+
+    # ----------------------------------------------------------- expressions
+    def expr(self, tup):
+        # an explicit stack of work instead of recursion, so any depth works.
+        # Each item is a node still to compile, or what comes once the
+        # operands before it are done: an (op, arg) instruction, a function
+        # emitting one whose argument is only worked out then (slots and
+        # constants are numbered in order of use), or (LEAVE, position)
+        emit = self.emit
+        work = [tup]
+        while work:
+            item = work.pop()
+            if type(item) is not tuple:
+                item()
+                continue
+            tag = item[0]
+            if type(tag) is int:
+                if tag == LEAVE:
+                    self.position = item[1]
+                else:
+                    emit(tag, item[1])
+            # variables and literals have no position of their own
+            elif tag == "Identifier":
+                emit(LOAD_VAR, self.slot(item[1]))
+            elif tag in LITERAL_TAGS:
+                emit(LOAD_CONST, self.const(item[1]))
+            else:
+                work.append((LEAVE, self.enter(item)))
+                work.extend(reversed(self.operation(item)))
+
+    def operation(self, tup):
+        # the steps of an operation, in order: operands (nodes) to compile,
+        # then its own instructions (see expr)
+        emit = self.emit
+        tag = tup[0]
+        if tag in ARITH_OPS:
+            op = ARITH_OPS.index(tag)
+            right = tup[2]
+            # a variable or literal right operand is folded into the instruction
+            if right[0] == "Identifier":
+                return [tup[1], lambda: emit(ARITH_VAR, self.slot(right[1]) << 3 | op)]
+            if right[0] in LITERAL_TAGS:
+                return [tup[1], lambda: emit(ARITH_CONST, self.const(right[1]) << 3 | op)]
+            return [tup[1], right, (ARITH, op)]
+        if tag in BOOL_OPS:
+            # literal operands are pushed as their TROOF value already
+            steps = []
+            flags = 0
+            for operand, bit in ((tup[1], 4), (tup[2], 8)):
+                if operand[0] in LITERAL_TAGS:
+                    steps.append(lambda value=troof(operand[1]): emit(LOAD_CONST, self.const(value)))
+                    flags |= bit
+                else:
+                    steps.append(operand)
+            steps.append((BOOL, BOOL_OPS.index(tag) | flags))
+            return steps
+        if tag == "NOT":
+            return [tup[1], (NOT, 0)]
+        if tag in ("ALL_OF", "ANY_OF"):
+            return [*tup[1:], (ALL_OF if tag == "ALL_OF" else ANY_OF, len(tup) - 1)]
+        if tag in ("BOTH_SAEM", "DIFFRINT"):
+            return [tup[1], tup[2], (BOTH_SAEM if tag == "BOTH_SAEM" else DIFFRINT, 0)]
+        if tag == "CONCATENATE":
+            if self.yarns:
+                return [*tup[1:], (CONCAT, len(tup) - 1), (CHECK_YARN, 0)]
+            return [*tup[1:], (CONCAT, len(tup) - 1)]
+        if tag == "CAST":
+            return [tup[1], lambda: emit(CAST, self.const(tup[2][1]))]
+        if tag == "CALL":
+            # ("CALL", ("Identifier", name), ("Arguments", <expression>...))
+            arguments = tup[2][1:]
+            function = self.scope.function(tup[1][1], len(arguments), self.position)
+            if self.steps:
+                return [*arguments, (STEP, 0), (CALL, self.function(function))]
+            return [*arguments, (CALL, self.function(function))]
+        # same as the closure compiler: unknown expressions evaluate to nothing
+        self.skip_children(tup)
+        return [lambda: emit(LOAD_CONST, self.const(None))]
+
+    def expression(self, tup):
+        # code leaving the value of one expression to RETURN, for the closure
+        # compiler (deeply nested expressions, calls of recursive functions);
+        # returns where it starts. self.spans is the closure compiler's
+        # cursor, this moves it past tup. The functions it calls are
+        # compiled by the next bodies()
+        entry = len(self.ops)
+        self.position = None
+        self.expr(tup)
+        self.emit(RETURN)
+        return entry
+
+def compile_program(ast, scope, notify=False, memoize=False, budget=None):
+    return BytecodeCompiler(scope, notify, spans.unpack(ast), {} if memoize else None, budget).compile(ast)
+
+def fuse(code):
+    # the (op, arg) pairs run() steps through, with a superinstruction at the
+    # start of every sequence one stands for; its arg is a tuple of what it needs
+    ops = code.ops
+    args = code.args
+    consts = code.consts
+    program = list(zip(ops, args))
+
+    def test(i):
+        # (a, b, b is a constant, jump if BOTH SAEM, target) of a TEST_JUMP at i
+        if i + 2 >= len(ops) or ops[i] != LOAD_VAR or ops[i + 2] not in (JUMP_IF_SAEM, JUMP_IF_DIFFRINT):
+            return None
+        if ops[i + 1] == LOAD_VAR:
+            b, const = args[i + 1], False
+        elif ops[i + 1] == LOAD_CONST:
+            b, const = consts[args[i + 1]], True
+        else:
+            return None
+        return args[i], b, const, ops[i + 2] == JUMP_IF_SAEM, args[i + 2]
+
+    for i, op in enumerate(ops):
+        if op == LOAD_VAR:
+            if i + 2 < len(ops) and ops[i + 1] in (ARITH_VAR, ARITH_CONST) and ops[i + 2] == STORE_VAR:
+                arg = args[i + 1]
+                const = ops[i + 1] == ARITH_CONST
+                b = consts[arg >> 3] if const else arg >> 3
+                program[i] = (ARITH_STORE, (args[i], arg & 7, b, const, args[i + 2]))
+            else:
+                fused = test(i)
+                if fused is not None:
+                    program[i] = (TEST_JUMP, fused)
+        elif op == INCR or op == DECR:
+            fused = test(i + 1)
+            if fused is not None:
+                program[i] = (STEP_TEST_JUMP, (args[i], 1 if op == INCR else -1) + fused)
+    return tuple(program)
+
+def run(code, output, input, notify=None, slots=None, stop=None, entry=0, max_depth=CALL_DEPTH, budget=None):
+    # runs a CodeObject from entry on, returns the final slot values (or
+    # the value of an expression, see BytecodeCompiler.expression)
+    # notify(slot) is called after an instruction NOTIFY says slot changed
+    # stop is a one-item list, setting stop[0] ends the program at the next loop step (lol_runtime.stopped)
+    # max_depth is how many function calls may be running at once
+    # budget is the lol_runtime.Budget the code was compiled with, if any
+    # (the arrays are zipped into one tuple of (op, arg) pairs once, so each
+    # step is one index, and the hot sequences get superinstructions, fuse())
+    program = code.program
+    if program is None:
+        program = code.program = fuse(code)
+    consts = code.consts
+    names = code.names
+    tables = code.tables
+    functions = code.functions
+    slots = list(code.initial) if slots is None else slots
+    stop = [False] if stop is None else stop
+    left = budget.left if budget is not None else None
+    arith_funcs = tuple(ARITH_FUNCS[op] for op in ARITH_OPS)
+    int_funcs = tuple(INT_FUNCS[op] for op in ARITH_OPS)
+
+    stack = []
+    push = stack.append
+    pop = stack.pop
+    pc = entry
+    # (pc to return to, saved slots, first slot, Memo, memo key) per function running
+    calls = []
+
+    # the try costs nothing per instruction, errors get the position of the
+    # one that raised
+    try:
+        while True:
+            op, arg = program[pc]
+            pc += 1
+
+            if op == ARITH_STORE:
+                a, func, b, const, target = arg
+                a = slots[a]
+                if not const:
+                    b = slots[b]
+                pc += 1     # an error is the ARITH's
+                t = type(a)
+                if t is type(b) and t is int:
+                    slots[target] = int_funcs[func](a, b)
+                elif t is type(b) and t is float:
+                    slots[target] = arith_funcs[func](a, b)
+                else:
+                    slots[target] = arith(ARITH_OPS[func], a, b)
+                pc += 1
+            elif op == STEP_TEST_JUMP or op == TEST_JUMP:
+                if op == STEP_TEST_JUMP:
+                    counter, delta, a, b, const, same, target = arg
+                    slots[counter] += delta
+                    if stop[0]: raise stopped(stop)
+                    pc += 1
+                else:
+                    a, b, const, same, target = arg
+                a = slots[a]
+                if not const:
+                    b = slots[b]
+                t = type(a)
+                if t is type(b) and (t is int or t is float):
+                    if (a == b) == same:
+                        pc = target
+                    else:
+                        pc += 2
+                elif saem(a, b) == same:
+                    pc = target
+                else:
+                    pc += 2
+            elif op == LOAD_VAR:
+                push(slots[arg])
+            elif op == LOAD_CONST:
+                push(consts[arg])
+            elif op == STORE_VAR:
+                slots[arg] = pop()
+            elif op == ARITH_VAR or op == ARITH_CONST or op == ARITH:
+                if op == ARITH_VAR:
+                    b = slots[arg >> 3]
+                    arg &= 7
+                elif op == ARITH_CONST:
+                    b = consts[arg >> 3]
+                    arg &= 7
+                else:
+                    b = pop()
+                a = stack[-1]
+                # two NUMBRs or two NUMBARs need none of arith()'s casting
+                t = type(a)
+                if t is type(b) and t is int:
+                    stack[-1] = int_funcs[arg](a, b)
+                elif t is type(b) and t is float:
+                    stack[-1] = arith_funcs[arg](a, b)
+                else:
+                    stack[-1] = arith(ARITH_OPS[arg], a, b)
+            elif op == JUMP_IF_SAEM or op == JUMP_IF_DIFFRINT:
+                b = pop()
+                a = pop()
+                # two numbers of the same type need no saem() call
+                t = type(a)
+                if t is type(b) and (t is int or t is float):
+                    same = a == b
+                else:
+                    same = saem(a, b)
+                if same == (op == JUMP_IF_SAEM):
+                    pc = arg
+            elif op == JUMP:
+                pc = arg
+            elif op == STEP:
+                left[0] -= 1
+                if left[0] < 0:
+                    raise BudgetExceeded("steps", budget.steps)
+            elif op == SWITCH:
+                cases, default = tables[arg]
+                pc = cases.get(case_key(pop()), default)
+            elif op == CALL or op == TAILCALL:
+                name, entry, start, count, memo = functions[arg]
+                values = stack[len(stack) - count + 1:]
+                del stack[len(stack) - count + 1:]
+                key = None
+                if memo is not None:
+                    key = memo_key(values)
+                    value = memo.get(key)
+                    if value is not MISSING:
+                        push(value)
+                        continue
+                # recursion needn't go through a loop
+                if stop[0]: raise stopped(stop)
+                back = pc
+                if op == TAILCALL:
+                    # the function running is done: its slots go back now
+                    # and the one called returns where it would have. A
+                    # memoized one doesn't remember this result, its
+                    # FOUND_YR never runs
+                    back, saved, outer, _, _ = calls.pop()
+                    slots[outer:outer + len(saved)] = saved
+                elif len(calls) >= max_depth:
+                    raise RuntimeError(f"Runtime Error: Too much recursion in '{name}'")
+                calls.append((back, slots[start:start + count], start, memo, key))
+                slots[start:start + count] = [None] + values
+                pc = entry
+            elif op == FOUND_YR:
+                pc, saved, start, memo, key = calls.pop()
+                slots[start:start + len(saved)] = saved
+                if memo is not None:
+                    memo.put(key, stack[-1])
+            elif op == JUMP_IF_WIN:
+                if troof(pop()):
+                    pc = arg
+            elif op == JUMP_IF_FAIL:
+                if not troof(pop()):
+                    pc = arg
+            elif op == INCR:
+                slots[arg] += 1
+                # every loop iteration goes through exactly one INCR/DECR
+                if stop[0]: raise stopped(stop)
+            elif op == DECR:
+                slots[arg] -= 1
+                if stop[0]: raise stopped(stop)
+            elif op == BOTH_SAEM or op == DIFFRINT:
+                b = pop()
+                same = saem(stack[-1], b)
+                stack[-1] = same if op == BOTH_SAEM else not same
+            elif op == BOOL:
+                b = pop()
+                a = stack[-1]
+                if not arg & 4: a = troof(a)
+                if not arg & 8: b = troof(b)
+                arg &= 3
+                if arg == 0:   stack[-1] = a and b
+                elif arg == 1: stack[-1] = a or b
+                else:          stack[-1] = a != b
+            elif op == NOT:
+                stack[-1] = not troof(stack[-1])
+            elif op == PRINT:
+                vals = stack[len(stack) - arg:]
+                del stack[len(stack) - arg:]
+                output("".join([yarn(v) for v in vals]))
+            elif op == CONCAT:
+                vals = stack[len(stack) - arg:]
+                del stack[len(stack) - arg:]
+                push(smoosh(vals))
+            elif op == ALL_OF or op == ANY_OF:
+                vals = [troof(v) for v in stack[len(stack) - arg:]]
+                del stack[len(stack) - arg:]
+                push(all(vals) if op == ALL_OF else any(vals))
+            elif op == CAST:
+                stack[-1] = cast(stack[-1], consts[arg])
+            elif op == INPUT:
+                value = input(names[arg])
+                slots[arg] = "" if value is None else value
+            elif op == NOTIFY:
+                if notify is not None:
+                    notify(arg)
+            elif op == CHECK_YARN:
+                if len(stack[-1]) > budget.yarn:
+                    raise BudgetExceeded("yarn", budget.yarn)
+            elif op == HALT:
+                return slots
+            elif op == RETURN:
+                return pop()
+            elif op == NOP:
+                pass
+            else:
+                raise RuntimeError(f"Runtime Error: bad opcode {op} at {pc - 1}")
+    except RuntimeError as e:
+        e.locate(code.position(pc - 1))
+        raise
+    finally:
+        # a run that failed inside functions gives their callers' slots back
+        while calls:
+            _, saved, start, _, _ = calls.pop()
+            slots[start:start + len(saved)] = saved
+
+def disassemble(code):
+    # one line per instruction: source position (where it changes), offset,
+    # opcode, argument and what it refers to
+    targets = {code.args[i] for i in range(len(code)) if code.ops[i] in JUMPS}
+    for cases, default in code.tables:
+        targets.update(cases.values(), (default,))
+    entries = {entry: name for name, entry, start, count, memo in code.functions}
+    lines = []
+    last = None
+    for i in range(len(code)):
+        op = code.ops[i]
+        arg = code.args[i]
+        if i in entries:
+            lines.append(f"\nHOW IZ I {entries[i]}")
+        position = code.position(i)
+        where = f"{position[0]}:{position[1]}" if position is not None and position != last else ""
+        last = position
+        mark = ">>" if i in targets else "  "
+        text = f"{where:>8} {mark} {i:5d} {OPNAMES[op]:<18}"
+        if op in SLOT_ARGS:
+            text += f"{arg:<5d} ({code.names[arg]})"
+        elif op in CONST_ARGS:
+            text += f"{arg:<5d} ({code.consts[arg]!r})"
+        elif op in JUMPS:
+            text += f"{arg:<5d} (to {arg})"
+        elif op == SWITCH:
+            cases, default = code.tables[arg]
+            # case_key makes TROOFs (bool, value)
+            shown = ", ".join(f"{yarn(key[1]) if type(key) is tuple else repr(key)} to {target}" for key, target in cases.items())
+            text += f"{arg:<5d} ({shown}{', ' if shown else ''}else to {default})"
+        elif op == CALL or op == TAILCALL:
+            text += f"{arg:<5d} ({code.functions[arg][0]})"
+        elif op == ARITH:
+            text += f"{arg:<5d} ({ARITH_OPS[arg]})"
+        elif op == ARITH_VAR:
+            text += f"{arg:<5d} ({ARITH_OPS[arg & 7]} {code.names[arg >> 3]})"
+        elif op == ARITH_CONST:
+            text += f"{arg:<5d} ({ARITH_OPS[arg & 7]} {code.consts[arg >> 3]!r})"
+        elif op == BOOL:
+            text += f"{arg:<5d} ({BOOL_OPS[arg & 3]})"
+        elif op in (PRINT, CONCAT, ALL_OF, ANY_OF):
+            text += f"{arg}"
+        lines.append(text.rstrip())
+    return "\n".join(lines)
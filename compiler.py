@@ -0,0 +1,761 @@
+from operator import itemgetter
+from lol_runtime import RuntimeError, arith, troof, saem, yarn, smoosh, cast, case_key, ARITH_FUNCS, INT_FUNCS, \
+    Memo, memo_key, MISSING, BudgetExceeded, stopped
+import spans
+from spans import walk
+import bytecode
+
+# Compiles the ("TAG", ...) tuples from parser_try into nested Python closures.
+# The tag dispatch happens once here instead of on every node visit, so LOOP
+# bodies just call straight into pre-bound closures on each iteration.
+#
+# Variables are resolved to slot numbers (resolver.py) while compiling. Every
+# compiled closure takes the frame, the list holding those slots, and returns
+# the node's value (expressions) or nothing (statements).
+#
+# RuntimeErrors get the position (spans.py) of the operation or statement
+# that raised them on the way out, see lol_runtime.RuntimeError. The try
+# blocks for that cost nothing until something is raised.
+#
+# A statement's closure returns None, or GTFO / FOUND after a GTFO / FOUND YR
+# ran in it. Blocks and O RLY?s pass that up: a GTFO to the loop, WTF? or
+# function it leaves, a FOUND YR (its value is in the function's IT by then)
+# to the function. Only blocks that can see one (Compiler.breaks/returns)
+# check what their statements return.
+#
+# A function call runs the function's compiled body on the caller's frame,
+# see resolver.py for how its parameters get there. Recursive functions run
+# on the bytecode VM instead (its CALLs don't nest Python calls, and it turns
+# FOUND YR I IZ ... into a tail call), on the same frame: a call of one is
+# compiled for the VM, like an expression nested too deep. So is a whole
+# program whose blocks nest deeper than MAX_NESTING: every level would be
+# another closure call at run time.
+#
+# With a lol_runtime.Budget of steps, loop bodies and calls are wrapped in a
+# closure counting them (counted()), and with one of YARN length SMOOSHes
+# check what they made; without, nothing is wrapped or checked.
+
+ARITH_TAGS = ("SUM_OF","DIFF_OF","PRODUKT_OF","QUOSHUNT_OF","MOD_OF","BIGGR_OF","SMALLR_OF")
+BOOL_TAGS = ("BOTH_OF","EITHER_OF","WON_OF")
+LITERAL_TAGS = ("Integer", "Float", "String", "Boolean")
+# expressions nested deeper than this are compiled for the bytecode VM
+# instead: it works them out on its own stack, where closures calling
+# closures would run out of Python's
+MAX_DEPTH = 200
+# blocks (loop, O RLY?, WTF? and function bodies) nested deeper than this run
+# the whole program on the VM; nested blocks count towards MAX_DEPTH too
+MAX_NESTING = 100
+# the parts of a statement its blocks are in
+BLOCK_PARTS = ("LOOP", "CONDITIONAL", "SWITCH", "FUNCTION", "YA_RLY", "MEBBE", "NO_WAI", "OMG", "OMGWTF")
+
+GTFO = "GTFO"
+FOUND = "FOUND YR"
+
+# counting loops (Compiler.counting): what the counter compared with its bound
+# ends them, for TIL and for WILE, and the same counting down
+UNTIL = {("BOTH_SAEM", "TIL"): "==", ("DIFFRINT", "WILE"): "==",
+         ("BIGGR_OF", "TIL"): ">=", ("BIGGR_OF", "WILE"): "<",
+         ("SMALLR_OF", "TIL"): "<=", ("SMALLR_OF", "WILE"): ">"}
+MIRRORED = {"==": "==", ">=": "<=", "<=": ">=", ">": "<", "<": ">"}
+
+def iterations(until, start, bound, step):
+    # how many times a counting loop's body runs, counting from start by
+    # step until the counter is until bound; None if it never gets there
+    if step < 0:
+        start, bound, until = -start, -bound, MIRRORED[until]
+    if until == "==":
+        return bound - start if bound >= start else None
+    if until == ">=":
+        return max(bound - start, 0)
+    if until == ">":
+        return max(bound + 1 - start, 0)
+    if until == "<=":
+        return 0 if start <= bound else None
+    return 0 if start < bound else None
+
+def nesting(stmts):
+    # how deep the blocks in a STATEMENT_LIST or CODE_BLOCK nest, without
+    # going into expressions
+    deepest = 0
+    stack = [(stmts, 0)]
+    while stack:
+        tup, depth = stack.pop()
+        if tup[0] == "CODE_BLOCK":
+            depth += 1
+            if depth > deepest:
+                deepest = depth
+        for child in tup[1:]:
+            if type(child) is tuple and (child[0] == "CODE_BLOCK" or child[0] in BLOCK_PARTS):
+                stack.append((child, depth))
+    return deepest
+
+def compile_program(ast, interp, scope):
+    # ("PROGRAM", <declarations>, ("STATEMENT_LIST", ...)[, <spans>])
+    if nesting(ast[2]) > MAX_NESTING:
+        return vm_program(ast, interp, scope)
+    compiler = Compiler(interp, scope, spans.unpack(ast))
+    program = compiler.block(ast[2][1:])
+    compiler.finish()
+    scope.check()
+    return program
+
+def vm_program(ast, interp, scope):
+    # closure running the whole program on the bytecode VM
+    code = bytecode.compile_program(ast, scope, interp.on_symbols is not None, interp.memoize, interp.budget)
+    run = bytecode.run
+    output = interp.output
+    input = interp.input
+    notify = interp.changed
+    stop = interp.stop_requested
+    max_depth = interp.max_depth
+    budget = interp.budget
+    return lambda frame: run(code, output, input, notify, frame, stop, 0, max_depth, budget)
+
+class Compiler:
+    def __init__(self, interp, scope, positions=None):
+        self.interp = interp
+        self.scope = scope
+        self.it = scope.slot("IT")
+        # on_symbols is optional, skip the call entirely when nobody listens
+        self.notify = interp.changed if interp.on_symbols is not None else None
+        # profiler.py, statements are only wrapped when there is one
+        self.profiler = interp.profiler
+        self.spans = spans.Cursor(positions if positions is not None else ())
+        self.position = None    # (line, col) of the node being compiled
+        self.depth = 0          # of expr and block calls in progress
+        self.breaks = False     # can the statement just compiled return GTFO
+        self.returns = False    # or FOUND
+        self.bodies = {}        # function name -> [its compiled body], filled in at its HOW IZ I
+        # Interpreter(memoize=True): pure functions remember their results
+        self.memos = {} if interp.memoize else None
+        self.budget = interp.budget
+        # what runs on the bytecode VM is compiled by one BytecodeCompiler
+        # into one CodeObject, finished (by finish()) after everything else
+        self.bytecode = None
+        self.code = [None]
+
+        self.expr_table = {
+            "Identifier":  self.identifier,
+            "CAST":        self.cast,
+            "NOT":         self.not_op,
+            "ALL_OF":      self.all_any,
+            "ANY_OF":      self.all_any,
+            "BOTH_SAEM":   self.compare,
+            "DIFFRINT":    self.compare,
+            "CONCATENATE": self.concat,
+            "CALL":        self.call,
+        }
+        for tag in LITERAL_TAGS: self.expr_table[tag] = self.literal
+        for tag in ARITH_TAGS: self.expr_table[tag] = self.arith
+        for tag in BOOL_TAGS: self.expr_table[tag] = self.bool_op
+
+        self.stmt_table = {
+            "INPUT":           self.input_stmt,
+            "LOOP":            self.loop_stmt,
+            "ASSIGN":          self.assign_stmt,
+            "PERM_CAST":       self.cast_stmt,
+            "ARITH_OPERATION": self.it_stmt,
+            "BOOL_OPERATION":  self.it_stmt,
+            "EXPRESSION":      self.it_stmt,
+            "PRINT":           self.print_stmt,
+            "CONDITIONAL":     self.if_stmt,
+            "SWITCH":          self.switch_stmt,
+            "BREAK":           self.break_stmt,
+            "FUNCTION":        self.func_stmt,
+            "RETURN":          self.return_stmt,
+        }
+
+    def vm_compiler(self):
+        if self.bytecode is None:
+            self.bytecode = bytecode.BytecodeCompiler(self.scope, self.notify is not None, memos=self.memos,
+                                                      budget=self.budget)
+            # positions are taken from the same cursor, in the same order
+            self.bytecode.spans = self.spans
+        return self.bytecode
+
+    def vm(self, tup):
+        # closure running tup's code on the bytecode VM, on the same frame
+        entry = self.vm_compiler().expression(tup)
+        code = self.code
+        run = bytecode.run
+        interp = self.interp
+        output = interp.output
+        input = interp.input
+        notify = self.notify
+        stop = interp.stop_requested
+        max_depth = interp.max_depth
+        budget = self.budget
+        return lambda frame: run(code[0], output, input, notify, frame, stop, entry, max_depth, budget)
+
+    def counted(self, step, position):
+        # step, taking one step of the budget each time it runs, if steps are budgeted
+        budget = self.budget
+        if budget is None or budget.steps is None:
+            return step
+        left = budget.left
+        def run(frame):
+            left[0] -= 1
+            if left[0] < 0:
+                raise BudgetExceeded("steps", budget.steps, position)
+            return step(frame)
+        return run
+
+    def finish(self):
+        # compiles the functions the VM's code calls, and makes the CodeObject
+        compiler = self.bytecode
+        if compiler is not None:
+            compiler.bodies()
+            self.code[0] = compiler.code()
+
+    # ------------------------------------------------------------ statements
+    def block(self, stmts):
+        # sets self.breaks and self.returns for the whole block
+        profiler = self.profiler
+        steps = []
+        breaks = returns = False
+        self.depth += 1
+        for stmt in stmts:
+            handler = self.stmt_table.get(stmt[0])
+            position = self.spans.take(stmt)
+            # statements the evaluator doesn't implement yet are skipped
+            if handler is None:
+                self.skip_children(stmt)
+                continue
+            self.position = position
+            self.breaks = self.returns = False
+            step = handler(stmt)
+            breaks = breaks or self.breaks
+            returns = returns or self.returns
+            if step is None:
+                # a HOW IZ I, nothing to run where it stands
+                continue
+            if profiler is not None:
+                step = profiler.wrap(step, stmt[0], position)
+            steps.append(step)
+        self.depth -= 1
+        steps = tuple(steps)
+        self.breaks = breaks
+        self.returns = returns
+
+        if len(steps) == 1:
+            return steps[0]
+        if breaks or returns:
+            def run(frame):
+                for step in steps:
+                    signal = step(frame)
+                    if signal is not None:
+                        return signal
+            return run
+        def run(frame):
+            for step in steps:
+                step(frame)
+        return run
+
+    def input_stmt(self, node):
+        name = node[1]
+        slot = self.scope.slot(name)
+        read = self.interp.input
+        notify = self.notify
+        def run(frame):
+            value = read(name)
+            if value is None:
+                value = ""
+            frame[slot] = value
+            if notify: notify(slot)
+        return run
+
+    def loop_stmt(self, node):
+        # ("LOOP", ("Name", label), (UPPIN|NERFIN, ("Identifier", var)), (TIL|WILE, cond), ("CODE_BLOCK", ...))
+        operation, variable = node[2]
+        loop_type, expression = node[3]
+        position = self.position
+        slot = self.scope.slot(variable[1])
+        self.spans.skip(variable)
+        step = 1 if operation == "UPPIN" else -1
+        counting = self.counting(node)
+        cond = self.expr(expression)
+        body = self.block(node[4][1:])
+        notify = self.notify
+        stop = self.interp.stop_requested
+        signals = self.breaks or self.returns
+        body = self.counted(body, position)
+
+        if signals:
+            # the loop is where a GTFO in the body ends up, a FOUND goes on
+            self.breaks = False
+            until = loop_type == "TIL"
+            def run(frame):
+                while troof(cond(frame)) is not until:
+                    signal = body(frame)
+                    if signal is not None:
+                        if signal is GTFO:
+                            break
+                        return signal
+                    frame[slot] += step
+                    if notify: notify(slot)
+                    if stop[0]: raise stopped(stop, position)
+        elif loop_type == "WILE":
+            def run(frame):
+                while troof(cond(frame)):
+                    body(frame)
+                    frame[slot] += step
+                    if notify: notify(slot)
+                    if stop[0]: raise stopped(stop, position)
+        else:       # loop_type == "TIL"
+            def run(frame):
+                while not troof(cond(frame)):
+                    body(frame)
+                    frame[slot] += step
+                    if notify: notify(slot)
+                    if stop[0]: raise stopped(stop, position)
+        if counting is None:
+            return run
+
+        # a counting loop: while the counter and the bound are NUMBRs, the
+        # number of iterations is known up front, and the condition needn't
+        # be tested on each one. Anything else runs the loop above
+        ends, bound = counting
+        bound = self.counting_bound(bound)
+        loop = run
+        if signals:
+            def count(frame, values):
+                for i in values:
+                    signal = body(frame)
+                    if signal is not None:
+                        if signal is GTFO:
+                            break
+                        return signal
+                    frame[slot] = i
+                    if notify: notify(slot)
+                    if stop[0]: raise stopped(stop, position)
+        else:
+            def count(frame, values):
+                for i in values:
+                    body(frame)
+                    frame[slot] = i
+                    if notify: notify(slot)
+                    if stop[0]: raise stopped(stop, position)
+        def run(frame):
+            start = frame[slot]
+            limit = bound(frame)
+            if type(start) is not int or type(limit) is not int:
+                return loop(frame)
+            times = iterations(ends, start, limit, step)
+            if times is None:
+                return loop(frame)
+            # the counter's values after each step
+            return count(frame, range(start + step, start + step * (times + 1), step))
+        return run
+
+    def counting(self, node):
+        # (what ends it, bound) if node is a counting loop: its condition
+        # compares the counter with a NUMBR literal or variable, either
+        # straight (BOTH SAEM i AN n) or through BIGGR OF / SMALLR OF (BOTH
+        # SAEM i AN BIGGR OF i AN n), and the body sets neither of them
+        counter = node[2][1][1]
+        loop_type, cond = node[3]
+        if cond[0] not in ("BOTH_SAEM", "DIFFRINT") or counter == "IT":
+            return None
+        if cond[2] == ("Identifier", counter):
+            other = cond[1]
+        elif cond[1] == ("Identifier", counter):
+            other = cond[2]
+        else:
+            return None
+        test = cond[0]
+        if other[0] in ("BIGGR_OF", "SMALLR_OF") and cond[0] == "BOTH_SAEM":
+            test = other[0]
+            if other[1] == ("Identifier", counter):
+                other = other[2]
+            elif other[2] == ("Identifier", counter):
+                other = other[1]
+            else:
+                return None
+        until = UNTIL.get((test, loop_type))
+        if until is None:
+            return None
+        if other[0] == "Identifier":
+            if other[1] in (counter, "IT"):
+                return None
+            names = (counter, other[1])
+        elif other[0] == "Integer":
+            names = (counter,)
+        else:
+            return None
+        # a function called can set the program's variables, not the ones
+        # of the function this is in
+        local = self.scope.local
+        calls_matter = not all(local is not None and name in local.slots for name in names)
+        for stmt in walk(node[4]):
+            tag = stmt[0]
+            if tag == "CALL" and calls_matter:
+                return None
+            if tag in ("ASSIGN", "PERM_CAST") and stmt[1][1] in names:
+                return None
+            if tag == "INPUT" and stmt[1] in names:
+                return None
+            if tag == "LOOP" and stmt[2][1][1] in names:
+                return None
+        return until, other
+
+    def counting_bound(self, tup):
+        # the bound's value, read once per loop
+        if tup[0] == "Integer":
+            value = tup[1]
+            return lambda frame: value
+        return itemgetter(self.scope.slot(tup[1]))
+
+    def if_stmt(self, node):
+        # ("CONDITIONAL", ("YA_RLY", ("CODE_BLOCK", ...)),
+        #                 ("MEBBE", <expression>, ("CODE_BLOCK", ...))..., [("NO_WAI", ("CODE_BLOCK", ...))])
+        it = self.it
+        yes = self.block(node[1][1][1:])
+        breaks = self.breaks
+        returns = self.returns
+        mebbes = []
+        no = None
+        for clause in node[2:]:
+            if clause[0] == "MEBBE":
+                cond = self.expr(clause[1])
+                mebbes.append((cond, self.block(clause[2][1:])))
+            else:
+                no = self.block(clause[1][1:])
+            breaks = breaks or self.breaks
+            returns = returns or self.returns
+        self.breaks = breaks
+        self.returns = returns
+        mebbes = tuple(mebbes)
+
+        if mebbes:
+            def run(frame):
+                if troof(frame[it]):
+                    return yes(frame)
+                for cond, body in mebbes:
+                    if troof(cond(frame)):
+                        return body(frame)
+                if no is not None:
+                    return no(frame)
+        elif no is not None:
+            def run(frame):
+                if troof(frame[it]):
+                    return yes(frame)
+                return no(frame)
+        else:
+            def run(frame):
+                if troof(frame[it]):
+                    return yes(frame)
+        return run
+
+    def switch_stmt(self, node):
+        # ("SWITCH", ("OMG", <literal>, ("CODE_BLOCK", ...))..., [("OMGWTF", ("CODE_BLOCK", ...))])
+        # the cases are a jump table: IT's case_key -> number of the first
+        # case to run, the ones after it run too until one returns GTFO
+        it = self.it
+        table = {}
+        bodies = []
+        default = None
+        returns = False
+        for clause in node[1:]:
+            if clause[0] == "OMG":
+                # the first of two equal OMGs is the one that matches
+                table.setdefault(case_key(clause[1][1]), len(bodies))
+                body = clause[2]
+            else:
+                default = len(bodies)
+                body = clause[1]
+            bodies.append(self.block(body[1:]))
+            returns = returns or self.returns
+        # GTFOs end here, FOUNDs go on
+        self.breaks = False
+        self.returns = returns
+        bodies = tuple(bodies)
+        count = len(bodies)
+        if default is None:
+            default = count
+        def run(frame):
+            for i in range(table.get(case_key(frame[it]), default), count):
+                signal = bodies[i](frame)
+                if signal is not None:
+                    if signal is GTFO:
+                        break
+                    return signal
+        return run
+
+    def break_stmt(self, node):
+        self.breaks = True
+        return lambda frame: GTFO
+
+    def func_stmt(self, node):
+        # ("FUNCTION", ("Name", name), ("Parameters", ...), ("CODE_BLOCK", ...)),
+        # compiled where it stands, calls find the body in self.bodies
+        function = self.scope.functions[node[1][1]]
+        if function.recursive:
+            # runs on the VM, which compiles it in finish(); even when
+            # nothing calls it, so its errors are still reported
+            self.skip_children(node)
+            self.vm_compiler().function(function)
+            return None
+        outer, it = self.scope.local, self.it
+        self.scope.local = function
+        self.it = function.start
+        body = self.block(function.body)
+        self.scope.local, self.it = outer, it
+        self.bodies.setdefault(function.name, [None])[0] = body
+        # GTFOs and FOUNDs end at the function
+        self.breaks = self.returns = False
+        return None
+
+    def return_stmt(self, node):
+        # ("RETURN", <expression>), FOUND YR: the value goes to the function's IT
+        slot = self.it
+        value = self.expr(node[1])
+        self.returns = True
+        def run(frame):
+            frame[slot] = value(frame)
+            return FOUND
+        return run
+
+    def assign_stmt(self, node):
+        # ("ASSIGN", ("Identifier", name), ("Value", <expression>))
+        slot = self.scope.slot(node[1][1])
+        value = self.expr(node[2][1])
+        notify = self.notify
+        def run(frame):
+            frame[slot] = value(frame)
+            if notify: notify(slot)
+        return run
+
+    def cast_stmt(self, node):
+        # ("PERM_CAST", ("Identifier", name), ("Target Type", type))
+        slot = self.scope.slot(node[1][1])
+        target = node[2][1]
+        notify = self.notify
+        position = self.position
+        def run(frame):
+            try:
+                frame[slot] = cast(frame[slot], target)
+            except RuntimeError as e:
+                e.locate(position)
+                raise
+            if notify: notify(slot)
+        return run
+
+    def it_stmt(self, node):
+        # bare ARITH_OPERATION / BOOL_OPERATION / EXPRESSION, result goes to IT
+        slot = self.it
+        value = self.expr(node[1])
+        notify = self.notify
+        def run(frame):
+            frame[slot] = value(frame)
+            if notify: notify(slot)
+        return run
+
+    def print_stmt(self, node):
+        parts = tuple(self.expr(child) for child in node[1:])
+        write = self.interp.output
+        def run(frame):
+            write("".join([yarn(part(frame)) for part in parts]))
+        return run
+
+    # ----------------------------------------------------------- expressions
+    def expr(self, tup):
+        tag = tup[0]
+        handler = self.expr_table.get(tag)
+        if tag in spans.TAGS and (self.depth >= MAX_DEPTH or tag == "CALL" and self.recursive(tup)):
+            return self.vm(tup)
+        if tag in spans.TAGS:
+            self.position = self.spans.take(tup)
+        if handler is None:
+            # same as the old tag walk: unknown expressions evaluate to nothing
+            self.skip_children(tup)
+            return lambda frame: None
+        position = self.position
+        self.depth += 1
+        try:
+            value = handler(tup)
+        finally:
+            self.depth -= 1
+        # operations are timed like statements, literals and variables aren't
+        if self.profiler is not None and tag in spans.TAGS:
+            value = self.profiler.wrap(value, tag, position)
+        return value
+
+    def recursive(self, tup):
+        # ("CALL", ("Identifier", name), ("Arguments", ...)) of a recursive function
+        function = self.scope.functions.get(tup[1][1])
+        return function is not None and function.recursive
+
+    def skip_children(self, tup):
+        # keeps self.spans in step past a subtree that isn't compiled
+        for child in tup[1:]:
+            if type(child) is tuple:
+                self.spans.skip(child)
+
+    def identifier(self, tup):
+        # C-level frame[slot]
+        return itemgetter(self.scope.slot(tup[1]))
+
+    def literal(self, tup):
+        value = tup[1]
+        return lambda frame: value
+
+    def cast(self, tup):
+        #    [0]       [1][0]       [1][1]       [2][0]         [2][1]
+        # ("CAST", (<Current_Type>, <Value>), ("Target Type", <Target_Type))
+        position = self.position
+        value = self.expr(tup[1])
+        target = tup[2][1]
+        def run(frame):
+            try:
+                return cast(value(frame), target)
+            except RuntimeError as e:
+                e.locate(position)
+                raise
+        return run
+
+    def arith(self, tup):
+        op = tup[0]
+        func = ARITH_FUNCS[op]
+        ifunc = INT_FUNCS[op]
+        position = self.position
+        left = self.expr(tup[1])
+
+        # two NUMBRs or two NUMBARs need none of arith()'s coercions
+        if tup[2][0] in LITERAL_TAGS:
+            # literal right operand (SUM OF x AN 1), no closure call for it
+            b = tup[2][1]
+            tb = type(b)
+            if tb is int or tb is float:
+                fast = ifunc if tb is int else func
+                def run(frame):
+                    try:
+                        a = left(frame)
+                        if type(a) is tb:
+                            return fast(a, b)
+                        return arith(op, a, b)
+                    except RuntimeError as e:
+                        e.locate(position)
+                        raise
+            else:
+                def run(frame):
+                    try:
+                        return arith(op, left(frame), b)
+                    except RuntimeError as e:
+                        e.locate(position)
+                        raise
+            return run
+
+        right = self.expr(tup[2])
+        def run(frame):
+            try:
+                a = left(frame)
+                b = right(frame)
+                t = type(a)
+                if t is type(b):
+                    if t is int: return ifunc(a, b)
+                    if t is float: return func(a, b)
+                return arith(op, a, b)
+            except RuntimeError as e:
+                e.locate(position)
+                raise
+        return run
+
+    def troof_operand(self, tup):
+        # literal operands get their TROOF value worked out now
+        if tup[0] in LITERAL_TAGS:
+            value = troof(tup[1])
+            return lambda frame: value
+        value = self.expr(tup)
+        return lambda frame: troof(value(frame))
+
+    def bool_op(self, tup):
+        left = self.troof_operand(tup[1])
+        right = self.troof_operand(tup[2])
+        # both operands are always evaluated (the right one may still raise)
+        if tup[0] == "BOTH_OF":
+            def run(frame):
+                a = left(frame)
+                b = right(frame)
+                return a and b
+        elif tup[0] == "EITHER_OF":
+            def run(frame):
+                a = left(frame)
+                b = right(frame)
+                return a or b
+        else:
+            run = lambda frame: left(frame) != right(frame)
+        return run
+
+    def not_op(self, tup):
+        value = self.troof_operand(tup[1])
+        return lambda frame: not value(frame)
+
+    def all_any(self, tup):
+        parts = tuple(self.expr(child) for child in tup[1:])
+        combine = all if tup[0] == "ALL_OF" else any
+        # every operand is evaluated, like the original list-building loop
+        return lambda frame: combine([troof(part(frame)) for part in parts])
+
+    def compare(self, tup):
+        left = self.expr(tup[1])
+        right = self.expr(tup[2])
+        same = tup[0] == "BOTH_SAEM"
+        if same:
+            return lambda frame: saem(left(frame), right(frame))
+        return lambda frame: not saem(left(frame), right(frame))
+
+    def call(self, tup):
+        # ("CALL", ("Identifier", name), ("Arguments", <expression>...))
+        # the function's slots are saved, set to NOOB (its IT) and the
+        # arguments, and put back after its body ran; its value is what a
+        # FOUND YR left in its IT, or IT when the body just ends, NOOB after a GTFO
+        position = self.position
+        arguments = tup[2][1:]
+        function = self.scope.function(tup[1][1], len(arguments), position)
+        args = tuple(self.expr(arg) for arg in arguments)
+        body = self.bodies.setdefault(function.name, [None])
+        start = function.start
+        stop = start + function.count
+        name = function.name
+
+        def invoke(frame, values):
+            saved = frame[start:stop]
+            frame[start:stop] = [None] + values
+            try:
+                signal = body[0](frame)
+                return None if signal is GTFO else frame[start]
+            except RecursionError:
+                e = RuntimeError(f"Runtime Error: Too much recursion in '{name}'")
+                e.locate(position)
+                raise e from None
+            finally:
+                # also when the body failed, an embedding Interpreter may go on
+                frame[start:stop] = saved
+
+        if self.memos is not None and function.pure:
+            memo = self.memos.setdefault(name, Memo())
+            def run(frame):
+                values = [arg(frame) for arg in args]
+                key = memo_key(values)
+                value = memo.get(key)
+                if value is MISSING:
+                    value = invoke(frame, values)
+                    memo.put(key, value)
+                return value
+        else:
+            run = lambda frame: invoke(frame, [arg(frame) for arg in args])
+        return self.counted(run, position)
+
+    def concat(self, tup):
+        parts = tuple(self.expr(child) for child in tup[1:])
+        budget = self.budget
+        if budget is not None and budget.yarn is not None:
+            limit = budget.yarn
+            position = self.position
+            def run(frame):
+                value = smoosh([part(frame) for part in parts])
+                if len(value) > limit:
+                    raise BudgetExceeded("yarn", limit, position)
+                return value
+            return run
+        return lambda frame: smoosh([part(frame) for part in parts])
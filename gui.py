@@ -1,16 +1,19 @@
 import tkinter as tk
-from PIL import Image
 from tkinter import filedialog
 import lol_lexer as lexer
 import parser_try as parser
 from parser_try import ScanError
 from parser_try import ParseError
 from tkinter import simpledialog
-import re
+import time
+import queue
+import threading
+import interpreter
+from interpreter import Interpreter, OutputBuffer, Interrupted, show, plain
+from parse_cache import ParseCache
 
 # Source - https://www.w3resource.com/python-exercises/tkinter/python-tkinter-dialogs-and-file-handling-exercise-3.php
 
-class RuntimeError(Exception): ...
 class MultiList:
     def __init__(self, parent, title, name1, name2, side):
         self.parent = parent
@@ -32,10 +35,10 @@ class MultiList:
             self.list2.insert(tk.END, "None")
             
         
-        elif type(iterable) is dict:
+        elif type(iterable) is dict or isinstance(iterable, interpreter.SymbolTable):
             for k, v in iterable.items():
                 self.list1.insert(tk.END, k)
-                self.list2.insert(tk.END, v)
+                self.list2.insert(tk.END, show(v))
             
                 
         elif isinstance(iterable[0], lexer.Token):
@@ -44,6 +47,13 @@ class MultiList:
                 self.list2.insert(tk.END, iterable[i].type)
 
 
+    def set_row(self, index, name, value):
+        # replace one row in place instead of repopulating everything
+        self.list1.delete(index)
+        self.list1.insert(index, name)
+        self.list2.delete(index)
+        self.list2.insert(index, show(value))
+
     def scroll_all(self, *args):
         self.list1.yview(*args)
         self.list2.yview(*args)
@@ -99,221 +109,184 @@ def process_file(file_path):
     except Exception as e:
         file_label.config(text=f"Error: {str(e)}")
 
-def update_symboltable(symbols):
-    symbols_listbox.clear()
-    symbols_listbox.populate(symbols)
-    return
-
-def arith(op, a, b):
-    to_cast = a if isinstance(b, str) else b
-    if a == "WIN":
-        a = 1
-    elif a in ("FAIL", "NOOB", ""):
-        a = 0
-    if b == "WIN":
-        b = 1
-    elif b in ("FAIL", "NOOB", ""):
-        b = 0
-    
-    a = makeDigit(a)
-    b = makeDigit(b)
-
-    if isinstance(to_cast, int) or (isinstance(a, str) and isinstance(b, str)):
-        a = int(a)
-        b = int(b)
-    elif isinstance(to_cast, float):
-        a = float(a)
-        b = float(b)
-
-    if op == "SUM_OF":      return (a or 0) + (b or 0)
-    if op == "DIFF_OF":     return (a or 0) - (b or 0)
-    if op == "PRODUKT_OF":  return (a or 0) * (b or 0)
-    if op == "QUOSHUNT_OF": return (a or 0) / (b or 1)
-    if op == "MOD_OF":      return (a or 0) % (b or 1)
-    if op == "BIGGR_OF":    return a if a >= b else b
-    if op == "SMALLR_OF":   return a if a <= b else b
-
-def bool_op(op, a, b):
-    if isinstance(a, str):
-        a = 0 if a == "" or a == "NOOB" or a == "FAIL" else 1
-    if isinstance(b, str):
-        b = 0 if b == "" or b == "NOOB" or b == "FAIL" else 1
-
-    if op == "BOTH_OF":   return bool(a) and bool(b)
-    if op == "EITHER_OF": return bool(a) or bool(b)
-    if op == "WON_OF":    return bool(a) ^ bool(b)
-    if op == "NOT":       return not bool(a)
-
-def compare(op, a, b):
-    if op == "BOTH_SAEM":    return a == b
-    if op == "DIFFRINT":    return a != b
-
-def cast(v, t):
-    if t == "NUMBR": return 0 if v == "NOOB" else int(v)
-    if t == "NUMBAR": return 0.0 if v == "NOOB" else float(v)
-    if t == "YARN":  return "" if v == "NOOB" else str(v)
-    if t == "TROOF": return False if v == "NOOB" else bool(v)
-    return v
-
-def makeDigit(value):
-    if isinstance(value, int) or isinstance(value, float):
-        return value
-    NUMBAR_RE = r'-?(?:\d+\.\d*|\.\d+)(?:[eE][+-]?\d+)?' #floats
-    NUMBR_RE  = r'-?\d+' #integers
-
-    if re.search(NUMBAR_RE, value):
-        return float(value)
-    if re.search(NUMBR_RE, value):
-        return int(value)
-    
-    raise RuntimeError(f"Runtime Error: Cannot implicitly cast `{value}` to digit ")
-
-# should be kinda same as in the parser's var_eval_expr()
-# untested
-def eval_expr(tup, symbols):
-    # print(tup)
-    if tup[0] == "Identifier":
-        return symbols[tup[1]]
-    if tup[0] in ("Integer", "Float", "String", "Boolean"):
-        return tup[1]
-    if tup[0] == "CAST":
-        #    [0]       [1][0]       [1][1]       [2][0]         [2][1]
-        # ("CAST", (<Current_Type>, <Value>), ("Target Type", <Target_Type))
-        return cast(eval_expr(tup[1], symbols), tup[2][1])
-    
-    if tup[0] in ("SUM_OF","DIFF_OF","PRODUKT_OF","QUOSHUNT_OF","MOD_OF","BIGGR_OF","SMALLR_OF"):
-        return arith(tup[0], eval_expr(tup[1], symbols), eval_expr(tup[2], symbols))
-    
-    if tup[0] in ("BOTH_OF","EITHER_OF","WON_OF","BIGGR_OF","SMALLR_OF"):
-        return bool_op(tup[0], eval_expr(tup[1], symbols), eval_expr(tup[2], symbols))
-    
-    if tup[0] == "NOT":
-        return bool_op(tup[0], eval_expr(tup[1], symbols), 1)
-    
-    if tup[0] in ("ALL_OF", "ANY_OF"):
-        vals = []
-        for i in range(1, len(tup)):
-            result = eval_expr(tup[i], symbols)
-            if result in ("", 0, 0.0, "FAIL", "NOOB"):
-               vals.append(False)
-            else:
-               vals.append(True)           
-        return all(vals) if tup[0] == "ALL_OF" else any(vals)
-    
-    if tup[0] in ("DIFFRINT", "BOTH_SAEM"):
-        a = eval_expr(tup[1], symbols)
-        b = eval_expr(tup[2], symbols)
-
-        # return compare(tup[0], a, b)
-        new_a = makeDigit(a)
-        new_b = makeDigit(b)
-
-        # if new_a and new_b:
-        return compare(tup[0], new_a, new_b)
-        # else:
-        # #     # replace with yield Error
-        #     print(f"Error at instruction {tup[0]}: Operand(s) is not NUMBR or NUMBAR")
-
-    if tup[0] == "CONCATENATE":
-        result = ""
-        for i in range(1, len(tup)):
-            result = result + eval_expr(tup[i], symbols)
-        return result
-
-def loop_code(operation, variable, symbols, *code_block):
-    # run code block
-    for i in range(0, len(code_block)):
-        evaluate_ast(code_block[i], symbols)
-
-    #increment or decrement
-    if operation == "UPPIN":
-        symbols[variable[1]] += 1
-    else:
-        symbols[variable[1]] -= 1
-        
-    update_symboltable(symbols)
-
-def evaluate_ast(node, symbols):
-    # parser.pp_tuple(node)
-    instruction = node[0]
-    children = []
-    for i in range(1, len(node)):
-        children.append(node[i])
-
-    if instruction == "INPUT":
-        if children[0] in symbols:  # children[0] is the variable name
-            input = simpledialog.askstring(f"GIMMEH {children[0]}", "", parent=root)            
-            if input is None:
-                input = ""
-            symbols[children[0]] = input
-            update_symboltable(symbols)
-            outputText.insert(tk.END, input+"\n")
-        else:
-            # replace this with a raise Error() later
-            print(f"Variable identifier {children[0]} has not yet been declared")
-    
-    elif instruction == "LOOP":
-        label = children[0][1]
-        operation = children[1][0]
-        if children[1][1][1] not in symbols:
-            raise RuntimeError(f"Runtime Error: The variable '{children[1][1][1]}' has not yet been declared")
-        variable = children[1][1]
-        loop_type = children[2][0]
-        expression = children[2][1]
-        code_block = []
-        for i in range(1, len(children[3])):
-            code_block.append(children[3][i])
-
-        # print(code_block)
-        
-        if loop_type == "WILE":
-            while eval_expr(expression, symbols):
-                loop_code(operation, variable, symbols, *code_block)
-        else:       # loop_type == "TIL"
-            while eval_expr(expression, symbols) == False:
-                loop_code(operation, variable, symbols, *code_block)
-
-    elif instruction == "ASSIGN":
-        # children looks like 
-        #      [0][0]      [0][1]    [1][0]       [1][1]
-        # [("Identifier", <Value>), ("Value", <Expression>)]
-        if children[0][1] in symbols:
-            symbols[children[0][1]] = eval_expr(children[1][1], symbols)
-            update_symboltable(symbols)
-        else:
-            # replace this with a raise Error() later
-            print(f"Variable identifier {children[0]} has not yet been declared")
-
-    elif instruction == "PERM_CAST":    # Explicit cast using I HAS A
-        ident = children[0][1]
-        type = children[1][1]
-        if ident in symbols:
-            symbols[ident] = cast(symbols[ident], type)
-            update_symboltable(symbols)
-        else:
-            # replace this with a raise Error() later
-            print(f"Variable identifier {children[0]} has not yet been declared")
-    
-    elif instruction in ("ARITH_OPERATION", "BOOL_OPERATION"):
-        result = eval_expr(children[0], symbols)
-        symbols["IT"] = result
-        update_symboltable(symbols)
-    
-    elif instruction == "PRINT":
-        to_print = ""
-        for child in children:
-            to_print = to_print + str(eval_expr(child, symbols))
-        outputText.insert(tk.END, to_print+"\n")
+# at most this many symbol table refreshes per second while a program runs,
+# 0 = only once when the program ends
+SYMBOL_REFRESH_HZ = 10
+
+class SymbolView:
+    # Sits between the interpreter's on_symbols hook and the symbol table listbox.
+    # Changes are only remembered when they happen; flush() redraws the rows
+    # of the slots written since the last one (SymbolTable.dirty) whose value
+    # differs from what is on screen, throttled to SYMBOL_REFRESH_HZ.
+    def __init__(self, listbox, rate=SYMBOL_REFRESH_HZ):
+        self.listbox = listbox
+        self.interval = 1.0 / rate if rate else None
+        self.symbols = None
+        self.names = []     # row i = slot i
+        self.shown = []     # values currently displayed
+        self.last = 0.0
+
+    def reset(self, symbols):
+        self.listbox.clear()
+        self.listbox.populate(symbols)
+        self.symbols = None
+        self.names = list(symbols)
+        self.shown = [v for k, v in symbols.items()]
+        self.last = time.perf_counter()
+
+    def mark(self, symbols):
+        # on_symbols hook, called after every assignment so keep it cheap
+        self.symbols = symbols
+        if self.interval is not None:
+            now = time.perf_counter()
+            if now - self.last >= self.interval:
+                self.last = now
+                self.flush()
+
+    def flush(self):
+        if self.symbols is None:
+            return
+        shown = self.shown
+        dirty = self.symbols.dirty
+        values = self.symbols.values
+        while dirty:
+            # pop, the worker may be adding to it; a slot written again after
+            # this is back in the set for the next flush
+            slot = dirty.pop()
+            if slot >= len(shown):
+                # a function's IT or parameter, not in the table
+                continue
+            value = plain(values[slot])
+            old = shown[slot]
+            # 1, 1.0 and True compare equal but display differently
+            if value is not old and (type(value) is not type(old) or value != old):
+                shown[slot] = value
+                self.listbox.set_row(slot, self.names[slot], value)
+        self.symbols = None
+        root.update_idletasks()
+
+# Programs run on a worker thread so the window stays responsive. The worker
+# never touches Tk: output and GIMMEH requests go through run_queue, which
+# poll_worker() drains on the Tk thread every POLL_MS. Output is queued in
+# batches of lines (interpreter.OutputBuffer), at least one per POLL_MS.
+POLL_MS = 30
+# the worker blocks when this many messages are waiting, so a VISIBLE loop
+# can't outrun the text widget
+QUEUE_SIZE = 20
+# at most this many messages are handled per poll before Tk gets control back
+POLL_BATCH = 10
+
+run_queue = queue.Queue(QUEUE_SIZE)
+running = None          # Interpreter of the program currently running, if any
+parse_cache = ParseCache()
+latest_symbols = None   # set by the worker, picked up by poll_worker
+
+def ask_input(name):
+    input = simpledialog.askstring(f"GIMMEH {name}", "", parent=root)
+    if input is None:
+        input = ""
+    outputText.insert(tk.END, input+"\n")
+    return input
+
+# ---- worker thread side
+def queue_output(text):
+    run_queue.put(("output", text))
+
+def request_input(name):
+    # blocks the worker until the Tk thread has asked the user
+    reply = queue.Queue(1)
+    run_queue.put(("input", name, reply))
+    return reply.get()
+
+def note_symbols(symbols):
+    # on_symbols hook, just remember the table; the Tk thread reads it
+    global latest_symbols
+    latest_symbols = symbols
+
+def run_program(lol, ast, symbols):
+    try:
+        lol.run(ast, symbols)
+    except Interrupted as e:
+        run_queue.put(("output", str(e)))
+    except Exception as e:
+        run_queue.put(("error", e))
+    finally:
+        run_queue.put(("done", lol))
+
+# ---- Tk thread side
+def poll_worker():
+    global running, latest_symbols
+    lines = []
+    done = None
+    for _ in range(POLL_BATCH):
+        try:
+            message = run_queue.get_nowait()
+        except queue.Empty:
+            break
+        kind = message[0]
+        if kind == "output":
+            lines.append(message[1]+"\n")
+            continue
+        # anything else has to come after the output queued before it
+        if lines:
+            outputText.insert(tk.END, "".join(lines))
+            lines = []
+        if kind == "input":
+            message[2].put(ask_input(message[1]))
+        elif kind == "error":
+            outputText.insert(tk.END, message[1])
+            show_error_position(message[1])
+        elif kind == "done":
+            done = message[1]
+            break
+    if lines:
+        outputText.insert(tk.END, "".join(lines))
+        outputText.see(tk.END)
+
+    if latest_symbols is not None:
+        symbol_view.mark(latest_symbols)
+        latest_symbols = None
+
+    if done is None:
+        root.after(POLL_MS, poll_worker)
+        return
+    # whatever changed since the last throttled refresh
+    symbol_view.mark(done.symbols)
+    symbol_view.flush()
+    running = None
+    executeButton.config(state=tk.NORMAL)
+    stopButton.config(state=tk.DISABLED)
+
+def show_error_position(error):
+    # RuntimeErrors know the (line, col) they came from, put the cursor there
+    position = getattr(error, "position", None)
+    if position is None:
+        return
+    line, col = position
+    textEditor.tag_remove("error", "1.0", tk.END)
+    textEditor.tag_add("error", f"{line}.0", f"{line}.end")
+    textEditor.mark_set(tk.INSERT, f"{line}.{col - 1}")
+    textEditor.see(tk.INSERT)
+
+def stop_code():
+    if running is not None:
+        running.stop()
 
 def execute_code():
+    global running
+    if running is not None:
+        return
+
     # clear GUI
+    textEditor.tag_remove("error", "1.0", tk.END)
     lexemes.clear()
     symbols_listbox.clear()
     outputText.delete("1.0", tk.END)
     
     # Analyze
+    code = textEditor.get("1.0", "end-1c")
     try:
-        tokens = lexer.clean_lex(textEditor.get("1.0", "end-1c"))        
+        tokens = lexer.clean_lex(code)        
     except ScanError as e:
         outputText.insert(tk.END, e)
     except Exception as e:        
@@ -322,32 +295,30 @@ def execute_code():
         lexemes.populate(tokens)
 
         try:
-            p = parser.Parser(tokens)
-            ast = p.parse()
+            # the lexemes above are only for display, an unchanged program
+            # comes back from the parse cache without going through the parser
+            ast, symbols = parse_cache.lookup(parse_cache.text_key(code), lambda: interpreter.parse_tokens(tokens))
         except ParseError as e:
             outputText.insert(tk.END, e)
         except Exception as e:        
             outputText.insert(tk.END, e)
         else:
-            if len(p.symbols) == 0:
-                print(f"{p.symbols}")
+            if len(symbols) == 0:
+                print(f"{symbols}")
                 symbols_listbox.populate({"None": "None"})
             else:
-                symbols_listbox.populate(p.symbols)
+                symbol_view.reset(symbols)
                 parser.pp_tree(ast)
                 # parser.pp_tuple(ast)
                 print("=======================================")
             
-            statement_list = ast[2]
-            symbolTable = p.symbols
-
-            try:
-                for i in range(1, len(statement_list)):
-                    evaluate_ast(statement_list[i], symbolTable)
-            except Exception as e:
-                outputText.insert(tk.End, e)
-            except RuntimeError as e:
-                outputText.insert(tk.End, e)
+            output = OutputBuffer(queue_output, interval=POLL_MS / 1000)
+            running = Interpreter(output=output, input=request_input, on_symbols=note_symbols)
+            executeButton.config(state=tk.DISABLED)
+            stopButton.config(state=tk.NORMAL)
+            # daemon, so closing the window doesn't wait for a runaway loop
+            threading.Thread(target=run_program, args=(running, ast, symbols), daemon=True).start()
+            root.after(POLL_MS, poll_worker)
 
 # ================================ GUI Widgets ================================
 root = tk.Tk()
@@ -372,8 +343,13 @@ file_frame.pack(side=tk.TOP, anchor=tk.NW)
 # textEditor_frame =  tk.Frame(left_frame)
 textEditor = tk.Text(left_frame, width=50, height=33)
 textEditor.pack()
-executeButton = tk.Button(left_frame, text="EXECUTE", width=45, command=execute_code)
-executeButton.pack(padx=5, pady=5)
+textEditor.tag_configure("error", background="#ffd6d6")
+button_frame = tk.Frame(left_frame)
+executeButton = tk.Button(button_frame, text="EXECUTE", width=35, command=execute_code)
+executeButton.grid(row=0, column=0, padx=5)
+stopButton = tk.Button(button_frame, text="STOP", width=8, command=stop_code, state=tk.DISABLED)
+stopButton.grid(row=0, column=1, padx=5)
+button_frame.pack(pady=5)
 
 left_frame.grid(row=0, column=0, sticky=tk.W+tk.E)
 
@@ -386,6 +362,7 @@ lexemes.make()
 
 symbols_listbox = MultiList(middle_frame, "SYMBOL TABLE", "Identifier", "Value", tk.BOTTOM)
 symbols_listbox.make()
+symbol_view = SymbolView(symbols_listbox)
 
 middle_frame.grid(row=0, column=1, sticky=tk.W+tk.E)
 
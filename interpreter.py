@@ -0,0 +1,285 @@
+import sys
+import time
+import threading
+import lol_lexer as lexer
+import parser_try as parser
+import bytecode
+import optimizer
+from compiler import compile_program
+from resolver import resolve
+from lol_runtime import RuntimeError, CompileError, Interrupted, show, plain, CALL_DEPTH, Budget, BudgetExceeded
+
+# Evaluator core shared by the GUI and the command-line runner.
+# Nothing in here may import tkinter (or PIL) so programs can run headless,
+# and nothing is module-global so several Interpreters can run side by side.
+
+# default sinks, used when the embedding code doesn't pass its own
+def stdout_output(text):
+    sys.stdout.write(text + "\n")
+
+def stdin_input(name):
+    sys.stdout.flush()
+    # EOF behaves like cancelling the GUI dialog
+    return sys.stdin.readline().rstrip("\r\n")
+
+# lines an OutputBuffer holds at most
+OUTPUT_LINES = 1000
+# seconds a Watchdog's thread waits for the next run before it ends
+WATCHDOG_IDLE = 1.0
+
+class OutputBuffer:
+    # an output sink that collects VISIBLE lines and hands them on to sink a
+    # batch at a time, joined by "\n" (sink adds the last newline as usual),
+    # so a sink with a per-call cost (the GUI's queue) pays it per batch.
+    # Interpreter flushes it before every GIMMEH and when a run ends; with an
+    # interval (seconds) it also flushes that often while a run goes on, from
+    # a thread of its own (start/stop), so a VISIBLE before a long loop shows
+    # before the loop is done
+    def __init__(self, sink, lines=OUTPUT_LINES, interval=None):
+        self.sink = sink
+        self.lines = lines
+        self.interval = interval
+        self.pending = []
+        # the running program and the timer both flush, batches keep their order
+        self.lock = threading.Lock()
+        self.ticker = None      # (thread, event that stops it) while started
+
+    def write(self, text):
+        with self.lock:
+            pending = self.pending
+            pending.append(text)
+            if len(pending) < self.lines:
+                return
+            self.pending = []
+            self.sink("\n".join(pending))
+
+    def flush(self):
+        with self.lock:
+            if self.pending:
+                text = "\n".join(self.pending)
+                self.pending = []
+                self.sink(text)
+
+    def start(self):
+        # flush every interval seconds until stop(); nothing without an interval
+        if self.interval is None or self.ticker is not None:
+            return
+        done = threading.Event()
+        def tick():
+            while not done.wait(self.interval):
+                self.flush()
+        thread = threading.Thread(target=tick, daemon=True)
+        self.ticker = (thread, done)
+        thread.start()
+
+    def stop(self):
+        if self.ticker is not None:
+            thread, done = self.ticker
+            self.ticker = None
+            done.set()
+            thread.join()
+        self.flush()
+
+class Watchdog:
+    # ends runs that go over a time budget: arm() before a run, disarm()
+    # after it; if the deadline passes in between, stop[0] gets the
+    # BudgetExceeded to raise (lol_runtime.stopped). One thread serves every
+    # run of an Interpreter (a batch worker makes thousands), rather than a
+    # threading.Timer per run; it ends once no run has come for WATCHDOG_IDLE
+    # seconds and is started again by the next arm()
+    def __init__(self, stop):
+        self.stop = stop
+        self.cond = threading.Condition()
+        self.deadline = None    # time.monotonic() the armed run has until
+        self.seconds = None
+        self.thread = None
+
+    def arm(self, seconds):
+        with self.cond:
+            self.deadline = time.monotonic() + seconds
+            self.seconds = seconds
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.watch, daemon=True)
+                self.thread.start()
+            else:
+                self.cond.notify()
+
+    def disarm(self):
+        # no notify, a thread waiting for the old deadline finds it gone
+        with self.cond:
+            self.deadline = None
+
+    def watch(self):
+        with self.cond:
+            while True:
+                deadline = self.deadline
+                if deadline is None:
+                    if not self.cond.wait(WATCHDOG_IDLE) and self.deadline is None:
+                        self.thread = None
+                        return
+                    continue
+                left = deadline - time.monotonic()
+                if left > 0:
+                    self.cond.wait(left)
+                    continue
+                self.stop[0] = BudgetExceeded("time", self.seconds)
+                self.deadline = None
+
+class SymbolTable:
+    # plain name -> value view over a running program's frame.
+    # slots maps each name to its index in values (see resolver.py); values
+    # may hold Ropes (lol_runtime.smoosh), the accessors give them as strs.
+    # dirty is the slots written since a listener last took them (dirty.pop(),
+    # safe while the program runs on another thread); slots past len() are
+    # functions' own, see resolver.py
+    def __init__(self, slots=None, values=None):
+        self.slots = slots if slots is not None else {}
+        self.values = values if values is not None else []
+        self.dirty = set()
+
+    @classmethod
+    def from_scope(cls, scope, frame=None):
+        return cls(scope.slots, scope.frame() if frame is None else frame)
+
+    def __getitem__(self, name): return plain(self.values[self.slots[name]])
+    def __setitem__(self, name, value): self.values[self.slots[name]] = value
+    def __contains__(self, name): return name in self.slots
+    def __len__(self): return len(self.slots)
+    def __iter__(self): return iter(self.slots)
+    def __repr__(self): return f"SymbolTable({self.as_dict()!r})"
+
+    def get(self, name, default=None):
+        slot = self.slots.get(name)
+        return default if slot is None else plain(self.values[slot])
+    def items(self): return [(name, plain(self.values[slot])) for name, slot in self.slots.items()]
+    def as_dict(self): return dict(self.items())
+
+def parse_source(code, cache=None):
+    # lex + parse, returns the AST and the symbols declared in WAZZUP;
+    # the tokens are kept compact (lol_lexer.TokenBuffer) while parsing.
+    # With a parse_cache.ParseCache an unchanged source isn't lexed again
+    if cache is None:
+        return parse_tokens(lexer.lex_compact(code))
+    return cache.lookup(cache.text_key(code), lambda: parse_tokens(lexer.lex_compact(code)))
+
+def parse_file(f):
+    # like parse_source, but lexes the open file (text, binary or mmap) in chunks
+    return parse_tokens(lexer.lex_stream(f))
+
+def parse_tokens(tokens):
+    # tokens are a lol_lexer.TokenBuffer or any iterable of Tokens
+    p = parser.BufferParser(tokens) if isinstance(tokens, lexer.TokenBuffer) else parser.Parser(tokens)
+    ast = p.parse()
+    return ast, p.symbols
+
+ENGINES = ("closures", "vm")
+
+class Interpreter:
+    # output(text) gets every VISIBLE line (or an OutputBuffer, which passes
+    # them on in batches), input(name) answers GIMMEH,
+    # on_symbols(symbols) is called whenever a variable changes (optional),
+    # its slot added to symbols.dirty first.
+    # engine picks how programs run: "closures" (compiler.py) or "vm" (bytecode.py),
+    # optimize runs optimizer.py over the AST first, profiler (a profiler.Profiler)
+    # times every statement, closures only, memoize lets pure functions
+    # (resolver.py) remember their last lol_runtime.MEMO_SIZE results,
+    # max_depth is how many function calls may run at once, budget (a
+    # lol_runtime.Budget) limits the steps, time and YARNs of each run
+    def __init__(self, output=None, input=None, on_symbols=None, engine="closures", optimize=True, profiler=None,
+                 memoize=False, max_depth=CALL_DEPTH, budget=None):
+        if engine not in ENGINES:
+            raise ValueError(f"unknown engine {engine!r}, expected one of {ENGINES}")
+        if profiler is not None and engine != "closures":
+            raise ValueError("profiling needs the closures engine")
+        self.output = output or stdout_output
+        self.input = input or stdin_input
+        self.buffer = None
+        if isinstance(output, OutputBuffer):
+            # GIMMEH's prompt has to come after the output before it
+            read = self.input
+            flush = output.flush
+            self.buffer = output
+            def buffered_input(name):
+                flush()
+                return read(name)
+            self.output = output.write
+            self.input = buffered_input
+        self.on_symbols = on_symbols
+        self.engine = engine
+        self.optimize = optimize
+        self.profiler = profiler
+        self.memoize = memoize
+        self.max_depth = max_depth
+        self.budget = budget
+        self.eliminated = 0     # AST nodes the optimizer removed in the last run
+        self.symbols = SymbolTable()
+        # a list so compiled loops can poll stop_requested[0] without an attribute lookup
+        self.stop_requested = [False]
+        self.watchdog = Watchdog(self.stop_requested)
+
+    def stop(self):
+        # safe to call from another thread, the running program raises
+        # Interrupted at its next loop iteration
+        self.stop_requested[0] = True
+
+    def changed(self, slot):
+        if self.on_symbols is not None:
+            symbols = self.symbols
+            symbols.dirty.add(slot)
+            self.on_symbols(symbols)
+
+    def compile(self, ast, scope):
+        # closures are bound to this interpreter's sinks, see compiler.py
+        return compile_program(ast, self, scope)
+
+    def run(self, ast, symbols=None):
+        # symbols are the WAZZUP values from the parser; every run gets a fresh
+        # frame built from them, so the same AST can be run again
+        return self.prepare(ast, symbols)()
+
+    def prepare(self, ast, symbols=None):
+        # optimizes and compiles once; each call of the returned function runs
+        # the program on a fresh frame and returns its SymbolTable
+        if self.optimize:
+            yarn = self.budget.yarn if self.budget is not None else None
+            ast, self.eliminated = optimizer.optimize(ast, symbols, yarn)
+        scope = resolve(symbols, ast)
+        if self.engine == "vm":
+            code = bytecode.compile_program(ast, scope, self.on_symbols is not None, self.memoize, self.budget)
+            def start():
+                self.symbols = SymbolTable.from_scope(scope)
+                bytecode.run(code, self.output, self.input, self.changed,
+                             self.symbols.values, self.stop_requested, max_depth=self.max_depth, budget=self.budget)
+        else:
+            program = self.compile(ast, scope)
+            def start():
+                self.symbols = SymbolTable.from_scope(scope)
+                program(self.symbols.values)
+
+        budget = self.budget
+        buffer = self.buffer
+        seconds = budget.seconds if budget is not None else None
+        watchdog = self.watchdog
+        def run():
+            if buffer is not None:
+                buffer.start()
+            if budget is not None:
+                budget.start()
+            if seconds is not None:
+                # stops the program like stop(), with the error to raise
+                watchdog.arm(seconds)
+            try:
+                start()
+                return self.symbols
+            finally:
+                if seconds is not None:
+                    watchdog.disarm()
+                # a stop() only applies to the run it interrupted
+                self.stop_requested[0] = False
+                if buffer is not None:
+                    buffer.stop()
+        return run
+
+    def run_source(self, code):
+        ast, symbols = parse_source(code)
+        return self.run(ast, symbols)
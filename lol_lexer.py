@@ -1,10 +1,14 @@
 import sys
 import re
+import codecs
+from array import array
 from dataclasses import dataclass
 
 #one instance per lexeme
 @dataclass
 class Token:
+    #no per-instance __dict__, see also TokenBuffer for big inputs
+    __slots__ = ('type', 'lexeme', 'line', 'col')
     type: str #KEYWORD, IDENT, NUMBR, NUMBAR, YARN, TROOF, TYPE
     lexeme: str #exact text
     line: int #line number of token first char
@@ -72,6 +76,9 @@ TOKEN_SPEC = [
 MASTER_RE = re.compile('|'.join(f'(?P<{name}>{pat})' for name, pat in TOKEN_SPEC),
                        re.MULTILINE)
 
+#collapses the whitespace inside multi-word keywords
+KEYWORD_WS_RE = re.compile(r'\s+')
+
 #iterates through the text left to right
 def lex(text: str):
     line = 1
@@ -98,9 +105,16 @@ def lex(text: str):
 
         col = m.start() - col_start_of_line + 1
 
-        #Normalize KEYWORD lexeme
+        #Keywords get their final type straight away (see KEYWORD_TYPES).
+        #Single-spaced spellings hit the dict directly, only odd spacing
+        #like "I  HAS\tA" needs normalizing first
         if type == 'KEYWORD':
-            lexeme = re.sub(r'\s+', ' ', lexeme)
+            kind = KEYWORD_TYPES.get(lexeme)
+            if kind is None:
+                lexeme = KEYWORD_WS_RE.sub(' ', lexeme)
+                kind = KEYWORD_TYPES.get(lexeme, 'KEYWORD')
+            yield Token(kind, lexeme, line, col)
+            continue
         
         if type == 'YARN':
             inner = lexeme[1:-1]
@@ -146,86 +160,226 @@ TYPECAST_OPS = {
     }
 
 
+#normalized keyword lexeme -> token type, keywords missing here stay 'KEYWORD'
+KEYWORD_TYPES = {
+    "HAI": "CODE_START",
+    "KTHXBYE": "CODE_END",
+    "WAZZUP": "VARLIST_START",
+    "BUHBYE": "VARLIST_END",
+    "I HAS A": "VAR_DECL",
+    "ITZ": "VAR_ASSIGN_ITZ",
+    "O RLY?": "O_RLY?",
+    "YA RLY": "YA_RLY",
+    "NO WAI": "NO_WAI",
+    "HOW IZ I": "HOW_IZ_I",
+    "IF U SAY SO": "IF_U_SAY_SO",
+    "FOUND YR": "FOUND_YR",
+    "I IZ": "I_IZ",
+    "IM IN YR": "IM_IN_YR",
+    "IM OUTTA YR": "IM_OUTTA_YR",
+}
+#keywords that are their own type
+for k in ("GIMMEH", "VISIBLE", "AN", "+", "SMOOSH", "R", "MKAY", "OIC", "MEBBE", "WTF?", "OMG",
+          "OMGWTF", "GTFO", "TIL", "WILE", "YR", "UPPIN", "NERFIN"):
+    KEYWORD_TYPES[k] = k
+KEYWORD_TYPES.update(ARITH_OPS)
+KEYWORD_TYPES.update(COMPARE_OPS)
+KEYWORD_TYPES.update(TYPECAST_OPS)
+
+
+#every token type, TokenBuffer stores the index into this list
+TOKEN_TYPES = [name for name, pat in TOKEN_SPEC] + ['ERROR', 'KEYWORD']
+for kind in KEYWORD_TYPES.values():
+    if kind not in TOKEN_TYPES:
+        TOKEN_TYPES.append(kind)
+TYPE_CODES = {kind: code for code, kind in enumerate(TOKEN_TYPES)}
+#types whose lexeme may need its whitespace normalized again
+KEYWORD_CODES = frozenset(TYPE_CODES[kind] for kind in KEYWORD_TYPES.values()) | {TYPE_CODES['KEYWORD']}
+
+class TokenBuffer:
+    #Struct-of-arrays token list: a type code, source offsets and line/col
+    #per token (about 25 bytes) instead of a Token object and its lexeme
+    #string. kind(i) reads a type without making anything (what the parser
+    #mostly asks, see parser_try.BufferParser); a Token is rebuilt from the
+    #source only when one is looked at, so len(), [i] and iteration (the
+    #GUI's lexeme list) work as on a list.
+    def __init__(self, src):
+        self.src = src
+        self.types = array('B')
+        self.starts = array('q')
+        self.ends = array('q')
+        self.lines = array('i')
+        self.cols = array('i')
+
+    def __len__(self):
+        return len(self.types)
+
+    def kind(self, i):
+        return TOKEN_TYPES[self.types[i]]
+
+    def lexeme(self, i):
+        text = self.src[self.starts[i]:self.ends[i]]
+        if self.types[i] in KEYWORD_CODES and text not in KEYWORD_TYPES:
+            text = KEYWORD_WS_RE.sub(' ', text)
+        return text
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self.types)
+        return Token(TOKEN_TYPES[self.types[i]], self.lexeme(i), self.lines[i], self.cols[i])
+
+    def __iter__(self):
+        for i in range(len(self.types)):
+            yield self[i]
+
+def lex_compact(text: str):
+    #same tokens as lex(text), stored in a TokenBuffer
+    buf = TokenBuffer(text)
+    add_type = buf.types.append
+    add_start = buf.starts.append
+    add_end = buf.ends.append
+    add_line = buf.lines.append
+    add_col = buf.cols.append
+    codes = TYPE_CODES
+    keyword_types = KEYWORD_TYPES
+    line = 1
+    col_start_of_line = 0
+
+    for m in MASTER_RE.finditer(text):
+        type = m.lastgroup
+        if type == 'NEWLINE':
+            line += 1
+            col_start_of_line = m.end()
+            continue
+        if type in ('SKIP', 'LINE_COMMENT', 'BLOCK_COMMENT'):
+            continue
+        if type == 'MISMATCH':
+            type = 'ERROR'
+        elif type == 'KEYWORD':
+            lexeme = m.group()
+            kind = keyword_types.get(lexeme)
+            if kind is None:
+                kind = keyword_types.get(KEYWORD_WS_RE.sub(' ', lexeme), 'KEYWORD')
+            type = kind
+        start, end = m.span()
+        add_type(codes[type])
+        add_start(start)
+        add_end(end)
+        add_line(line)
+        add_col(start - col_start_of_line + 1)
+    return buf
+
 def clean_lex(src):
-    tokens = list(lex(src))
-    index = 0
-
-    for t in tokens:
-        k = t.lexeme
-        if t.type == 'KEYWORD':
-            if k == "HAI":
-                t.type = "CODE_START"
-            elif k == "KTHXBYE":
-                t.type = "CODE_END"
-            elif k == "WAZZUP":
-                t.type = "VARLIST_START"
-            elif k == "BUHBYE":
-                t.type = "VARLIST_END"
-            elif k == "I HAS A":
-                t.type = "VAR_DECL"
-            elif k == "ITZ":
-                t.type = "VAR_ASSIGN_ITZ"
-            elif k == "GIMMEH":
-                t.type = "GIMMEH"
-            elif k == "VISIBLE":
-                t.type = "VISIBLE"
-            elif k == "AN":
-                t.type = "AN"
-            elif k in ARITH_OPS:
-                t.type = ARITH_OPS[k]
-            elif k in COMPARE_OPS:
-                t.type = COMPARE_OPS[k]
-            elif k == "+":
-                t.type = "+"
-            elif k == "SMOOSH":
-                t.type = "SMOOSH"
-            elif k == "R":
-                t.type = "R"
-            elif k in TYPECAST_OPS:
-                t.type = TYPECAST_OPS[k]
-            elif k == "MKAY":
-                t.type = "MKAY"
-            elif k == "O RLY?":
-                t.type = "O_RLY?"
-            elif k == "OIC":
-                t.type = "OIC"
-            elif k == "YA RLY":
-                t.type = "YA_RLY"
-            elif k == "NO WAI":
-                t.type = "NO_WAI"
-            elif k == "WTF?":
-                t.type = "WTF?"
-            elif k == "OMG":
-                t.type = "OMG"
-            elif k == "OMGWTF":
-                t.type = "OMGWTF"
-            elif k == "HOW IZ I":
-                t.type = "HOW_IZ_I"
-            elif k == "IF U SAY SO":
-                t.type = "IF_U_SAY_SO"
-            elif k == "FOUND YR":
-                t.type = "FOUND_YR"
-            elif k == "GTFO":
-                t.type = "GTFO"
-            elif k == "I IZ":
-                t.type = "I_IZ"
-            elif k == "IM IN YR":
-                t.type = "IM_IN_YR"
-            elif k == "IM OUTTA YR":
-                t.type = "IM_OUTTA_YR"
-            elif k == "TIL":
-                t.type = "TIL"
-            elif k == "WILE":
-                t.type = "WILE"
-            elif k == "YR":
-                t.type = "YR"
-            elif k == "UPPIN":
-                t.type = "UPPIN"
-            elif k == "NERFIN":
-                t.type = "NERFIN"
-   
-    return tokens;            
+    #lex() already classifies keywords; the tokens are kept in a compact
+    #TokenBuffer rather than a list of Token objects
+    return lex_compact(src)
+
+
+#Streaming lexer, for sources too big to hold as one str.
+#Reads a text file, binary file or mmap chunk by chunk; every chunk is lexed
+#up to its last newline and the rest is carried over into the next one.
+#A token can still reach past that newline, so lexing also stops early
+#(and carries from there) at
+#  - an OBTW without its TLDR yet
+#  - a '"' without its closing quote yet (YARNs may span lines)
+#  - trailing words that could start a multi-word keyword ("SUM" + "\nOF")
+CHUNK_SIZE = 1 << 20
+
+#"I", "I HAS", "SUM", "IM IN", ... every proper prefix of a multi-word keyword
+KEYWORD_PREFIXES = set()
+for pat in KEYWORDS:
+    words = re.split(r'\\s\+', pat)
+    for n in range(1, len(words)):
+        KEYWORD_PREFIXES.add(' '.join(words[:n]))
+
+def read_chunks(f, chunk_size=CHUNK_SIZE):
+    decoder = None
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        if not isinstance(chunk, str):
+            #bytes from a binary file or mmap, a character may be split across reads
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder('utf-8')()
+            chunk = decoder.decode(chunk)
+        yield chunk
+    if decoder is not None:
+        rest = decoder.decode(b'', final=True)
+        if rest:
+            yield rest
+
+def lex_stream(f, chunk_size=CHUNK_SIZE):
+    #same tokens as lex(f.read()), produced lazily
+    line = 1
+    line_start = 0  #offset of the current line in buf, negative once it was carried past
+    buf = ""
+    pos = 0         #where lexing resumes in buf
+    chunks = read_chunks(f, chunk_size)
+    final = False
+
+    while not final:
+        chunk = next(chunks, None)
+        if chunk is None:
+            final = True
+            end = len(buf)
+        else:
+            buf += chunk
+            #only the new text can hold a later newline
+            end = buf.rfind('\n', len(buf) - len(chunk)) + 1
+            if end == 0:
+                continue
+
+        tokens = []
+        starts = []
+        stop = end
+        #finditer from pos, so (?<!\w) and \b still see the char before it
+        for m in MASTER_RE.finditer(buf, pos, end):
+            type = m.lastgroup
+            if type == 'NEWLINE':
+                line += 1
+                line_start = m.end()
+                continue
+            if type in ('SKIP', 'LINE_COMMENT', 'BLOCK_COMMENT'):
+                continue
+            lexeme = m.group()
+            start = m.start()
+            if not final and ((type == 'KEYWORD' and lexeme == 'OBTW') or
+                              (type == 'MISMATCH' and lexeme == '"')):
+                #comment or YARN not closed within this chunk
+                stop = start
+                break
+            col = start - line_start + 1
+            if type == 'MISMATCH':
+                type = 'ERROR'
+            elif type == 'KEYWORD':
+                kind = KEYWORD_TYPES.get(lexeme)
+                if kind is None:
+                    lexeme = KEYWORD_WS_RE.sub(' ', lexeme)
+                    kind = KEYWORD_TYPES.get(lexeme, 'KEYWORD')
+                type = kind
+            tokens.append(Token(type, lexeme, line, col))
+            starts.append(start)
+
+        if not final and stop == end:
+            #hold back the longest tail that could still become a keyword,
+            #the line count goes back to where its first token was
+            for n in (3, 2, 1):
+                if len(tokens) >= n and ' '.join(t.lexeme for t in tokens[-n:]) in KEYWORD_PREFIXES:
+                    first = tokens[-n]
+                    stop = starts[-n]
+                    line = first.line
+                    line_start = stop - first.col + 1
+                    del tokens[-n:]
+                    break
+
+        yield from tokens
 
+        #keep one char before the resume point for the lookbehinds
+        keep = stop - 1 if stop > 0 else 0
+        buf = buf[keep:]
+        pos = stop - keep
+        line_start -= keep
 
 
 def main():
@@ -0,0 +1,404 @@
+import re
+import operator
+import math
+from functools import lru_cache
+
+# LOLCODE value operations, shared by the parser (WAZZUP values), the closure
+# compiler, the bytecode VM and the optimizer.
+#
+# Values are plain Python objects, one type per LOLCODE 1.2 type:
+#   NOOB   None
+#   TROOF  bool      (WIN = True, FAIL = False)
+#   NUMBR  int
+#   NUMBAR float
+#   YARN   str
+# so the type of an operand is a `type(v) is ...` check, and numbers never
+# go anywhere near a regex. The one exception is a long YARN built by SMOOSH,
+# which may be a Rope (see smoosh() below) instead of a str.
+
+class RuntimeError(Exception):
+    # position is the (line, col) of the operation or statement that failed;
+    # the engines fill it in as the error leaves it, innermost first
+    position = None
+
+    def locate(self, position):
+        if self.position is None:
+            self.position = position
+
+    def __str__(self):
+        return located(super().__str__(), self.position)
+
+def located(message, position):
+    # message as a located RuntimeError shows it
+    if position is None:
+        return message
+    return f"{message.rstrip()} (line {position[0]}, col {position[1]})"
+
+class CompileError(Exception): ...
+# raised inside a running program when Interpreter.stop() was called
+class Interrupted(Exception): ...
+
+class BudgetExceeded(RuntimeError):
+    # a run went over a limit of its Budget (see below): kind is "steps",
+    # "time" or "yarn", limit the limit it hit
+    MESSAGES = {
+        "steps": "Runtime Error: Over the budget of {} loop steps and calls",
+        "time":  "Runtime Error: Over the time budget of {} seconds",
+        "yarn":  "Runtime Error: YARN longer than the budget of {} characters",
+    }
+
+    def __init__(self, kind, limit, position=None):
+        super().__init__(self.MESSAGES[kind].format(limit))
+        self.kind = kind
+        self.limit = limit
+        self.position = position
+
+NOOB = None
+
+def type_name(v):
+    if v is None: return "NOOB"
+    t = type(v)
+    if t is bool: return "TROOF"
+    if t is int: return "NUMBR"
+    if t is float: return "NUMBAR"
+    return "YARN"
+
+# ---------------------------------------------------------------- YARN -> number
+# a YARN is a number only if all of it is a NUMBR or NUMBAR literal
+NUMBR_YARN = re.compile(r'-?\d+')
+NUMBAR_YARN = re.compile(r'-?(?:\d+\.\d*|\.\d+)')
+
+@lru_cache(maxsize=4096)
+def yarn_number(s):
+    # cached: loops tend to convert the same few GIMMEH answers over and over
+    if NUMBR_YARN.fullmatch(s):
+        return int(s)
+    if NUMBAR_YARN.fullmatch(s):
+        return float(s)
+    raise RuntimeError(f"Runtime Error: Cannot implicitly cast `{s}` to digit ")
+
+@lru_cache(maxsize=4096)
+def yarn_compared(s):
+    # a YARN as BOTH SAEM sees it: a numeric one as its number, like the
+    # arithmetic casts it, so a GIMMEH answer "1" is the NUMBR 1; others as is
+    if NUMBR_YARN.fullmatch(s):
+        return int(s)
+    if NUMBAR_YARN.fullmatch(s):
+        return float(s)
+    return s
+
+def number(v):
+    # implicit cast for math: NUMBR/NUMBAR as they are, TROOF -> 0/1,
+    # numeric YARNs parsed, NOOB and other YARNs are errors
+    t = type(v)
+    if t is int or t is float:
+        return v
+    if t is bool:
+        return int(v)
+    if t is str:
+        return yarn_number(v)
+    if t is Rope:
+        return yarn_number(str(v))
+    raise RuntimeError("Runtime Error: Cannot implicitly cast NOOB to digit ")
+
+# ---------------------------------------------------------------- math
+def int_quoshunt(a, b):
+    # NUMBR division truncates toward zero
+    if b == 0:
+        raise RuntimeError("Runtime Error: Division by zero")
+    q = abs(a) // abs(b)
+    return q if (a < 0) == (b < 0) else -q
+
+def int_mod(a, b):
+    # sign follows the dividend, to go with int_quoshunt
+    return a - b * int_quoshunt(a, b)
+
+def float_quoshunt(a, b):
+    if b == 0:
+        raise RuntimeError("Runtime Error: Division by zero")
+    return a / b
+
+def float_mod(a, b):
+    if b == 0:
+        raise RuntimeError("Runtime Error: Division by zero")
+    return math.fmod(a, b)
+
+# two NUMBRs
+INT_FUNCS = {
+    "SUM_OF":      operator.add,
+    "DIFF_OF":     operator.sub,
+    "PRODUKT_OF":  operator.mul,
+    "QUOSHUNT_OF": int_quoshunt,
+    "MOD_OF":      int_mod,
+    "BIGGR_OF":    max,
+    "SMALLR_OF":   min,
+}
+
+# two NUMBARs
+ARITH_FUNCS = {
+    "SUM_OF":      operator.add,
+    "DIFF_OF":     operator.sub,
+    "PRODUKT_OF":  operator.mul,
+    "QUOSHUNT_OF": float_quoshunt,
+    "MOD_OF":      float_mod,
+    "BIGGR_OF":    max,
+    "SMALLR_OF":   min,
+}
+
+def arith(op, a, b):
+    # the general case, the engines handle two NUMBRs / two NUMBARs themselves
+    a = number(a)
+    b = number(b)
+    if type(a) is int and type(b) is int:
+        return INT_FUNCS[op](a, b)
+    # any NUMBAR makes it NUMBAR math
+    return ARITH_FUNCS[op](float(a), float(b))
+
+# ---------------------------------------------------------------- TROOF
+def troof(v):
+    # FAIL, NOOB, 0, 0.0 and "" are FAIL, everything else is WIN
+    if v is True: return True
+    if v is False or v is None: return False
+    if type(v) is str: return v != ""
+    if type(v) is Rope: return True     # never empty
+    return v != 0
+
+def bool_op(op, a, b):
+    a = troof(a)
+    b = troof(b)
+    if op == "BOTH_OF":   return a and b
+    if op == "EITHER_OF": return a or b
+    if op == "WON_OF":    return a != b
+
+def saem(a, b):
+    # BOTH SAEM: NUMBR and NUMBAR compare as numbers, and so does a numeric
+    # YARN (yarn_compared); any other two values of different types differ
+    ta = type(a)
+    tb = type(b)
+    if ta is Rope:
+        a, ta = str(a), str
+    if ta is str:
+        a = yarn_compared(a)
+        ta = type(a)
+    if tb is Rope:
+        b, tb = str(b), str
+    if tb is str:
+        b = yarn_compared(b)
+        tb = type(b)
+    if ta is tb:
+        return a == b
+    if (ta is int or ta is float) and (tb is int or tb is float):
+        return a == b
+    return False
+
+def compare(op, a, b):
+    if op == "BOTH_SAEM": return saem(a, b)
+    if op == "DIFFRINT":  return not saem(a, b)
+
+def case_key(v):
+    # v as a dict key that finds the WTF? cases BOTH SAEM as it: NUMBRs and
+    # NUMBARs go by value (1 and 1.0 are already the same key), so do numeric
+    # YARNs, and a TROOF must not find the NUMBR 1 or 0
+    t = type(v)
+    if t is bool: return (bool, v)
+    if t is Rope: return yarn_compared(str(v))
+    if t is str: return yarn_compared(v)
+    return v
+
+# ---------------------------------------------------------------- YARN
+def yarn(v):
+    # implicit cast to YARN (VISIBLE, SMOOSH); NUMBARs show two decimals
+    t = type(v)
+    if t is str: return v
+    if t is int: return str(v)
+    if t is float: return "%.2f" % v
+    if t is bool: return "WIN" if v else "FAIL"
+    if t is Rope: return str(v)
+    # the spec makes this an error, but VISIBLE of an unset variable has
+    # always printed NOOB here
+    return "NOOB"
+
+# SMOOSH onto a long YARN doesn't copy it: the result is a Rope, the list of
+# its parts, and SMOOSHing onto that extends the same list in place. So
+#   report R SMOOSH report AN line
+# in a loop takes time linear in the report's length instead of quadratic.
+# Ropes are never changed: a Rope is the first `count` parts of the list, and
+# a SMOOSH onto one that isn't the end of its list (it was SMOOSHed onto
+# before) copies its parts. To LOLCODE a Rope is just a YARN, the functions
+# here join it (once) wherever it is used as a value.
+ROPE_MIN = 256      # SMOOSHing onto a shorter YARN just copies it
+
+class Rope:
+    __slots__ = ("parts", "count", "text", "length")
+
+    def __init__(self, parts, length):
+        self.parts = parts
+        self.count = len(parts)
+        self.text = None
+        self.length = length    # of the text, for Budget.yarn
+
+    def __len__(self):
+        return self.length
+
+    def __str__(self):
+        if self.text is None:
+            self.text = "".join(self.parts[:self.count])
+        return self.text
+
+def smoosh(values):
+    # SMOOSH of its operands' values, a str or, for a long first operand, a Rope
+    first = values[0]
+    t = type(first)
+    if t is Rope:
+        parts = first.parts
+        if first.count != len(parts):
+            parts = parts[:first.count]
+    elif t is str and len(first) >= ROPE_MIN:
+        parts = [first]
+    else:
+        return "".join([yarn(v) for v in values])
+    rest = [yarn(v) for v in values[1:]]
+    parts.extend(rest)
+    return Rope(parts, len(first) + sum(map(len, rest)))
+
+def plain(v):
+    # v with a Rope joined into a str, for values leaving the interpreter
+    return str(v) if type(v) is Rope else v
+
+def show(v):
+    # how the GUI's symbol table displays a value
+    return yarn(v)
+
+# ---------------------------------------------------------------- calls
+# function calls running at once before a program fails with "Too much
+# recursion", Interpreter(max_depth=...); they're kept on the VM's own call
+# stack, not Python's
+CALL_DEPTH = 100000
+
+# ---------------------------------------------------------------- budgets
+class Budget:
+    # limits on each run of a program, Interpreter(budget=...); None is no limit
+    #   steps    loop iterations and function calls, together
+    #   seconds  wall-clock time
+    #   yarn     characters in a YARN a SMOOSH makes
+    # Steps are only counted, and YARNs measured, in programs compiled with
+    # such a limit; time runs out like Interpreter.stop(), see stopped()
+    def __init__(self, steps=None, seconds=None, yarn=None):
+        self.steps = steps
+        self.seconds = seconds
+        self.yarn = yarn
+        self.left = [0]     # steps the run going on may still take
+
+    def start(self):
+        if self.steps is not None:
+            self.left[0] = self.steps
+
+def stopped(stop, position=None):
+    # what a running program raises at a loop step or call once stop[0] is
+    # set: Interrupted after Interpreter.stop(), the BudgetExceeded put
+    # there when the time budget ran out
+    reason = stop[0]
+    if isinstance(reason, BudgetExceeded):
+        reason.locate(position)
+        return reason
+    return Interrupted("Program stopped")
+
+# ---------------------------------------------------------------- memoization
+# results a memoized function keeps, the least recently used go first
+MEMO_SIZE = 4096
+MISSING = object()
+
+def memo_key(values):
+    # arguments as a dict key: 1, 1.0 and WIN are all different calls
+    return tuple([(type(v), v) for v in values])
+
+class Memo:
+    # a pure function's results by memo_key of its arguments
+    def __init__(self, size=MEMO_SIZE):
+        self.size = size
+        self.results = {}
+
+    def get(self, key):
+        # the result, or MISSING; a dict keeps its order, a hit goes to the back
+        results = self.results
+        value = results.pop(key, MISSING)
+        if value is not MISSING:
+            results[key] = value
+        return value
+
+    def put(self, key, value):
+        results = self.results
+        if len(results) >= self.size:
+            del results[next(iter(results))]
+        results[key] = value
+
+# ---------------------------------------------------------------- MAEK / IS NOW A
+def cast(v, t):
+    # explicit cast; NOOB becomes the empty value of the target type
+    if t == "TROOF":
+        return troof(v)
+    if t == "NOOB":
+        return None
+    if v is None:
+        if t == "NUMBR": return 0
+        if t == "NUMBAR": return 0.0
+        if t == "YARN": return ""
+        return v
+    if t == "NUMBR":
+        return int(number(v))
+    if t == "NUMBAR":
+        return float(number(v))
+    if t == "YARN":
+        return yarn(v)
+    return v
+
+# ---------------------------------------------------------------- expression trees
+# AST operation tag -> function of the node and its operands' values, for
+# working out trees of parser_try nodes (WAZZUP values, constant folding)
+OPERATIONS = {
+    "NOT":         lambda tup, v: not troof(v[0]),
+    "BOTH_OF":     lambda tup, v: troof(v[0]) and troof(v[1]),
+    "EITHER_OF":   lambda tup, v: troof(v[0]) or troof(v[1]),
+    "WON_OF":      lambda tup, v: troof(v[0]) != troof(v[1]),
+    "ALL_OF":      lambda tup, v: all([troof(x) for x in v]),
+    "ANY_OF":      lambda tup, v: any([troof(x) for x in v]),
+    "BOTH_SAEM":   lambda tup, v: saem(v[0], v[1]),
+    "DIFFRINT":    lambda tup, v: not saem(v[0], v[1]),
+    "CONCATENATE": lambda tup, v: "".join([yarn(x) for x in v]),
+    "CAST":        lambda tup, v: cast(v[0], tup[2][1]),
+}
+for _op in INT_FUNCS:
+    OPERATIONS[_op] = lambda tup, v: arith(tup[0], v[0], v[1])
+
+LITERAL_TAGS = ("Integer", "Float", "String", "Boolean")
+
+def operands(tup):
+    # the children of an operation that are expressions
+    # (a CAST's second child is its ("Target Type", type))
+    return (tup[1],) if tup[0] == "CAST" else tup[1:]
+
+def evaluate(tup, lookup):
+    # value of an expression tree, lookup(name) gives a variable's value.
+    # An explicit stack instead of recursion, so any depth works; operands
+    # are worked out left to right, each before the operation using it
+    values = []
+    stack = [(tup, False)]
+    while stack:
+        tup, ready = stack.pop()
+        tag = tup[0]
+        if ready:
+            n = len(tup) - 1 if tag != "CAST" else 1
+            args = values[len(values) - n:]
+            del values[len(values) - n:]
+            values.append(OPERATIONS[tag](tup, args))
+        elif tag == "Identifier":
+            values.append(lookup(tup[1]))
+        elif tag in LITERAL_TAGS:
+            values.append(tup[1])
+        elif tag in OPERATIONS:
+            stack.append((tup, True))
+            stack.extend((child, False) for child in reversed(operands(tup)))
+        else:
+            # like the engines, expressions nobody implements are NOOB
+            values.append(None)
+    return values[0]
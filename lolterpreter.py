@@ -0,0 +1,169 @@
+import sys
+import csv
+import argparse
+import bytecode
+import optimizer
+from parser_try import ScanError, ParseError
+from interpreter import Interpreter, OutputBuffer, RuntimeError, CompileError, Budget, parse_file, stdout_output
+from lol_runtime import CALL_DEPTH
+from resolver import resolve
+from profiler import Profiler
+from parse_cache import ParseCache
+from batch import run_batch, read_records, CHUNK_SIZE, VECTOR_CHUNK_SIZE
+import vector
+
+# Headless runner, no tkinter/PIL here so it also works on display-less machines
+#   python -m lolterpreter run <source.lol> [--vm] [--stats] [--memoize] [--max-depth N] [--max-steps N] [--timeout S] [--max-yarn N] [--no-cache] [--no-optimize]
+#   python -m lolterpreter dis <source.lol> [--no-cache] [--no-optimize]
+#   python -m lolterpreter profile <source.lol> [--top N] [--collapsed out.folded] [--memoize] [--max-depth N] [--max-steps N] [--timeout S] [--max-yarn N] [--no-cache] [--no-optimize]
+#   python -m lolterpreter batch <source.lol> <inputs.csv> [--workers N] [--chunk-size N] [--header] [--vector] [--vm] [--max-steps N] [--timeout S] [--max-yarn N] ...
+
+# output waiting in the buffer goes out at least this often while a program runs
+OUTPUT_INTERVAL = 0.1
+
+def parse_path(path, cache=None):
+    # the file is lexed as the parser goes, it's never read in whole
+    def parse():
+        with open(path, 'r', encoding='utf-8') as f:
+            return parse_file(f)
+    if cache is None:
+        return parse()
+    return cache.lookup(cache.file_key(path), parse)
+
+def run_file(path, engine="closures", cache=None, optimize=True, memoize=False, max_depth=CALL_DEPTH, budget=None,
+             stats=False):
+    # default sinks: VISIBLE -> stdout, in batches, GIMMEH <- stdin;
+    # stats reports what the optimizer did on stderr
+    output = OutputBuffer(stdout_output, interval=OUTPUT_INTERVAL)
+    lol = Interpreter(output=output, engine=engine, optimize=optimize, memoize=memoize,
+                      max_depth=max_depth, budget=budget)
+    ast, symbols = parse_path(path, cache)
+    try:
+        lol.run(ast, symbols)
+    finally:
+        if stats and optimize:
+            sys.stdout.flush()
+            print(f"optimizer: {lol.eliminated} AST nodes eliminated", file=sys.stderr)
+
+def profile_file(path, cache=None, optimize=True, top=20, collapsed=None, memoize=False, max_depth=CALL_DEPTH,
+                 budget=None):
+    # runs like run_file, then reports the hottest statements on stderr
+    profiler = Profiler()
+    try:
+        Interpreter(optimize=optimize, profiler=profiler, memoize=memoize,
+                    max_depth=max_depth, budget=budget).run(*parse_path(path, cache))
+    finally:
+        sys.stdout.flush()
+        with open(path, 'r', encoding='utf-8') as f:
+            profiler.report(sys.stderr, top, f.read())
+        if collapsed:
+            with open(collapsed, 'w', encoding='utf-8') as f:
+                profiler.write_collapsed(f)
+
+def dis_file(path, cache=None, optimize=True):
+    ast, symbols = parse_path(path, cache)
+    eliminated = 0
+    if optimize:
+        ast, eliminated = optimizer.optimize(ast, symbols)
+    code = bytecode.compile_program(ast, resolve(symbols, ast))
+    print(bytecode.disassemble(code))
+    print()
+    print("slots:    " + ", ".join(f"{i}={name}" for i, name in enumerate(code.names)))
+    print("consts:   " + ", ".join(f"{i}={value!r}" for i, value in enumerate(code.consts)))
+    if optimize:
+        print(f"optimizer: {eliminated} AST nodes eliminated")
+
+def batch_file(path, inputs, engine="closures", cache=None, optimize=True,
+               workers=None, chunk_size=None, skip_header=False, vectorize=False, budget=None):
+    # one CSV row per record in, one (record, output, error) row per record out
+    ast, symbols = parse_path(path, cache)
+    out = csv.writer(sys.stdout, lineterminator="\n")
+    out.writerow(("record", "output", "error"))
+    failed = 0
+    with open(inputs, 'r', encoding='utf-8', newline='') as f:
+        results = run_batch(ast, symbols, read_records(f, skip_header), workers, chunk_size, engine, optimize, vectorize,
+                            budget)
+        for i, (lines, error) in enumerate(results, 1):
+            if error is not None:
+                failed += 1
+            out.writerow((i, "\n".join(lines), error or ""))
+    return failed
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="lolterpreter", description="Run LOLCODE programs without the GUI")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="execute a .lol file, VISIBLE goes to stdout and GIMMEH reads stdin")
+    run.add_argument("file")
+    run.add_argument("--vm", action="store_true", help="run on the bytecode VM instead of compiled closures")
+    run.add_argument("--stats", action="store_true", help="report how many AST nodes the optimizer eliminated on stderr")
+
+    dis = sub.add_parser("dis", help="print the bytecode a .lol file compiles to")
+    dis.add_argument("file")
+
+    profile = sub.add_parser("profile", help="run a .lol file and report where the time went")
+    profile.add_argument("file")
+    profile.add_argument("--top", type=int, default=20, help="statements and operations to list (default: 20)")
+    profile.add_argument("--collapsed", help="also write collapsed stacks (flamegraph.pl, speedscope) to this file")
+
+    batch = sub.add_parser("batch", help="run a .lol file once per CSV row, the row's fields answer its GIMMEHs")
+    batch.add_argument("file")
+    batch.add_argument("inputs", help="CSV file, one record per row")
+    batch.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    batch.add_argument("--chunk-size", type=int, default=None,
+                       help=f"records sent to a worker at a time (default: {CHUNK_SIZE}, {VECTOR_CHUNK_SIZE} with --vector)")
+    batch.add_argument("--header", action="store_true", help="the first row of the CSV is a header, skip it")
+    batch.add_argument("--vm", action="store_true", help="run on the bytecode VM instead of compiled closures")
+    batch.add_argument("--vector", action="store_true", help="run straight-line programs over whole chunks with numpy")
+
+    for command in (run, profile):
+        command.add_argument("--memoize", action="store_true",
+                             help="pure functions (no VISIBLE, GIMMEH or program variables) remember their results")
+        command.add_argument("--max-depth", type=int, default=CALL_DEPTH,
+                             help=f"function calls that may run at once (default: {CALL_DEPTH})")
+
+    for command in (run, profile, batch):
+        # limits on each run (each record in a batch), for untrusted programs
+        command.add_argument("--max-steps", type=int, default=None,
+                             help="fail after this many loop iterations and function calls")
+        command.add_argument("--timeout", type=float, default=None, help="fail after this many seconds")
+        command.add_argument("--max-yarn", type=int, default=None,
+                             help="fail when a SMOOSH makes a YARN longer than this many characters")
+
+    for command in (run, dis, profile, batch):
+        command.add_argument("--no-cache", action="store_true", help="always lex and parse, don't use __lolcache__")
+        command.add_argument("--no-optimize", action="store_true", help="skip constant folding and dead code removal")
+
+    args = ap.parse_args(argv)
+    cache = None if args.no_cache else ParseCache()
+    optimize = not args.no_optimize
+    budget = None
+    if args.command != "dis" and (args.max_steps, args.timeout, args.max_yarn) != (None, None, None):
+        budget = Budget(args.max_steps, args.timeout, args.max_yarn)
+
+    try:
+        if args.command == "run":
+            run_file(args.file, "vm" if args.vm else "closures", cache, optimize, args.memoize, args.max_depth, budget,
+                     args.stats)
+        elif args.command == "dis":
+            dis_file(args.file, cache, optimize)
+        elif args.command == "profile":
+            profile_file(args.file, cache, optimize, args.top, args.collapsed, args.memoize, args.max_depth, budget)
+        elif args.command == "batch":
+            if args.vector and not vector.available():
+                print("numpy isn't installed, --vector ignored", file=sys.stderr)
+            failed = batch_file(args.file, args.inputs, "vm" if args.vm else "closures", cache, optimize,
+                                args.workers, args.chunk_size, args.header, args.vector, budget)
+            # records that hit a runtime error are reported in the CSV
+            return 1 if failed else 0
+    except (ScanError, ParseError, CompileError, RuntimeError) as e:
+        sys.stdout.flush()
+        print(e, file=sys.stderr)
+        return 1
+    except OSError as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
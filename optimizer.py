@@ -0,0 +1,301 @@
+from lol_runtime import troof, OPERATIONS, operands
+from compiler import BOOL_TAGS, LITERAL_TAGS
+import spans
+from spans import walk
+from types import GeneratorType
+
+# AST -> AST pass run between parsing and compiling (either engine).
+#
+# Constant folding: an operation whose operands are all literals is worked out
+# once, with the same lol_runtime helpers the engines call, and replaced by a
+# literal. Anything that raises (SUM OF "abc" AN 1, SMOOSH of a NUMBR, ...) is
+# left alone so the error still happens when, and if, that code runs.
+#
+# Dead code: a bare ARITH_OPERATION / BOOL_OPERATION / EXPRESSION only sets
+# IT. When it can't fail and IT is set again later in the same block with
+# nothing reading it in between (O RLY? and WTF? read it too), it's dropped. So are loops whose condition is a literal that
+# never lets the body run. IT at the end of a block is never dead: a function
+# returns it.
+#
+# Code mentioning an undeclared variable is never dropped, the compiler still
+# has to report it. A SMOOSH is never dropped either, and with a YARN budget
+# (lol_runtime.Budget.yarn) one making a longer YARN isn't folded: it has to
+# fail with BudgetExceeded when it runs, as it would unoptimized.
+#
+# Statements and operations keep their source positions (spans.py) in the new
+# tree; a folded literal has none.
+#
+# Expressions are walked with explicit stacks, however deep they nest.
+#
+# optimize() returns the new AST and how many nodes it eliminated.
+
+def optimize(ast, symbols=None, yarn=None):
+    # symbols are the WAZZUP values, only their names matter here; yarn is
+    # the YARN budget of the runs, if any
+    opt = Optimizer(symbols, spans.unpack(ast), yarn)
+    return opt.program(ast), opt.eliminated
+
+def literal(value):
+    t = type(value)
+    if t is bool: return ("Boolean", value)
+    if t is int: return ("Integer", value)
+    if t is float: return ("Float", value)
+    if t is str: return ("String", value)
+    return None
+
+def size(tup):
+    # number of nodes (tuples) in a subtree
+    return sum([1 for node in walk(tup)])
+
+def names(tup):
+    # every variable the subtree mentions
+    return {node[1] for node in walk(tup) if node[0] == "Identifier"}
+
+def reads(tup, name):
+    # does the subtree mention the variable anywhere
+    return any(node[0] == "Identifier" and node[1] == name for node in walk(tup))
+
+def reads_it(tup):
+    # does anything in the subtree read IT, by name or not
+    return any(node[0] in IT_READERS or (node[0] == "Identifier" and node[1] == "IT") for node in walk(tup))
+
+# tag -> function of the node and its operand values, mirrors compiler.py
+FOLDERS = OPERATIONS
+
+# operations that never raise, whatever their (non-raising) operands hold
+# (not CONCATENATE, a SMOOSH can go over a YARN budget)
+SAFE_TAGS = ("Identifier", "NOT", "ALL_OF", "ANY_OF", "BOTH_SAEM", "DIFFRINT") + BOOL_TAGS + LITERAL_TAGS
+
+IT_TAGS = ("ARITH_OPERATION", "BOOL_OPERATION", "EXPRESSION")
+# statements that read IT without naming it
+IT_READERS = ("CONDITIONAL", "SWITCH")
+
+class Optimizer:
+    def __init__(self, symbols=None, positions=None, yarn=None):
+        self.declared = {"IT"} | set(symbols or ())
+        self.yarn = yarn
+        self.eliminated = 0
+        # positions of the tree being optimized, and of the new one, built
+        # as the new tree is, in preorder (spans.py)
+        self.spans = spans.Cursor(positions if positions is not None else ())
+        self.out = []
+
+    def program(self, ast):
+        # ("PROGRAM", <declarations>, ("STATEMENT_LIST", ...)[, <spans>])
+        stmts = ast[2]
+        program = (ast[0], ast[1], (stmts[0], *self.block(stmts[1:])))
+        if len(ast) < 4:
+            return program
+        return program + (spans.pack(self.out),)
+
+    # ------------------------------------------------------------ statements
+    def block(self, stmts):
+        # loops, O RLY?s, WTF?s and functions are generators (loop,
+        # conditional, ...) that yield each of their blocks and are sent it
+        # back optimized, so blocks are done off an explicit stack however
+        # deep they nest
+        out = self.out
+        # (rest of a block, its (statement, where its positions are in out)s,
+        # where the block's positions start, the statement it's in, where that one's start)
+        blocks = [(iter(stmts), [], len(out), None, 0)]
+        while True:
+            rest, done, start, compound, mark = blocks[-1]
+            stmt = next(rest, None)
+            if stmt is not None:
+                mark = len(out)
+                stmt = self.stmt(stmt)
+                if type(stmt) is GeneratorType:
+                    self.resume(stmt, None, mark, blocks)
+                else:
+                    self.done(done, stmt, mark)
+                continue
+            blocks.pop()
+            kept = self.dead(done, start)
+            if compound is None:
+                return kept
+            self.resume(compound, kept, mark, blocks)
+
+    def resume(self, compound, block, mark, blocks):
+        # sends a compound statement its block, it asks for the next one or is done
+        try:
+            stmts = compound.send(block)
+        except StopIteration as end:
+            self.done(blocks[-1][1], end.value, mark)
+        else:
+            blocks.append((iter(stmts), [], len(self.out), compound, mark))
+
+    def done(self, done, stmt, mark):
+        # stmt is optimized (None: dropped), its positions are out[mark:]
+        out = self.out
+        if stmt is None:
+            del out[mark:]
+        done.append((stmt, mark, len(out)))
+
+    def dead(self, done, start):
+        # the block's statements without its dead IT stores, its positions
+        # (out[start:]) without theirs
+        out = self.out
+        stmts = [stmt for stmt, mark, end in done]
+        kept = []
+        dropped = []
+        for i, (stmt, mark, end) in enumerate(done):
+            if stmt is None:
+                continue
+            if stmt[0] in IT_TAGS and self.safe(stmt[1]) and self.it_overwritten(stmts, i + 1):
+                self.eliminated += size(stmt)
+                dropped.append((mark, end))
+                continue
+            kept.append(stmt)
+        # last first, so the ranges before stay where they are
+        for mark, end in reversed(dropped):
+            del out[mark:end]
+        return kept
+
+    def it_overwritten(self, stmts, start):
+        # is IT set again, unread, by a later statement of this block
+        for stmt in stmts[start:]:
+            if stmt is None:
+                continue
+            if stmt[0] in IT_TAGS:
+                return not reads(stmt[1], "IT")
+            if stmt[0] not in ("PRINT", "ASSIGN", "PERM_CAST", "INPUT", "LOOP") or reads_it(stmt):
+                return False
+        # IT is still what it was at the end of the block
+        return False
+
+    def stmt(self, stmt):
+        # the new statement, None to drop it, or a generator for a compound one, see block()
+        tag = stmt[0]
+        if tag not in ("PRINT", "ASSIGN", "LOOP", "CONDITIONAL", "SWITCH", "FUNCTION", "RETURN") + IT_TAGS:
+            self.spans.copy(stmt, self.out)
+            return stmt
+        position = self.spans.take(stmt)
+        if position is not None:
+            self.out += position
+        if tag == "PRINT":
+            return (tag, *[self.expr(child) for child in stmt[1:]])
+        if tag in IT_TAGS:
+            return (tag, self.expr(stmt[1]))
+        if tag == "ASSIGN":
+            # ("ASSIGN", ("Identifier", name), ("Value", <expression>))
+            return (tag, stmt[1], ("Value", self.expr(stmt[2][1])))
+        if tag == "CONDITIONAL":
+            return self.conditional(stmt)
+        if tag == "SWITCH":
+            return self.switch(stmt)
+        if tag == "RETURN":
+            return (tag, self.expr(stmt[1]))
+        if tag == "FUNCTION":
+            # ("FUNCTION", ("Name", name), ("Parameters", ...), ("CODE_BLOCK", ...))
+            return self.function(stmt)
+        return self.loop(stmt)
+
+    def loop(self, stmt):
+        # ("LOOP", ("Name", label), (UPPIN|NERFIN, var), (TIL|WILE, cond), ("CODE_BLOCK", ...))
+        loop_type, cond = stmt[3]
+        self.spans.copy(stmt[2], self.out)
+        cond = self.expr(cond)
+        if cond[0] in LITERAL_TAGS:
+            value = cond[1]
+            runs = troof(value) if loop_type == "WILE" else not troof(value)
+            if not runs and names(stmt) <= self.declared:
+                self.eliminated += size(stmt)
+                self.spans.skip(stmt[4])
+                return None
+        body = yield stmt[4][1:]
+        return (stmt[0], stmt[1], stmt[2], (loop_type, cond), (stmt[4][0], *body))
+
+    def conditional(self, stmt):
+        # ("CONDITIONAL", ("YA_RLY", ("CODE_BLOCK", ...)),
+        #                 ("MEBBE", <expression>, ("CODE_BLOCK", ...))..., [("NO_WAI", ("CODE_BLOCK", ...))])
+        clauses = []
+        for clause in stmt[1:]:
+            if clause[0] == "MEBBE":
+                cond = self.expr(clause[1])
+                clauses.append((clause[0], cond, (clause[2][0], *(yield clause[2][1:]))))
+            else:
+                clauses.append((clause[0], (clause[1][0], *(yield clause[1][1:]))))
+        return (stmt[0], *clauses)
+
+    def function(self, stmt):
+        # ("FUNCTION", ("Name", name), ("Parameters", ...), ("CODE_BLOCK", ...))
+        body = stmt[3]
+        return (stmt[0], stmt[1], stmt[2], (body[0], *(yield body[1:])))
+
+    def switch(self, stmt):
+        # ("SWITCH", ("OMG", <literal>, ("CODE_BLOCK", ...))..., [("OMGWTF", ("CODE_BLOCK", ...))])
+        cases = []
+        for case in stmt[1:]:
+            body = case[-1]
+            cases.append((*case[:-1], (body[0], *(yield body[1:]))))
+        return (stmt[0], *cases)
+
+    # ----------------------------------------------------------- expressions
+    def safe(self, tup):
+        # evaluating it can't raise
+        declared = self.declared
+        for node in walk(tup):
+            if node[0] not in SAFE_TAGS:
+                return False
+            if node[0] == "Identifier" and node[1] not in declared:
+                return False
+        return True
+
+    def expr(self, tup):
+        # tup with every operation whose operands are (or fold to) literals
+        # replaced by its value. Operations are taken apart on the way down,
+        # in preorder as their positions are, and put back together (or
+        # folded) on the way up, once all their operands are done
+        out = self.out
+        take = self.spans.take
+        pending = []    # [node, where its positions start in out, operands, new operands]
+        while True:
+            tag = tup[0]
+            if tag in FOLDERS:
+                mark = len(out)
+                position = take(tup)
+                if position is not None:
+                    out += position
+                children = operands(tup)
+                pending.append((tup, mark, children, []))
+                tup = children[0]
+                continue
+            if tag != "Identifier" and tag not in LITERAL_TAGS:
+                self.spans.copy(tup, out)
+            done = tup
+
+            # done is finished, give it to the operation waiting for it
+            while pending:
+                tup, mark, children, new_operands = pending[-1]
+                new_operands.append(done)
+                if len(new_operands) < len(children):
+                    tup = children[len(new_operands)]
+                    break
+                pending.pop()
+                done = self.fold(tup, mark, new_operands)
+            else:
+                return done
+
+    def fold(self, tup, mark, new_operands):
+        # tup rebuilt from its new operands, or its value if they're literals
+        if tup[0] == "CAST":
+            # ("CAST", <expression>, ("Target Type", type))
+            new = (tup[0], new_operands[0], tup[2])
+        else:
+            new = (tup[0], *new_operands)
+        if not all(operand[0] in LITERAL_TAGS for operand in new_operands):
+            return new
+        try:
+            value = FOLDERS[tup[0]](new, [operand[1] for operand in new_operands])
+        except Exception:
+            return new
+        if self.yarn is not None and tup[0] == "CONCATENATE" and len(value) > self.yarn:
+            return new
+        folded = literal(value)
+        if folded is None:
+            return new
+        # the operands are literals already, each fold counts its own step;
+        # a literal has no position
+        self.eliminated += size(new) - 1
+        del self.out[mark:]
+        return folded
@@ -0,0 +1,174 @@
+import os
+import sys
+import marshal
+import hashlib
+from collections import OrderedDict
+
+# Parse results (AST + WAZZUP symbols) cached by source hash, like __pycache__.
+# The AST is plain tuples/strs/numbers, so marshal stores it as is and a hit
+# skips lexing and parsing entirely.
+#
+#   memory: the last MEMORY_ENTRIES results, least recently used dropped first
+#   disk:   <directory>/<sha256>.<TAG>.lolc, oldest files removed once the
+#           directory grows past DISK_LIMIT bytes
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# everything that decides the AST for a source: any edit to these gives a new
+# version and old entries simply stop matching
+PARSER_SOURCES = ("lol_lexer.py", "parser_try.py", "spans.py", "lol_runtime.py")
+
+def source_version(paths):
+    # short hash of the files' contents
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+PARSER_VERSION = source_version(os.path.join(HERE, name) for name in PARSER_SOURCES)
+# marshal's format belongs to the Python version, same as .pyc files
+TAG = f"lol{PARSER_VERSION}-py{sys.version_info[0]}{sys.version_info[1]}"
+
+CACHE_DIR = os.path.join(HERE, "__lolcache__")
+MEMORY_ENTRIES = 64
+DISK_LIMIT = 64 * 1024 * 1024
+SUFFIX = ".lolc"
+
+class ParseCache:
+    # directory=None keeps the cache in memory only
+    def __init__(self, directory=CACHE_DIR, memory_entries=MEMORY_ENTRIES, disk_limit=DISK_LIMIT):
+        self.directory = directory
+        self.memory_entries = memory_entries
+        self.disk_limit = disk_limit
+        self.memory = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    # ---- keys
+    def text_key(self, code):
+        return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+    def file_key(self, path, chunk_size=1 << 20):
+        # hashes the raw bytes without holding the whole file
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    # ---- lookups
+    def lookup(self, key, parse):
+        # cached (ast, symbols) for key, or parse() them and remember the result
+        result = self.get(key)
+        if result is None:
+            self.misses += 1
+            result = parse()
+            self.put(key, result)
+        else:
+            self.hits += 1
+        return result
+
+    def get(self, key):
+        entry = self.memory.get(key)
+        if entry is not None:
+            self.memory.move_to_end(key)
+        else:
+            entry = self.load(key)
+            if entry is None:
+                return None
+            self.remember(key, entry)
+        ast, symbols = entry
+        # callers may change the symbol dict, the cached one stays as parsed
+        return ast, dict(symbols)
+
+    def put(self, key, result):
+        ast, symbols = result
+        entry = (ast, dict(symbols))
+        self.remember(key, entry)
+        self.store(key, entry)
+
+    def remember(self, key, entry):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def clear(self):
+        self.memory.clear()
+        for name, size, mtime in self.entries():
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    # ---- disk layer, any OSError just means "not cached"
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.{TAG}{SUFFIX}")
+
+    def load(self, key):
+        if self.directory is None:
+            return None
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                entry = marshal.load(f)
+            # keeps recently used files from being the first to be evicted
+            os.utime(path)
+        except OSError:
+            return None
+        except (EOFError, ValueError, TypeError):
+            # truncated or foreign file
+            self.remove(path)
+            return None
+        if type(entry) is not tuple or len(entry) != 2:
+            self.remove(path)
+            return None
+        return entry
+
+    def store(self, key, entry):
+        if self.directory is None:
+            return
+        path = self.path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp, "wb") as f:
+                marshal.dump(entry, f)
+            # readers never see a half written file
+            os.replace(tmp, path)
+        except (OSError, ValueError):
+            # ValueError: something in the AST marshal can't store
+            self.remove(tmp)
+            return
+        self.trim()
+
+    def entries(self):
+        # (name, size, mtime) of every cache file
+        found = []
+        try:
+            with os.scandir(self.directory) as it:
+                for e in it:
+                    if e.name.endswith(SUFFIX):
+                        st = e.stat()
+                        found.append((e.name, st.st_size, st.st_mtime))
+        except OSError:
+            pass
+        return found
+
+    def trim(self):
+        entries = self.entries()
+        total = sum(size for name, size, mtime in entries)
+        if total <= self.disk_limit:
+            return
+        entries.sort(key=lambda e: e[2])
+        for name, size, mtime in entries:
+            if total <= self.disk_limit:
+                break
+            self.remove(os.path.join(self.directory, name))
+            total -= size
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
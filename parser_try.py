@@ -1,13 +1,32 @@
-import re
-from lol_lexer import Token, lex
-from dataclasses import dataclass
-from typing import Any, List, Tuple
+from sys import intern
+from collections import deque
+from types import GeneratorType
+from lol_lexer import Token, TokenBuffer, TOKEN_TYPES, KEYWORD_CODES, KEYWORD_TYPES
+from lol_runtime import evaluate
+import spans
+from typing import Any, Iterable, Tuple
 
 class ScanError(Exception): ...
 class ParseError(Exception): ...
 
+# operator token type -> (shape, AST tag), for eval_expr
+BINARY, UNARY, VARIADIC, SMOOSH, CAST, CALL = range(6)
+OPERATORS = {kind: (BINARY, kind) for kind in ("SUM_OF","DIFF_OF","PRODUKT_OF","QUOSHUNT_OF","MOD_OF","BIGGR_OF","SMALLR_OF","BOTH_OF","EITHER_OF","WON_OF","BOTH_SAEM","DIFFRINT")}
+OPERATORS.update({
+    "NOT":    (UNARY, "NOT"),
+    "ALL_OF": (VARIADIC, "ALL_OF"),
+    "ANY_OF": (VARIADIC, "ANY_OF"),
+    "SMOOSH": (SMOOSH, "CONCATENATE"),
+    "MAEK_A": (CAST, "CAST"),
+})
+
+LITERAL_TYPES = ("NUMBR_LIT", "NUMBAR_LIT", "YARN_LIT", "TROOF_LIT")
+# token types an expression can start with
+EXPRESSION_TYPES = frozenset(LITERAL_TYPES + ("IDENT", "I_IZ") + tuple(OPERATORS))
+
 # Token types that will be encountered as the first token of the line
-INLINE_TYPES = ("VISIBLE", "IDENT", "GIMMEH", "+", "SMOOSH", "IS_NOW_A","SUM_OF","DIFF_OF","PRODUKT_OF","QUOSHUNT_OF","MOD_OF","BIGGR_OF","SMALLR_OF","BOTH_OF","EITHER_OF","WON_OF","NOT","ALL_OF","ANY_OF","BOTH_SAEM", "DIFFRINT", "SMOOSH", "IM_IN_YR", "HOW_IZ_I", "FOUND_YR", "GTFO", "I_IZ")
+INLINE_TYPES = ("VISIBLE", "IDENT", "GIMMEH", "+", "SMOOSH", "IS_NOW_A","SUM_OF","DIFF_OF","PRODUKT_OF","QUOSHUNT_OF","MOD_OF","BIGGR_OF","SMALLR_OF","BOTH_OF","EITHER_OF","WON_OF","NOT","ALL_OF","ANY_OF","BOTH_SAEM", "DIFFRINT", "SMOOSH", "IM_IN_YR", "HOW_IZ_I", "FOUND_YR", "GTFO", "I_IZ",
+                "O_RLY?", "WTF?", "MAEK_A") + LITERAL_TYPES
 
 #ast helpers
 def node(tag: str, *children: Any) -> Tuple[str, Any]:
@@ -16,28 +35,59 @@ def node(tag: str, *children: Any) -> Tuple[str, Any]:
 def pp_tuple(ast):
     import pprint; pprint.pprint(ast, width=100)
 
-def pp_tree(ast, indent=""):
-    tag = ast[0]
-    print(indent + tag)
-    for child in ast[1:]:
-        if isinstance(child, tuple):
-            pp_tree(child, indent + "│   ")
-        else:
-            print(indent + "│   " + repr(child))
+def pp_tree(ast, indent="", max_depth=100):
+    # subtrees deeper than max_depth are shown as "..."
+    stack = [(ast, 0)]
+    while stack:
+        item, depth = stack.pop()
+        prefix = indent + "│   " * depth
+        if type(item) is not tuple:
+            print(prefix + repr(item))
+            continue
+        print(prefix + item[0])
+        if depth == max_depth:
+            if len(item) > 1:
+                print(prefix + "│   ...")
+            continue
+        for child in reversed(item[1:]):
+            # bytes: the PROGRAM's source positions (spans.py)
+            if type(child) is not bytes:
+                stack.append((child, depth + 1))
 
 #parser and evaluator
 class Parser:
-    def __init__(self, toks: List[Token]):
-        self.toks = toks
-        self.i = 0
+    # toks can be a list or any iterator of Tokens (lol_lexer.lex_stream),
+    # only the next couple of tokens are ever held in self.ahead
+    def __init__(self, toks: Iterable[Token]):
+        self.toks = iter(toks)
+        self.ahead = deque()
+        self.last = None    # last token taken off the stream, for the EOF position
         self.symbols = {}   #symbol table
+        self.spans = []     # line, col of every statement and operation, see spans.py
+        self.breakable = 0  # loops, WTF?s and functions around the statement being parsed
+        self.functions = 0  # functions around it
 
     #basic stream ops
-    def peek(self, k=0): return self.toks[self.i + k]
-    def at(self, *types): return self.peek().type in types
+    def fill(self, k):
+        while len(self.ahead) <= k:
+            t = next(self.toks, None)
+            if t is None:
+                # past the end the stream keeps answering EOF
+                last = self.last
+                t = Token("EOF", "", last.line, last.col + len(last.lexeme)) if last else Token("EOF", "", 1, 1)
+            self.last = t
+            self.ahead.append(t)
+    def peek(self, k=0):
+        if len(self.ahead) <= k: self.fill(k)
+        return self.ahead[k]
+    def advance(self):
+        if not self.ahead: self.fill(0)
+        return self.ahead.popleft()
+    def kind(self, k=0): return self.peek(k).type
+    def at(self, *types): return self.kind() in types
     def match(self, *types):
         if self.at(*types):
-            t = self.peek(); self.i += 1; return t
+            return self.advance()
         return None
     def need(self, *types):
         t = self.match(*types)
@@ -54,7 +104,7 @@ class Parser:
         self.need("CODE_START")
         # self.need("NEWLINE")
         # self.skip_nl()
-        self.symbols["IT"] = "NOOB"
+        self.symbols["IT"] = None
 
         wazzup_decls = None
         if self.match("VARLIST_START"):
@@ -83,9 +133,10 @@ class Parser:
         # return node("PROGRAM",
         #             decls,
         #             node("STATEMENT_LIST"))
-        return node("PROGRAM",
-                    decls,
-                    stmts if stmts else node("STATEMENT_LIST"))
+        program = node("PROGRAM",
+                       decls,
+                       stmts if stmts else node("STATEMENT_LIST"))
+        return program + (spans.pack(self.spans),)
 
 
     #WAZZUP
@@ -99,7 +150,7 @@ class Parser:
                 self.symbols[ident] = val
                 items.append(node("VARIABLE", ("Identifier", ident), ("Value", val)))
             else:
-                self.symbols.setdefault(ident, "NOOB")
+                self.symbols.setdefault(ident, None)
                 items.append(node("VARIABLE", ("Identifier", ident)))
             self.skip_nl()
         self.need("VARLIST_END")
@@ -109,7 +160,7 @@ class Parser:
 
     # Optional variable declarations
     def variable_declaration_list_opt(self):
-        while self.peek().type == "I":
+        while self.kind() == "I":
             self.need("I"); self.need("HAS"); self.need("A")
             ident = self.need("IDENT").lexeme
             if self.match("ITZ"):
@@ -121,86 +172,111 @@ class Parser:
 
     # Statement list
     def statement_list_opt(self):
+        return node("STATEMENT_LIST", *self.statements(top=True))
+
+    # Statements are parsed with an explicit stack, not recursion, so how deep
+    # loops, O RLY?s, WTF?s and functions nest is only limited by memory: a
+    # compound statement is a generator (loop_stmt, if_stmt, ...) that yields
+    # each time it needs a block of statements and is sent the block's items
+    # back, returning its node once it's done.
+    def statements(self, top=False):
+        # statements until one can't start here; top: the program's own
+        # list, which takes no FOUND YR or GTFO
         items = []
-        while self.peek().type in INLINE_TYPES:
-            if self.at("VISIBLE"):
-                items.append(self.print_stmt())
-            elif self.at("GIMMEH"):
-                items.append(self.input_stmt())
-            elif self.at("SMOOSH"):
-                items.append(self.concat_stmt())
-            elif self.at("SUM_OF","DIFF_OF","PRODUKT_OF","QUOSHUNT_OF","MOD_OF","BIGGR_OF","SMALLR_OF"):
-                items.append(node("ARITH_OPERATION", self.eval_expr()))
-            elif self.at("BOTH_OF","EITHER_OF","WON_OF", "NOT","ALL_OF","ANY_OF","BOTH_SAEM", "DIFFRINT"):
-                items.append(node("BOOL_OPERATION", self.eval_expr()))
-            elif self.at("IM_IN_YR"):
-                items.append(self.loop_stmt())
-            elif self.at("HOW_IZ_I"):
-                items.append(self.func_stmt())
-            elif self.at("I_IZ"):
-                items.append(self.call_stmt())
-            else:
-                if self.peek(1).type == "R":
-                    items.append(self.assign_stmt())
-                
-                elif self.peek(1).type in ("IS_NOW_A", "MAEK_A"):
-                    items.append(self.cast_stmt())
-                else:
-                    break
-            # self.skip_nl()
-        return node("STATEMENT_LIST", *items)
-
-    def eval_codeblock(self):
-        items = []
-        while self.peek().type in INLINE_TYPES:
-            if self.at("VISIBLE"):
-                items.append(self.print_stmt())
-            elif self.at("GIMMEH"):
-                items.append(self.input_stmt())
-            elif self.at("SMOOSH"):
-                items.append(self.concat_stmt())
-            elif self.at("SUM_OF","DIFF_OF","PRODUKT_OF","QUOSHUNT_OF","MOD_OF","BIGGR_OF","SMALLR_OF"):
-                items.append(node("ARITH_OPERATION", self.eval_expr()))
-            elif self.at("BOTH_OF","EITHER_OF","WON_OF", "NOT","ALL_OF","ANY_OF","BOTH_SAEM", "DIFFRINT"):
-                items.append(node("BOOL_OPERATION", self.eval_expr()))
-            elif self.at("IM_IN_YR"):
-                items.append(self.loop_stmt())
-            
-            # for functions
-            elif self.at("FOUND_YR"):
-                items.append(self.return_stmt())
-            elif self.at("GTFO"):
-                items.append(node("BREAK"))
-                self.need("GTFO")
-            elif self.at("HOW_IZ_I"):
-                items.append(self.call_stmt)
+        waiting = []    # (compound statement waiting for a block, the items it goes in)
+        while True:
+            stmt = self.statement(top and not waiting)
+            if stmt is None:
+                # the block is over, the innermost compound statement goes on
+                if not waiting:
+                    return items
+                compound, outer = waiting[-1]
+                stmt = self.resume(compound, items)
+                if stmt is None:
+                    items = []
+                    continue
+                waiting.pop()
+                items = outer
+            elif type(stmt) is GeneratorType:
+                compound = stmt
+                stmt = self.resume(compound, None)
+                if stmt is None:
+                    waiting.append((compound, items))
+                    items = []
+                    continue
+            items.append(stmt)
+
+    def resume(self, compound, block):
+        # runs a compound statement on to the next block it needs (None) or
+        # to its end (its node)
+        try:
+            compound.send(block)
+        except StopIteration as done:
+            return done.value
+        return None
 
-            else:
-                if self.peek(1).type == "R":
-                    items.append(self.assign_stmt())
-                
-                elif self.peek(1).type in ("IS_NOW_A", "MAEK_A"):
-                    items.append(self.cast_stmt())
-                else:
-                    break
-        return items
+    def statement(self, top=False):
+        # one statement's node, a generator for a compound statement, or None
+        # if no statement starts at the next token
+        if self.kind() not in INLINE_TYPES:
+            return None
+        start = self.peek()
+        # the statement's position goes in before its operations' (spans.py)
+        positions = self.spans
+        positions += (start.line, start.col)
+        if self.at("VISIBLE"):
+            return self.print_stmt()
+        elif self.at("GIMMEH"):
+            return self.input_stmt()
+        elif self.at("SMOOSH"):
+            return self.concat_stmt()
+        elif self.at("SUM_OF","DIFF_OF","PRODUKT_OF","QUOSHUNT_OF","MOD_OF","BIGGR_OF","SMALLR_OF"):
+            return ("ARITH_OPERATION", self.eval_expr())
+        elif self.at("BOTH_OF","EITHER_OF","WON_OF", "NOT","ALL_OF","ANY_OF","BOTH_SAEM", "DIFFRINT"):
+            return ("BOOL_OPERATION", self.eval_expr())
+        elif self.at("IM_IN_YR"):
+            return self.loop_stmt()
+        elif self.at("O_RLY?"):
+            return self.if_stmt()
+        elif self.at("WTF?"):
+            return self.switch_stmt()
+
+        # for functions
+        elif not top and self.at("FOUND_YR"):
+            return self.return_stmt()
+        elif not top and self.at("GTFO"):
+            gtfo = self.need("GTFO")
+            if not self.breakable:
+                raise ParseError(f"GTFO outside of a loop, WTF? or function at {gtfo.line}:{gtfo.col}")
+            return node("BREAK")
+        elif self.at("HOW_IZ_I"):
+            return self.func_stmt()
+        elif self.at("I_IZ"):
+            return self.call_stmt()
+
+        if self.kind(1) == "R":
+            return self.assign_stmt()
+        elif self.kind(1) in ("IS_NOW_A", "MAEK_A"):
+            return self.cast_stmt()
+        elif self.at("IDENT", "MAEK_A", *LITERAL_TYPES):
+            # any other expression on its own, its value goes to IT
+            return ("EXPRESSION", self.eval_expr())
+        del positions[-2:]
+        return None
 
     def eval_parameter(self, acc: list):
+        # YR <name> [AN YR <name> ...]
         self.need("YR")
-        acc.append(self.eval_expr())
-        if self.at("AN"):
+        acc.append(("Identifier", intern(self.need("IDENT").lexeme)))
+        while self.at("AN"):
             self.need("AN")
-            self.eval_parameter(acc)
+            self.need("YR")
+            acc.append(("Identifier", intern(self.need("IDENT").lexeme)))
 
     def call_stmt(self):
-        self.need("I_IZ")
-        func_name = self.eval_expr()
-        args = []
-
-        if self.at("YR"):
-            self.eval_parameter(args)
-
-        return node("CALL", func_name, ("Arguments", *args))      
+        # I IZ on its own line, the function's value goes to IT
+        # (the call itself is an expression, see eval_expr)
+        return ("EXPRESSION", self.eval_expr())
 
     def loop_stmt(self):
         self.need("IM_IN_YR")
@@ -212,7 +288,9 @@ class Parser:
         loop_type = self.need("TIL", "WILE").lexeme
         condition = self.eval_expr()
 
-        items = self.eval_codeblock()
+        self.breakable += 1
+        items = yield
+        self.breakable -= 1
 
         self.need("IM_OUTTA_YR")
         out_name = self.need("IDENT").lexeme
@@ -229,13 +307,53 @@ class Parser:
         if self.at("YR"):
             self.eval_parameter(parameters)
         
-        items = self.eval_codeblock()
+        self.breakable += 1
+        self.functions += 1
+        items = yield
+        self.functions -= 1
+        self.breakable -= 1
 
         self.need("IF_U_SAY_SO")
         return node("FUNCTION", ("Name", name), ("Parameters", *parameters), ("CODE_BLOCK", *items))
 
+    def if_stmt(self):
+        # O RLY? YA RLY <block> [MEBBE <expression> <block>]... [NO WAI <block>] OIC,
+        # YA RLY runs if IT is WIN
+        self.need("O_RLY?")
+        self.need("YA_RLY")
+        clauses = [("YA_RLY", ("CODE_BLOCK", *(yield)))]
+        while self.match("MEBBE"):
+            condition = self.eval_expr()
+            clauses.append(("MEBBE", condition, ("CODE_BLOCK", *(yield))))
+        if self.match("NO_WAI"):
+            clauses.append(("NO_WAI", ("CODE_BLOCK", *(yield))))
+        self.need("OIC")
+        return node("CONDITIONAL", *clauses)
+
+    def switch_stmt(self):
+        # WTF? [OMG <literal> <block>]... [OMGWTF <block>] OIC, runs from the
+        # OMG whose literal is BOTH SAEM as IT on, through the ones after it,
+        # until a GTFO
+        self.need("WTF?")
+        cases = []
+        self.breakable += 1
+        while self.at("OMG"):
+            omg = self.need("OMG")
+            if not self.at(*LITERAL_TYPES):
+                got = self.peek()
+                raise ParseError(f"Expected a literal after OMG at {got.line}:{got.col}, got {got.type} {got.lexeme!r}")
+            value = self.eval_expr()
+            cases.append(("OMG", value, ("CODE_BLOCK", *(yield))))
+        if self.match("OMGWTF"):
+            cases.append(("OMGWTF", ("CODE_BLOCK", *(yield))))
+        self.breakable -= 1
+        self.need("OIC")
+        return node("SWITCH", *cases)
+
     def return_stmt(self):
-        self.need("FOUND_YR")
+        found = self.need("FOUND_YR")
+        if not self.functions:
+            raise ParseError(f"FOUND YR outside of a function at {found.line}:{found.col}")
         return node("RETURN", self.eval_expr())
 
     def cast_stmt(self):
@@ -259,12 +377,14 @@ class Parser:
         return node("INPUT", val)
 
     def print_stmt(self):
-        self.need("VISIBLE")
+        line = self.need("VISIBLE").line
 
         vals = []
         
         vals.append(self.eval_expr())
-        while self.match("+", "AN"):  
+        # operands are separated by + or AN, or just follow each other on
+        # the VISIBLE's line
+        while self.match("+", "AN") or (self.kind() in EXPRESSION_TYPES and self.peek().line == line):
             vals.append(self.eval_expr())
         return node("PRINT", *vals)
                 # items.append(node("VARIABLE", ("Identifier", ident), ("Value", val)))
@@ -277,160 +397,139 @@ class Parser:
         return node("ASSIGN", ("Identifier", name), ("Value", val))
 
     #  returns nodes for the AST, does not do actual computations
-    def eval_expr(self):
-        # literals
-        if self.at("NUMBR_LIT"):
-            return node("Integer", int(self.need("NUMBR_LIT").lexeme))
-        if self.at("NUMBAR_LIT"):
-            return node("Float", float(self.need("NUMBAR_LIT").lexeme))
-        if self.at("YARN_LIT"):
-            s = self.need("YARN_LIT").lexeme
-            return node("String", bytes(s[1:-1], "utf-8").decode("unicode_escape"))
-        if self.at("TROOF_LIT"):
-            return node("Boolean", self.need("TROOF_LIT").lexeme)
-
-        # identifier reference
-        if self.at("IDENT"):
-            # name = self.need("IDENT").lexeme
-            # return self.symbols.get(name, None)
-            return node("Identifier", self.need("IDENT").lexeme)
-
-        # arithmetic binary
-        if self.at("SUM_OF","DIFF_OF","PRODUKT_OF","QUOSHUNT_OF","MOD_OF","BIGGR_OF","SMALLR_OF"):
-            op = self.peek().type; self.i += 1
-            a = self.eval_expr(); self.need("AN"); b = self.eval_expr()
-            # return self._arith(op, a, b)
-            return node(op, a, b)
-
-        # boolean binary
-        if self.at("BOTH_OF","EITHER_OF","WON_OF"):
-            op = self.peek().type; self.i += 1
-            a = self.eval_expr(); self.need("AN"); b = self.eval_expr()
-            # return self._bool(op, a, b)
-            return node(op, a, b)
-        if self.at("NOT"):
-            # self.i += 1; return not self.eval_expr()
-            self.i += 1; return node("NOT", self.eval_expr())
-        
-        if self.at("ALL_OF","ANY_OF"):
-            op = self.peek().type; self.i += 1
-            vals = [self.eval_expr()]; self.need("AN"); vals.append(self.eval_expr())
-            while self.match("AN"): vals.append(self.eval_expr())
-            self.need("MKAY")
-            # return all(vals) if op == "ALL_OF" else any(vals)
-            return node(op, *vals)
-
-        # comparison
-        if self.at("BOTH_SAEM"):
-            # self.i += 1; a = self.eval_expr(); self.need("AN"); b = self.eval_expr(); return a == b
-            self.i += 1; a = self.eval_expr(); self.need("AN"); b = self.eval_expr(); return node("BOTH_SAEM", a, b)
-        if self.peek().lexeme == "DIFFRINT":   # tokenized as IDENT
-            # self.i += 1; a = self.eval_expr(); self.need("AN"); b = self.eval_expr(); return a != b
-            self.i += 1; a = self.eval_expr(); self.need("AN"); b = self.eval_expr(); return node("DIFFRINT", a, b)
-
-        # concatenation
-        if self.at("SMOOSH"):
-            n = self.concat_stmt()
-            return n
-
-        # cast
-        if self.at("MAEK_A"):
-            # self.i += 1; v = self.eval_expr(); self.need("A"); t = self.need("TYPE").lexeme
-            self.i += 1; v = self.eval_expr(); t = self.need("TYPE_LIT").lexeme
-            # return self._cast(v, t)
-            return node("CAST", v, ("Target Type", t))
-
-        got = self.peek()
-        raise ParseError(f"Unsupported expression at {got.line}:{got.col}: {got.lexeme!r}")
+    #
+    # Iterative, not recursive, so how deep expressions nest is only limited
+    # by memory: every operation is prefix, so an operator token is pushed on
+    # `pending` until its operands are in, and each finished operand is handed
+    # to the innermost pending operator, which decides whether it needs
+    # another one (AN ...) or is done, and is then itself the operand of the
+    # one under it. Operations record their position (spans.py) when their
+    # token is read, before their operands do.
+    #
+    # smoosh_mkay: SMOOSH ends with MKAY (WAZZUP values), otherwise it ends
+    # at its last AN operand
+    #
+    # I IZ <name> [YR <expression> [AN YR <expression>]...] [MKAY] is a call,
+    # ("CALL", ("Identifier", name), ("Arguments", <expression>...)); an AN
+    # followed by YR is its next argument, any other AN belongs to the
+    # operation around it
+    def eval_expr(self, smoosh_mkay=False):
+        pending = []    # [shape, tag, operands] of operators still reading operands
+        while True:
+            t = self.peek()
+            kind = t.type
+            # literals
+            if kind == "NUMBR_LIT":
+                self.advance(); value = ("Integer", int(t.lexeme))
+            elif kind == "NUMBAR_LIT":
+                self.advance(); value = ("Float", float(t.lexeme))
+            elif kind == "YARN_LIT":
+                self.advance(); s = t.lexeme
+                value = ("String", bytes(s[1:-1], "utf-8").decode("unicode_escape"))
+            elif kind == "TROOF_LIT":
+                self.advance(); value = ("Boolean", t.lexeme == "WIN")
+            # identifier reference, names are interned so every mention of a
+            # variable shares one string
+            elif kind == "IDENT":
+                self.advance(); value = ("Identifier", intern(t.lexeme))
+            elif kind == "I_IZ":
+                self.advance(); self.spans += (t.line, t.col)
+                name = ("Identifier", intern(self.need("IDENT").lexeme))
+                if self.match("YR"):
+                    pending.append((CALL, "CALL", [name]))
+                    continue
+                self.match("MKAY")
+                value = ("CALL", name, ("Arguments",))
+            else:
+                operator = OPERATORS.get(kind)
+                if operator is None and t.lexeme == "DIFFRINT":   # tokenized as IDENT
+                    operator = (BINARY, "DIFFRINT")
+                if operator is None:
+                    raise ParseError(f"Unsupported expression at {t.line}:{t.col}: {t.lexeme!r}")
+                self.advance(); self.spans += (t.line, t.col)
+                pending.append((operator[0], operator[1], []))
+                continue
+
+            # value is finished, give it to the operators waiting for it
+            while pending:
+                shape, tag, operands = pending[-1]
+                operands.append(value)
+                if shape == BINARY:
+                    if len(operands) == 1:
+                        self.need("AN"); break
+                    value = (tag, operands[0], operands[1])
+                elif shape == UNARY:
+                    value = (tag, operands[0])
+                elif shape == VARIADIC:
+                    # ALL OF / ANY OF take two or more, then MKAY
+                    if len(operands) == 1:
+                        self.need("AN"); break
+                    if self.match("AN"): break
+                    self.need("MKAY")
+                    value = (tag, *operands)
+                elif shape == SMOOSH:
+                    if self.match("AN"): break
+                    if smoosh_mkay: self.need("MKAY")
+                    value = (tag, *operands)
+                elif shape == CALL:
+                    # operands are the name, then the arguments
+                    if self.at("AN") and self.kind(1) == "YR":
+                        self.advance(); self.advance(); break
+                    self.match("MKAY")
+                    value = (tag, operands[0], ("Arguments", *operands[1:]))
+                else:   # CAST, MAEK A <expression> <type>
+                    value = (tag, operands[0], ("Target Type", self.need("TYPE_LIT").lexeme))
+                pending.pop()
+            else:
+                return value
 
     # for evaluating expressions in the WAZZUP block only, does actual computations
+    # (with the same lol_runtime rules as the running program)
     def var_eval_expr(self):
-        # literals
-        if self.at("NUMBR_LIT"):
-            return int(self.need("NUMBR_LIT").lexeme)
-        if self.at("NUMBAR_LIT"):
-            return float(self.need("NUMBAR_LIT").lexeme)
-        if self.at("YARN_LIT"):
-            s = self.need("YARN_LIT").lexeme
-            return bytes(s[1:-1], "utf-8").decode("unicode_escape")
-        if self.at("TROOF_LIT"):
-            troof = self.need("TROOF_LIT").lexeme
-            return "True" if troof == "WIN" else "False"
-        # identifier reference
-        if self.at("IDENT"):
-            name = self.need("IDENT").lexeme
-            return self.symbols.get(name, None)
-
-        # arithmetic binary
-        if self.at("SUM_OF","DIFF_OF","PRODUKT_OF","QUOSHUNT_OF","MOD_OF","BIGGR_OF","SMALLR_OF"):
-            op = self.peek().type; self.i += 1
-            a = self.var_eval_expr(); self.need("AN"); b = self.var_eval_expr()
-            return self._arith(op, a, b)
-            # return node("ARITHMETIC OP", op, a, b)
-
-        # boolean binary
-        if self.at("BOTH_OF","EITHER_OF","WON_OF"):
-            op = self.peek().type; self.i += 1
-            a = self.var_eval_expr(); self.need("AN"); b = self.var_eval_expr()
-            return self._bool(op, a, b)
-            # return node("BOOLEAN OP", op, a, b)
-        if self.at("NOT"):
-            self.i += 1; return not self.var_eval_expr()
-            # self.i += 1; return node("NOT", self.var_eval_expr())
-        
-        if self.at("ALL_OF","ANY_OF"):
-            op = self.peek().type; self.i += 1
-            vals = [self.var_eval_expr()]; self.need("AN"); vals.append(self.var_eval_expr())
-            while self.match("AN"): vals.append(self.var_eval_expr())
-            self.need("MKAY")
-            return all(vals) if op == "ALL_OF" else any(vals)
-
-        # comparison
-        if self.at("BOTH_SAEM"):
-            self.i += 1; a = self.var_eval_expr(); self.need("AN"); b = self.var_eval_expr(); return a == b
-            # self.i += 1; a = self.var_eval_expr(); self.need("AN"); b = self.var_eval_expr(); return node("BOTH_SAEM", a, b)
-        if self.peek().lexeme == "DIFFRINT":   # tokenized as IDENT
-            self.i += 1; a = self.var_eval_expr(); self.need("AN"); b = self.var_eval_expr(); return a != b
-            # self.i += 1; a = self.var_eval_expr(); self.need("AN"); b = self.var_eval_expr(); return node("DIFFRINT", a, b)
-
-        # concatenation
-        if self.at("SMOOSH"):
-            self.i += 1
-            parts = [str(self.var_eval_expr())]
-            while self.match("AN"): parts.append(str(self.var_eval_expr()))
-            self.need("MKAY"); return "".join(parts)
-            # parts = ()
-            # while self.match("AN"): parts.append(self.var_eval_expr())
-            # self.need("MKAY")
-            # return node("SMOOSH", parts)
-
-        # cast
-        if self.at("MAEK_A"):
-            # self.i += 1; v = self.var_eval_expr(); self.need("A"); t = self.need("TYPE").lexeme
-            self.i += 1; v = self.var_eval_expr(); t = self.need("TYPE_LIT").lexeme
-            return self._cast(v, t)
-            # return node("CAST", ("VALUE", v), ("TARGET_TYPE", t))
-
-        got = self.peek()
-        raise ParseError(f"Unsupported expression at {got.line}:{got.col}: {got.lexeme!r}")
-
-    def _arith(self, op, a, b):
-        if op == "SUM_OF":      return (a or 0) + (b or 0)
-        if op == "DIFF_OF":     return (a or 0) - (b or 0)
-        if op == "PRODUKT_OF":  return (a or 0) * (b or 0)
-        if op == "QUOSHUNT_OF": return (a or 0) / (b or 1)
-        if op == "MOD_OF":      return (a or 0) % (b or 1)
-        if op == "BIGGR_OF":    return a if a >= b else b
-        if op == "SMALLR_OF":   return a if a <= b else b
-
-    def _bool(self, op, a, b):
-        if op == "BOTH_OF":   return bool(a) and bool(b)
-        if op == "EITHER_OF": return bool(a) or bool(b)
-        if op == "WON_OF":    return bool(a) ^ bool(b)
-
-    def _cast(self, v, t):
-        if t == "NUMBR": return int(v)
-        if t == "NUMBAR": return float(v)
-        if t == "YARN":  return "" if v is None else str(v)
-        if t == "TROOF": return bool(v)
-        return v
+        mark = len(self.spans)
+        tree = self.eval_expr(smoosh_mkay=True)
+        # the WAZZUP block isn't part of the position table
+        del self.spans[mark:]
+        return evaluate(tree, self.symbols.get)
+
+class BufferParser(Parser):
+    # the same parser over a whole lol_lexer.TokenBuffer (lex_compact): token
+    # types are read from the buffer by position, and a Token is only made
+    # for one whose text or position the parser uses
+    def __init__(self, buf: TokenBuffer):
+        super().__init__(())
+        self.buf = buf
+        self.types = buf.types
+        self.pos = 0
+        self.count = len(buf)
+        self.built = -1     # position of self.token
+        self.token = None
+        last = buf[self.count - 1] if self.count else None
+        self.eof = Token("EOF", "", last.line, last.col + len(last.lexeme)) if last else Token("EOF", "", 1, 1)
+
+    def kind(self, k=0):
+        i = self.pos + k
+        return TOKEN_TYPES[self.types[i]] if i < self.count else "EOF"
+    def at(self, *types):
+        i = self.pos
+        return (TOKEN_TYPES[self.types[i]] if i < self.count else "EOF") in types
+    def peek(self, k=0):
+        i = self.pos + k
+        if i == self.built:
+            return self.token
+        if i >= self.count:
+            return self.eof
+        # the last Token made is kept, peek() then advance() makes one
+        buf = self.buf
+        code = self.types[i]
+        text = buf.src[buf.starts[i]:buf.ends[i]]
+        if code in KEYWORD_CODES and text not in KEYWORD_TYPES:
+            text = buf.lexeme(i)
+        t = self.token = Token(TOKEN_TYPES[code], text, buf.lines[i], buf.cols[i])
+        self.built = i
+        return t
+    def advance(self):
+        t = self.peek()
+        if self.pos < self.count:
+            self.pos += 1
+        return t
@@ -0,0 +1,80 @@
+import sys
+import time
+
+# Opt-in profiler for the closure engine.
+#
+# With Interpreter(profiler=Profiler()) every compiled statement, and every
+# operation in an expression (SUM OF, BOTH SAEM, SMOOSH, I IZ, ...), is
+# wrapped in a closure that counts its calls and times it (compiler.py);
+# without one nothing is wrapped, so an unprofiled run pays nothing for
+# this. Literals and variable reads aren't timed on their own. Recursive
+# functions run on the bytecode VM (compiler.py), their statements aren't
+# timed on their own: a call of one counts for the statement making it. A
+# program whose blocks nest past compiler.MAX_NESTING runs on the VM whole,
+# and isn't timed by statement at all.
+#
+# Times are kept per statement or operation, under the (line, col) it starts
+# at (spans.py):
+#   total   it and everything it ran (a LOOP includes its body, a SUM OF its
+#           operands)
+#   own     total minus the statements and operations it ran itself
+# and per stack of nested statements and operations, which write_collapsed() saves in the
+# "frame;frame;frame value" format flamegraph.pl and speedscope read.
+
+ROOT = "HAI"
+
+class Profiler:
+    def __init__(self):
+        self.stats = {}     # (line, col, tag) -> [calls, total s, own s]
+        self.stacks = {}    # "HAI;LOOP 4:5;ASSIGN 5:9" -> own s
+        # [stack, time spent in children] of each statement still running
+        self.running = [[ROOT, 0.0]]
+
+    def wrap(self, step, tag, position):
+        line, col = position if position is not None else (0, 0)
+        stat = self.stats.setdefault((line, col, tag), [0, 0.0, 0.0])
+        name = f"{tag} {line}:{col}"
+        running = self.running
+        stacks = self.stacks
+        clock = time.perf_counter
+        def run(frame):
+            entry = [running[-1][0] + ";" + name, 0.0]
+            running.append(entry)
+            start = clock()
+            try:
+                return step(frame)
+            finally:
+                elapsed = clock() - start
+                running.pop()
+                running[-1][1] += elapsed
+                own = elapsed - entry[1]
+                stat[0] += 1
+                stat[1] += elapsed
+                stat[2] += own
+                stack = entry[0]
+                stacks[stack] = stacks.get(stack, 0.0) + own
+        return run
+
+    def hottest(self):
+        # ((line, col, tag), calls, total, own) of every statement that ran,
+        # most own time first
+        rows = [(key, calls, total, own) for key, (calls, total, own) in self.stats.items() if calls]
+        rows.sort(key=lambda row: row[3], reverse=True)
+        return rows
+
+    def report(self, out=None, top=20, source=None):
+        # source: the program's text, to show each statement or operation
+        # from where it starts
+        out = out or sys.stderr
+        rows = self.hottest()
+        lines = source.splitlines() if source else []
+        spent = sum(row[3] for row in rows) or 1.0
+        out.write(f"{'own ms':>10} {'own %':>6} {'total ms':>10} {'calls':>10}  {'line:col':<9} statement\n")
+        for (line, col, tag), calls, total, own in rows[:top]:
+            text = lines[line - 1][max(col - 1, 0):].strip() if 0 < line <= len(lines) else tag
+            out.write(f"{own * 1000:10.2f} {own / spent * 100:5.1f}% {total * 1000:10.2f} {calls:10d}  {f'{line}:{col}':<9} {text}\n")
+
+    def write_collapsed(self, f):
+        # own time in microseconds, one line per stack
+        for stack, own in sorted(self.stacks.items()):
+            f.write(f"{stack} {round(own * 1e6)}\n")
@@ -0,0 +1,183 @@
+from lol_runtime import CompileError, located
+from spans import TAGS, walk
+
+# Resolves variable names to fixed slot numbers before a program runs.
+#
+# Every WAZZUP variable (and IT) gets a slot, the running program keeps its
+# values in a plain list (the frame) and only ever indexes it. Names that were
+# never declared are collected while compiling and reported together by check(),
+# so they fail at compile time instead of halfway through a run.
+#
+# Functions (HOW IZ I) are all found before anything is compiled, so a call
+# may come before the definition. Each one's IT and parameters get slots of
+# their own after the program's variables, [IT, parameter, ...], which a call
+# saves, fills in and puts back when it returns, so recursion works on the
+# same frame. Inside a function its IT and parameters hide the program's
+# variables of the same name, other names are the program's variables.
+
+class Function:
+    def __init__(self, node, start, index):
+        # ("FUNCTION", ("Name", name), ("Parameters", ("Identifier", name)...), ("CODE_BLOCK", ...))
+        self.name = node[1][1]
+        self.params = [param[1] for param in node[2][1:]]
+        self.body = node[3][1:]
+        self.node = node
+        self.index = index      # number of its position (spans.py)
+        self.start = start      # its slots are start (IT), start + 1, ...
+        self.count = len(self.params) + 1
+        self.slots = {"IT": start}
+        for i, name in enumerate(self.params):
+            self.slots[name] = start + 1 + i
+        # no VISIBLE or GIMMEH, no variable but its own, and only pure
+        # functions called: its value depends on its arguments alone
+        self.pure = False
+        # calls itself, maybe through other functions
+        self.recursive = False
+
+class Scope:
+    def __init__(self, symbols=None):
+        self.slots = {}       # name -> slot number
+        self.names = []       # slot number -> name
+        self.initial = []     # slot number -> value from the WAZZUP block
+        self.undeclared = []  # names used but never declared, in order of first use
+        self.functions = {}   # name -> Function
+        self.local = None     # the Function whose body is being compiled
+
+        self.declare("IT", None)
+        if symbols:
+            for name, value in symbols.items():
+                self.declare(name, value)
+
+    def declare(self, name, value=None):
+        if name in self.slots:
+            self.initial[self.slots[name]] = value
+        else:
+            self.slots[name] = len(self.names)
+            self.names.append(name)
+            self.initial.append(value)
+        return self.slots[name]
+
+    def slot(self, name):
+        if self.local is not None:
+            slot = self.local.slots.get(name)
+            if slot is not None:
+                return slot
+        slot = self.slots.get(name)
+        if slot is None:
+            if name not in self.undeclared:
+                self.undeclared.append(name)
+            # any slot will do, check() stops the program from ever running
+            return 0
+        return slot
+
+    def define_functions(self, ast):
+        # every HOW IZ I in the program, with the number of its position
+        # (spans.py), so a compiler can take them in any order
+        index = 0
+        for node in walk(ast[2]):
+            if node[0] not in TAGS:
+                continue
+            if node[0] == "FUNCTION":
+                self.define_function(node, index)
+            index += 1
+        self.find_pure()
+        self.find_recursive()
+
+    def define_function(self, node, index):
+        name = node[1][1]
+        if name in self.functions:
+            raise CompileError(f"Compile Error: The function '{name}' is defined twice")
+        # its slots aren't in self.slots, the program can't see them
+        function = Function(node, len(self.names), index)
+        if len(function.slots) != function.count:
+            raise CompileError(f"Compile Error: The function '{name}' has two parameters of the same name")
+        self.names.extend(["IT"] + function.params)
+        self.initial.extend([None] * function.count)
+        self.functions[name] = function
+
+    def find_pure(self):
+        # every function that looks pure on its own, then drop the ones
+        # calling anything else until none is left to drop
+        calls = {}
+        for function in self.functions.values():
+            called = self.calls_if_pure(function)
+            if called is not None:
+                calls[function] = called
+        pure = set(calls)
+        changed = True
+        while changed:
+            changed = False
+            for function in list(pure):
+                if not all(name in self.functions and self.functions[name] in pure for name in calls[function]):
+                    pure.discard(function)
+                    changed = True
+        for function in pure:
+            function.pure = True
+
+    def calls_if_pure(self, function):
+        # names of the functions function calls, None if it does anything
+        # else a pure function can't
+        called = set()
+        stack = list(function.body)
+        while stack:
+            node = stack.pop()
+            tag = node[0]
+            if tag in ("PRINT", "INPUT", "FUNCTION"):
+                return None
+            if tag == "Identifier":
+                if node[1] not in function.slots:
+                    return None
+            elif tag == "CALL":
+                # ("CALL", ("Identifier", name), ("Arguments", ...)), the name isn't a variable
+                called.add(node[1][1])
+                stack.append(node[2])
+            else:
+                stack.extend([child for child in node[1:] if type(child) is tuple])
+        return called
+
+    def find_recursive(self):
+        # every function that can reach itself through the calls in its body
+        calls = {}
+        for function in self.functions.values():
+            calls[function] = {node[1][1] for node in walk(function.node[3]) if node[0] == "CALL"}
+        for function in self.functions.values():
+            seen = set()
+            names = list(calls[function])
+            while names:
+                name = names.pop()
+                if name == function.name:
+                    function.recursive = True
+                    break
+                if name in seen or name not in self.functions:
+                    continue
+                seen.add(name)
+                names.extend(calls[self.functions[name]])
+
+    def function(self, name, count, position=None):
+        # the Function called name, for a call passing it count arguments
+        function = self.functions.get(name)
+        if function is None:
+            raise CompileError(located(f"Compile Error: The function '{name}' has not been defined", position))
+        if count != len(function.params):
+            raise CompileError(located(f"Compile Error: The function '{name}' takes {len(function.params)} "
+                                       f"argument{'s' if len(function.params) != 1 else ''}, got {count}", position))
+        return function
+
+    def check(self):
+        if len(self.undeclared) == 1:
+            raise CompileError(f"Compile Error: The variable '{self.undeclared[0]}' has not yet been declared")
+        if self.undeclared:
+            names = ", ".join(f"'{name}'" for name in self.undeclared)
+            raise CompileError(f"Compile Error: The variables {names} have not yet been declared")
+
+    def frame(self):
+        # fresh slot list for one run
+        return list(self.initial)
+
+def resolve(symbols, ast=None):
+    # symbols are the WAZZUP values from Parser.wazzup_block, the functions
+    # come from the ast
+    scope = Scope(symbols)
+    if ast is not None:
+        scope.define_functions(ast)
+    return scope
@@ -0,0 +1,82 @@
+from array import array
+
+# Source positions of AST nodes, kept beside the tuples instead of in them.
+#
+# Statements and operations (TAGS) have a position, the (line, col) of their
+# first token; literals, identifiers and the wrapper tuples don't. The parser
+# records them in the order it starts parsing them, which is their preorder
+# under the program's STATEMENT_LIST, so the n-th positioned node met walking
+# the tree depth first, children left to right, is entry n of the table, and
+# nothing needs numbering or a lookup by node. The table is a flat array of
+# line, col pairs, stored as its bytes as the last item of the PROGRAM tuple:
+#
+#   ("PROGRAM", <declarations>, ("STATEMENT_LIST", ...), <spans>)
+#
+# so it goes through marshal and the parse cache with the rest of the AST,
+# while tree walkers that only follow tuple children never see it.
+#
+# Anything that walks the tree with positions (compiler.py, bytecode.py,
+# optimizer.py, vector.py) keeps a Cursor in step with its walk: take() the
+# node's position on the way into every TAGS node, before its children, and
+# skip() subtrees it doesn't go into.
+
+STATEMENT_TAGS = ("PRINT", "INPUT", "CONCATENATE", "ARITH_OPERATION", "BOOL_OPERATION", "EXPRESSION",
+                  "LOOP", "FUNCTION", "ASSIGN", "PERM_CAST", "RETURN", "BREAK",
+                  "CONDITIONAL", "SWITCH")
+OPERATION_TAGS = ("SUM_OF", "DIFF_OF", "PRODUKT_OF", "QUOSHUNT_OF", "MOD_OF", "BIGGR_OF", "SMALLR_OF",
+                  "BOTH_OF", "EITHER_OF", "WON_OF", "NOT", "ALL_OF", "ANY_OF",
+                  "BOTH_SAEM", "DIFFRINT", "CONCATENATE", "CAST", "CALL")
+TAGS = frozenset(STATEMENT_TAGS + OPERATION_TAGS)
+
+def walk(tup):
+    # every node (tuple) of a subtree, in preorder; an explicit stack rather
+    # than recursion, so any depth works
+    stack = [tup]
+    pop = stack.pop
+    push = stack.extend
+    while stack:
+        tup = pop()
+        yield tup
+        if len(tup) > 1:
+            push([child for child in reversed(tup) if type(child) is tuple])
+
+def count(tup):
+    # positioned nodes in a subtree
+    return sum([1 for node in walk(tup) if node[0] in TAGS])
+
+def pack(table):
+    # flat [line, col, line, col, ...] -> bytes
+    return array("i", table).tobytes()
+
+def unpack(ast):
+    # the flat table of a program, empty for ASTs that carry none
+    table = array("i")
+    if len(ast) >= 4 and type(ast[3]) is bytes:
+        table.frombytes(ast[3])
+    return table
+
+class Cursor:
+    # walks a table in step with a walk of the tree
+    def __init__(self, table):
+        self.table = table
+        self.positions = list(zip(table[0::2], table[1::2]))
+        self.next = 0   # number of the next positioned node
+
+    def take(self, tup):
+        # tup's position, None if it has none (or the AST carries no table)
+        if tup[0] in TAGS:
+            n = self.next
+            self.next = n + 1
+            if n < len(self.positions):
+                return self.positions[n]
+        return None
+
+    def skip(self, tup):
+        # moves past a subtree without walking it
+        self.next += count(tup)
+
+    def copy(self, tup, out):
+        # skip(), appending the subtree's positions to the flat list out
+        n = count(tup)
+        out.extend(self.table[2 * self.next:2 * (self.next + n)])
+        self.next += n
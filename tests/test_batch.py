@@ -0,0 +1,60 @@
+import csv
+import pytest
+import vector
+from lolterpreter import batch_file
+from interpreter import parse_source
+
+PROGRAM = """HAI
+WAZZUP
+    I HAS A x
+    I HAS A y
+BUHBYE
+GIMMEH x
+GIMMEH y
+VISIBLE SUM OF x AN y
+VISIBLE QUOSHUNT OF x AN y
+KTHXBYE
+"""
+
+# the last fields are missing, GIMMEH gets "" for them
+INPUTS = "x,y\n6,3\n1,0\n7.5,2\nabc,1\n10,4\n8\n8,-2\n"
+
+EXPECTED = [
+    ["record", "output", "error"],
+    ["1", "9\n2", ""],
+    ["2", "1", "Runtime Error: Division by zero (line 9, col 9)"],
+    ["3", "9.50\n3.75", ""],
+    ["4", "", "Runtime Error: Cannot implicitly cast `abc` to digit (line 8, col 9)"],
+    ["5", "14\n2", ""],
+    ["6", "", "Runtime Error: Cannot implicitly cast `` to digit (line 8, col 9)"],
+    ["7", "6\n-4", ""],
+]
+
+@pytest.fixture
+def files(tmp_path):
+    program = tmp_path / "div.lol"
+    program.write_text(PROGRAM, encoding="utf-8")
+    inputs = tmp_path / "inputs.csv"
+    inputs.write_text(INPUTS, encoding="utf-8")
+    return str(program), str(inputs)
+
+def rows(files, capsys, **options):
+    failed = batch_file(*files, skip_header=True, **options)
+    return failed, list(csv.reader(capsys.readouterr().out.splitlines(keepends=True)))
+
+VECTOR = pytest.param(True, marks=pytest.mark.skipif(not vector.available(), reason="numpy isn't installed"))
+
+@pytest.mark.parametrize("vectorize", [False, VECTOR], ids=["records", "vector"])
+@pytest.mark.parametrize("workers", [1, 2])
+@pytest.mark.parametrize("engine", ["closures", "vm"])
+def test_batch_rows(files, capsys, engine, workers, vectorize):
+    # chunks of 2 records, so a worker gets several and errors land mid-chunk
+    failed, out = rows(files, capsys, engine=engine, workers=workers, chunk_size=2, vectorize=vectorize)
+    assert out == EXPECTED
+    assert failed == 3
+
+def test_program_is_vectorizable():
+    # otherwise the vector runs above would only repeat the record ones
+    if not vector.available():
+        pytest.skip("numpy isn't installed")
+    assert vector.vectorizable(parse_source(PROGRAM)[0])
@@ -0,0 +1,384 @@
+import time
+import threading
+import pytest
+import compiler
+from interpreter import Interpreter, OutputBuffer, parse_source
+from lol_runtime import RuntimeError, Budget, BudgetExceeded
+
+ENGINES = pytest.mark.parametrize("engine", ["closures", "vm"])
+
+def prepare(code, engine, **options):
+    ast, symbols = parse_source(code)
+    lines = []
+    interpreter = Interpreter(output=lines.append, engine=engine, **options)
+    return interpreter, interpreter.prepare(ast, symbols), lines
+
+FAILING_CALL = """HAI
+WAZZUP
+    I HAS A x ITZ 4
+BUHBYE
+HOW IZ I half YR n
+    FOUND YR QUOSHUNT OF n AN 0
+IF U SAY SO
+HOW IZ I down YR n
+    BOTH SAEM n AN 0
+    O RLY?
+        YA RLY
+            FOUND YR I IZ half YR x
+    OIC
+    FOUND YR SUM OF 1 AN I IZ down YR DIFF OF n AN 1
+IF U SAY SO
+VISIBLE I IZ down YR 3
+KTHXBYE
+"""
+
+@ENGINES
+def test_failed_call_restores_frame(engine):
+    # a runtime error inside (recursive) calls leaves every function's
+    # slots as they were before the call, for an Interpreter that goes on
+    interpreter, run, lines = prepare(FAILING_CALL, engine)
+    with pytest.raises(RuntimeError, match="Division by zero"):
+        run()
+    symbols = interpreter.symbols
+    assert symbols.as_dict() == {"IT": None, "x": 4}
+    assert all(value is None for value in symbols.values[len(symbols):])
+
+SLOW_LOOP = """HAI
+WAZZUP
+    I HAS A n ITZ 0
+    I HAS A i ITZ 0
+BUHBYE
+VISIBLE "Computing..."
+IM IN YR loop UPPIN YR i TIL BOTH SAEM i AN 400000
+    n R SUM OF n AN i
+IM OUTTA YR loop
+VISIBLE "done"
+KTHXBYE
+"""
+
+@ENGINES
+def test_buffered_output_flushes_while_running(engine):
+    # a VISIBLE before a long loop reaches the sink while the loop runs
+    received = []
+    output = OutputBuffer(lambda text: received.append((time.perf_counter(), text)), interval=0.02)
+    ast, symbols = parse_source(SLOW_LOOP)
+    Interpreter(output=output, engine=engine).run(ast, symbols)
+    end = time.perf_counter()
+    assert [text for at, text in received] == ["Computing...", "done"]
+    assert end - received[0][0] > 0.05
+
+LOOPS = """HAI
+WAZZUP
+    I HAS A total ITZ 0
+    I HAS A limit ITZ 5
+    I HAS A i ITZ 0
+    I HAS A j ITZ 10
+BUHBYE
+IM IN YR up UPPIN YR i TIL BOTH SAEM i AN limit
+    total R SUM OF total AN i
+IM OUTTA YR up
+IM IN YR down NERFIN YR j WILE DIFFRINT j AN 0
+    total R PRODUKT OF total AN 2
+IM OUTTA YR down
+VISIBLE total " " i " " j
+total R QUOSHUNT OF total AN 0
+KTHXBYE
+"""
+
+def test_vm_matches_closures():
+    # the VM's superinstructions (bytecode.fuse) behave like what they replace
+    results = []
+    for engine in ("closures", "vm"):
+        interpreter, run, lines = prepare(LOOPS, engine)
+        with pytest.raises(RuntimeError) as error:
+            run()
+        results.append((lines, str(error.value)))
+    assert results[0] == results[1]
+    assert results[1] == (["10240 5 0"], "Runtime Error: Division by zero (line 15, col 9)")
+
+SMOOSHES = """HAI
+WAZZUP
+    I HAS A x ITZ "abcdef"
+BUHBYE
+NOT SMOOSH x AN x
+VISIBLE SMOOSH "abc" AN "def"
+KTHXBYE
+"""
+
+@ENGINES
+def test_optimizer_keeps_smoosh_over_yarn_budget(engine):
+    # a SMOOSH in a dead IT, and a foldable one, still go over the budget
+    budget = Budget(yarn=5)
+    interpreter, run, lines = prepare(SMOOSHES, engine, budget=budget)
+    with pytest.raises(BudgetExceeded) as error:
+        run()
+    assert error.value.position == (5, 5)
+    code = SMOOSHES.replace("NOT SMOOSH x AN x\n", "")
+    interpreter, run, lines = prepare(code, engine, budget=budget)
+    with pytest.raises(BudgetExceeded):
+        run()
+
+CHANGES = """HAI
+WAZZUP
+    I HAS A a ITZ 0
+    I HAS A b ITZ 0
+    I HAS A c ITZ 0
+    I HAS A i ITZ 0
+BUHBYE
+HOW IZ I f YR n
+    n R SUM OF n AN 1
+    FOUND YR n
+IF U SAY SO
+a R 1
+IM IN YR loop UPPIN YR i TIL BOTH SAEM i AN 2
+    c R I IZ f YR i
+IM OUTTA YR loop
+GIMMEH b
+KTHXBYE
+"""
+
+@ENGINES
+def test_symbol_listener_gets_changed_slots(engine):
+    # every change notes its slot in symbols.dirty, untouched variables never show up
+    changes = []
+    def listen(symbols):
+        names = list(symbols.slots)
+        while symbols.dirty:
+            slot = symbols.dirty.pop()
+            # slots past the table are f's n
+            changes.append(names[slot] if slot < len(names) else "n")
+    ast, symbols = parse_source(CHANGES)
+    Interpreter(output=lambda text: None, input=lambda name: "5", on_symbols=listen, engine=engine).run(ast, symbols)
+    assert changes == ["a", "n", "c", "i", "n", "c", "i", "b"]
+
+# well past compiler.MAX_DEPTH and Python's recursion limit
+DEEP = 3000
+
+def deep_program(body):
+    return f"HAI\nWAZZUP\n    I HAS A x ITZ 0\n    I HAS A i ITZ 0\nBUHBYE\n{body}\nKTHXBYE\n"
+
+def nested_ifs(depth, inner):
+    # O RLY?s each in the YA RLY of the one before
+    return "BOTH SAEM x AN 0\nO RLY?\nYA RLY\n" * depth + inner + "\nOIC" * depth
+
+NESTED = {
+    "expression": ("VISIBLE " + "SUM OF 1 AN " * DEEP + "0", [str(DEEP)]),
+    "statement": ("SUM OF 1 AN " * DEEP + "0\nVISIBLE IT", [str(DEEP)]),
+    "smoosh": ("VISIBLE " + "SMOOSH 1 AN " * DEEP + "0", ["1" * DEEP + "0"]),
+    "o rly": (nested_ifs(DEEP, 'VISIBLE "deep"'), ["deep"]),
+    # the innermost GTFO leaves the loop around all of them
+    "o rly in loop": ("IM IN YR loop UPPIN YR i TIL BOTH SAEM i AN 5\n" + nested_ifs(DEEP, "VISIBLE i\nGTFO")
+                      + "\nIM OUTTA YR loop\nVISIBLE i", ["0", "0"]),
+    "loops": ("".join(f"IM IN YR l{n} UPPIN YR i WILE BOTH SAEM i AN 0\n" for n in range(DEEP)) + "VISIBLE i"
+              + "".join(f"\nIM OUTTA YR l{n}" for n in reversed(range(DEEP))) + "\nVISIBLE i", ["0", str(DEEP)]),
+    "function": ("HOW IZ I f YR n\n" + nested_ifs(DEEP, "FOUND YR SUM OF n AN 1") + "\nIF U SAY SO\nVISIBLE I IZ f YR 41",
+                 ["42"]),
+}
+
+@ENGINES
+@pytest.mark.parametrize("optimize", [True, False], ids=["optimized", "unoptimized"])
+@pytest.mark.parametrize("body, expected", NESTED.values(), ids=NESTED.keys())
+def test_deep_nesting(engine, optimize, body, expected):
+    # parsing, optimizing, compiling and running never use Python's stack per level
+    interpreter, run, lines = prepare(deep_program(body), engine, optimize=optimize)
+    run()
+    assert lines == expected
+
+def test_deep_nesting_error_position():
+    # an error deep inside still says where it happened, on either engine
+    body = nested_ifs(DEEP, "VISIBLE QUOSHUNT OF x AN 0")
+    line = 5 + 3 * DEEP + 1
+    for engine in ("closures", "vm"):
+        interpreter, run, lines = prepare(deep_program(body), engine)
+        with pytest.raises(RuntimeError, match=f"Division by zero \\(line {line}, col 9\\)"):
+            run()
+
+RECURSION = """HAI
+WAZZUP
+    I HAS A n ITZ 0
+BUHBYE
+HOW IZ I count YR n AN YR acc
+    BOTH SAEM n AN 0
+    O RLY?
+        YA RLY
+            FOUND YR acc
+    OIC
+    FOUND YR I IZ count YR DIFF OF n AN 1 AN YR SUM OF acc AN n MKAY
+IF U SAY SO
+HOW IZ I depth YR n
+    BOTH SAEM n AN 0
+    O RLY?
+        YA RLY
+            FOUND YR 0
+    OIC
+    FOUND YR SUM OF 1 AN I IZ depth YR DIFF OF n AN 1
+IF U SAY SO
+GIMMEH n
+VISIBLE I IZ count YR n AN YR 0 MKAY
+VISIBLE I IZ depth YR n
+KTHXBYE
+"""
+
+def recurse(engine, n, **options):
+    lines = []
+    ast, symbols = parse_source(RECURSION)
+    interpreter = Interpreter(output=lines.append, input=lambda name: str(n), engine=engine, **options)
+    try:
+        interpreter.run(ast, symbols)
+    except RuntimeError as e:
+        return lines, str(e), interpreter.symbols
+    return lines, None, interpreter.symbols
+
+@ENGINES
+@pytest.mark.parametrize("memoize", [False, True], ids=["plain", "memoized"])
+def test_tail_recursion_is_not_limited(engine, memoize):
+    # FOUND YR I IZ ... replaces the running call, 200000 of them fit in a max_depth of 10
+    lines, error, symbols = recurse(engine, 200000, max_depth=10, memoize=memoize)
+    assert lines[0] == str(200000 * 200001 // 2)
+    assert error == "Runtime Error: Too much recursion in 'depth' (line 19, col 26)"
+
+@ENGINES
+@pytest.mark.parametrize("memoize", [False, True], ids=["plain", "memoized"])
+def test_recursion_past_max_depth(engine, memoize):
+    lines, error, symbols = recurse(engine, 1000, max_depth=1000, memoize=memoize)
+    assert lines == ["500500"]
+    assert error == "Runtime Error: Too much recursion in 'depth' (line 19, col 26)"
+    # the functions' slots are back as they were
+    assert symbols.as_dict() == {"IT": None, "n": "1000"}
+    assert all(value is None for value in symbols.values[len(symbols):])
+    # one call less fits
+    lines, error, symbols = recurse(engine, 999, max_depth=1000, memoize=memoize)
+    assert (lines, error) == (["499500", "999"], None)
+
+def test_recursion_same_on_both_engines():
+    # deeper than Python's own limit, well inside the default max_depth
+    results = [recurse(engine, 20000)[:2] for engine in ("closures", "vm")]
+    assert results[0] == results[1] == (["200010000", "20000"], None)
+
+def counting_program(start, bound, header, body=""):
+    # c counts the iterations, shrink and skip change the bound and the counter
+    return f"""HAI
+WAZZUP
+    I HAS A i ITZ {start}
+    I HAS A n ITZ {bound}
+    I HAS A c ITZ 0
+BUHBYE
+HOW IZ I shrink
+    n R DIFF OF n AN 1
+IF U SAY SO
+HOW IZ I skip
+    i R SUM OF i AN 1
+IF U SAY SO
+IM IN YR loop {header}
+    c R SUM OF c AN 1
+    {body}
+IM OUTTA YR loop
+VISIBLE c " " i " " n
+KTHXBYE
+"""
+
+# (start, bound, loop header, body) -> (output, does the closure engine count it up front)
+COUNTING = {
+    "uppin til": ((0, 5, "UPPIN YR i TIL BOTH SAEM i AN n"), "5 5 5", True),
+    "uppin wile": ((0, 5, "UPPIN YR i WILE DIFFRINT i AN n"), "5 5 5", True),
+    "nerfin til": ((5, -2, "NERFIN YR i TIL BOTH SAEM i AN n"), "7 -2 -2", True),
+    "nerfin wile": ((5, 0, "NERFIN YR i WILE DIFFRINT n AN i"), "5 0 0", True),
+    "literal bound": ((0, 0, "UPPIN YR i TIL BOTH SAEM 3 AN i"), "3 3 0", True),
+    "til biggr": ((0, 5, "UPPIN YR i TIL BOTH SAEM i AN BIGGR OF i AN n"), "5 5 5", True),
+    "til biggr past": ((7, 5, "UPPIN YR i TIL BOTH SAEM i AN BIGGR OF n AN i"), "0 7 5", True),
+    "wile smallr": ((0, 5, "UPPIN YR i WILE BOTH SAEM i AN SMALLR OF i AN n"), "6 6 5", True),
+    "nerfin til smallr": ((5, 2, "NERFIN YR i TIL BOTH SAEM i AN SMALLR OF i AN n"), "3 2 2", True),
+    "nerfin wile biggr": ((5, 2, "NERFIN YR i WILE BOTH SAEM i AN BIGGR OF i AN n"), "4 1 2", True),
+    # the bound is where the counter starts
+    "til at bound": ((4, 4, "UPPIN YR i TIL BOTH SAEM i AN n"), "0 4 4", True),
+    "wile at bound": ((4, 4, "NERFIN YR i WILE DIFFRINT i AN n"), "0 4 4", True),
+    # counting away from the bound never gets there, a GTFO ends it
+    "never": ((0, 5, "NERFIN YR i TIL BOTH SAEM i AN n", "BOTH SAEM c AN 10\nO RLY?\nYA RLY\nGTFO\nOIC"),
+              "10 -9 5", False),
+    # not a NUMBR: the loop tests its condition every time
+    "yarn bound": ((0, '"5"', "UPPIN YR i TIL BOTH SAEM i AN n"), "5 5 5", False),
+    "numbar bound": ((0, 5.0, "UPPIN YR i TIL BOTH SAEM i AN n"), "5 5 5.00", False),
+    "numbar between": ((0, 4.5, "UPPIN YR i TIL BOTH SAEM i AN BIGGR OF i AN n"), "5 5 4.50", False),
+    "numbar counter": ((0.0, 5, "UPPIN YR i TIL BOTH SAEM i AN n"), "5 5.00 5", False),
+    # the body moves the counter or the bound, itself or through a call
+    "body sets counter": ((0, 6, "UPPIN YR i TIL BOTH SAEM i AN n", "i R SUM OF i AN 1"), "3 6 6", False),
+    "body sets bound": ((0, 10, "UPPIN YR i TIL BOTH SAEM i AN n", "n R DIFF OF n AN 1"), "5 5 5", False),
+    "call sets counter": ((0, 6, "UPPIN YR i TIL BOTH SAEM i AN n", "I IZ skip"), "3 6 6", False),
+    "call sets bound": ((0, 10, "UPPIN YR i TIL BOTH SAEM i AN n", "I IZ shrink"), "5 5 5", False),
+}
+
+@ENGINES
+@pytest.mark.parametrize("loop, output, counted", COUNTING.values(), ids=COUNTING.keys())
+def test_counting_loops(engine, loop, output, counted, monkeypatch):
+    worked_out = []
+    def iterations(*args):
+        times = real(*args)
+        worked_out.append(times)
+        return times
+    real = compiler.iterations
+    monkeypatch.setattr(compiler, "iterations", iterations)
+    interpreter, run, lines = prepare(counting_program(*loop), engine)
+    run()
+    assert lines == [output]
+    if engine == "closures":
+        assert (bool(worked_out) and worked_out[0] is not None) == counted
+
+@pytest.mark.parametrize("until, start, bound, step, times", [
+    ("==", 0, 5, 1, 5), ("==", 5, 5, 1, 0), ("==", 6, 5, 1, None), ("==", 5, -2, -1, 7), ("==", -2, 5, -1, None),
+    (">=", 0, 5, 1, 5), (">=", 7, 5, 1, 0), (">", 0, 5, 1, 6), (">", 6, 5, 1, 0),
+    ("<=", 5, 2, -1, 3), ("<", 5, 2, -1, 4), ("<=", 0, 5, 1, 0), ("<=", 6, 5, 1, None), ("<", 5, 5, 1, None),
+])
+def test_iterations(until, start, bound, step, times):
+    assert compiler.iterations(until, start, bound, step) == times
+
+FOREVER = """HAI
+WAZZUP
+    I HAS A i ITZ 0
+BUHBYE
+HOW IZ I twice YR n
+    FOUND YR PRODUKT OF n AN 2
+IF U SAY SO
+VISIBLE "start"
+IM IN YR loop UPPIN YR i WILE WIN
+    I IZ twice YR i MKAY
+IM OUTTA YR loop
+KTHXBYE
+"""
+
+@ENGINES
+@pytest.mark.parametrize("budget, kind", [(Budget(steps=1000), "steps"), (Budget(seconds=0.05), "time")],
+                         ids=["steps", "time"])
+def test_budget_stops_endless_loop(engine, budget, kind):
+    interpreter, run, lines = prepare(FOREVER, engine, budget=budget)
+    with pytest.raises(BudgetExceeded) as error:
+        run()
+    assert error.value.kind == kind
+    assert error.value.position is not None
+    assert error.value.position[0] in (9, 10)
+    assert f"(line {error.value.position[0]}, col " in str(error.value)
+    assert lines == ["start"]
+    if kind == "steps":
+        assert error.value.limit == 1000
+        # loop steps and calls count alike
+        assert 450 <= interpreter.symbols["i"] <= 550
+
+@ENGINES
+def test_time_budget_every_run(engine):
+    # one watchdog thread serves every run of an Interpreter, a run stopped
+    # for its time doesn't stop the next
+    budget = Budget(seconds=0.05)
+    interpreter, run, lines = prepare(FOREVER, engine, budget=budget)
+    ast, symbols = parse_source('HAI\nVISIBLE "quick"\nKTHXBYE\n')
+    quick = interpreter.prepare(ast, symbols)
+    threads = None
+    for _ in range(3):
+        with pytest.raises(BudgetExceeded, match="time budget of 0.05 seconds"):
+            run()
+        if threads is None:
+            threads = threading.active_count()
+        assert threading.active_count() == threads
+        quick()
+        # past where the deadline of this run would have been
+        time.sleep(0.06)
+        assert interpreter.stop_requested[0] is False
+    assert lines == ["start", "quick"] * 3
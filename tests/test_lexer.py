@@ -0,0 +1,74 @@
+import io
+import os
+import glob
+import pytest
+from lol_lexer import lex, lex_stream, lex_compact
+from parser_try import Parser, BufferParser
+
+TESTCASES = sorted(glob.glob(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                          "project-testcases", "*.lol")))
+
+def tokens(stream):
+    return [(t.type, t.lexeme, t.line, t.col) for t in stream]
+
+def source(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7])
+@pytest.mark.parametrize("path", TESTCASES, ids=os.path.basename)
+def test_stream_matches_lex(path, chunk_size):
+    src = source(path)
+    expected = tokens(lex(src))
+    assert tokens(lex_stream(io.StringIO(src), chunk_size)) == expected
+    assert tokens(lex_stream(io.BytesIO(src.encode("utf-8")), chunk_size)) == expected
+
+class Pieces:
+    # a file whose reads return the given pieces, whatever size is asked for
+    def __init__(self, *pieces):
+        self.pieces = list(pieces)
+
+    def read(self, size):
+        return self.pieces.pop(0) if self.pieces else ""
+
+SPLITS = {
+    # a multi-word keyword across the boundary, and across a line break
+    "keyword": ('HAI\nI HAS A x\nx R SUM OF 1 AN 2\nKTHXBYE\n', ('HAI\nI HAS A x\nx R SUM\n', 'OF 1 AN 2\nKTHXBYE\n')),
+    "keyword lines": ('HAI\nVISIBLE SUM\nOF 1 AN 2\nKTHXBYE\n', ('HAI\nVISIBLE SUM\n', 'OF 1 AN 2\nKTHXBYE\n')),
+    # a YARN spanning lines, split inside it
+    "yarn": ('HAI\nVISIBLE "a\nb c"\nKTHXBYE\n', ('HAI\nVISIBLE "a\n', 'b c"\nKTHXBYE\n')),
+    # a comment split between OBTW and TLDR
+    "comment": ('HAI\nOBTW\nx\nTLDR\nVISIBLE 1\nKTHXBYE\n', ('HAI\nOBTW\n', 'x\n', 'TLDR\nVISIBLE 1\nKTHXBYE\n')),
+    # a UTF-8 character split between reads of bytes
+    "utf-8": ('HAI\nVISIBLE "ñ"\nKTHXBYE\n', (b'HAI\nVISIBLE "\xc3', b'\xb1"\nKTHXBYE\n')),
+}
+
+@pytest.mark.parametrize("src, pieces", SPLITS.values(), ids=SPLITS.keys())
+def test_token_split_across_chunks(src, pieces):
+    assert tokens(lex_stream(Pieces(*pieces))) == tokens(lex(src))
+
+@pytest.mark.parametrize("path", TESTCASES, ids=os.path.basename)
+def test_compact_matches_lex(path):
+    src = source(path)
+    buf = lex_compact(src)
+    expected = tokens(lex(src))
+    assert len(buf) == len(expected)
+    assert tokens(buf) == expected
+    assert [buf.kind(i) for i in range(len(buf))] == [t[0] for t in expected]
+
+@pytest.mark.parametrize("path", TESTCASES, ids=os.path.basename)
+def test_buffer_parser_matches_parser(path):
+    src = source(path)
+    expected = Parser(lex(src))
+    compact = BufferParser(lex_compact(src))
+    assert compact.parse() == expected.parse()
+    assert compact.symbols == expected.symbols
+
+@pytest.mark.parametrize("src", ['HAI\nVISIBLE SUM OF 1 AN\nKTHXBYE\n', 'HAI\nI HAS A x ITZ'],
+                         ids=["missing operand", "eof"])
+def test_buffer_parser_errors_match(src):
+    with pytest.raises(Exception) as expected:
+        Parser(lex(src)).parse()
+    with pytest.raises(type(expected.value)) as compact:
+        BufferParser(lex_compact(src)).parse()
+    assert str(compact.value) == str(expected.value)
@@ -0,0 +1,82 @@
+import pytest
+import optimizer
+import lolterpreter
+from interpreter import Interpreter, parse_source
+
+def optimized(body, declarations="I HAS A x ITZ 0"):
+    # the program's statements after optimizing, and the nodes eliminated
+    ast, symbols = parse_source(f"HAI\nWAZZUP\n{declarations}\nBUHBYE\n{body}\nKTHXBYE\n")
+    ast, eliminated = optimizer.optimize(ast, symbols)
+    return list(ast[2][1:]), eliminated
+
+FOLDS = {
+    "SUM OF": ("VISIBLE SUM OF 1 AN 2", ("Integer", 3)),
+    "nested": ("VISIBLE SUM OF 1 AN PRODUKT OF 2 AN 3", ("Integer", 7)),
+    "PRODUKT OF": ("VISIBLE PRODUKT OF 2.5 AN 2", ("Float", 5.0)),
+    "MAEK A": ('VISIBLE MAEK A "12" NUMBR', ("Integer", 12)),
+    "BOTH SAEM": ('VISIBLE BOTH SAEM 2 AN "2"', ("Boolean", True)),
+    "ALL OF": ("VISIBLE ALL OF WIN AN FAIL AN WIN MKAY", ("Boolean", False)),
+}
+
+@pytest.mark.parametrize("body, value", FOLDS.values(), ids=FOLDS.keys())
+def test_folds_literal_operations(body, value):
+    stmts, eliminated = optimized(body)
+    assert stmts == [("PRINT", value)]
+    assert eliminated > 0
+
+NOT_FOLDED = {
+    "variable": "VISIBLE SUM OF x AN 1",
+    "raises": 'VISIBLE SUM OF "abc" AN 1',
+    "division by zero": "VISIBLE QUOSHUNT OF 1 AN 0",
+}
+
+@pytest.mark.parametrize("body", NOT_FOLDED.values(), ids=NOT_FOLDED.keys())
+def test_keeps_what_cannot_fold(body):
+    stmts, eliminated = optimized(body)
+    assert stmts[0][1][0] != "Integer"
+    assert eliminated == 0
+
+def test_removes_dead_expression_statement():
+    # IT is set again before anything reads it (a BOTH SAEM can't fail, a
+    # SUM OF can, on a YARN, and is kept)
+    stmts, eliminated = optimized("BOTH SAEM x AN 1\nx R 5\nBOTH SAEM x AN 5\nVISIBLE IT")
+    assert [stmt[0] for stmt in stmts] == ["ASSIGN", "BOOL_OPERATION", "PRINT"]
+    # BOOL_OPERATION, BOTH_SAEM and its two operands
+    assert eliminated == 4
+
+KEPT = {
+    # IT at the end of the block is what a function would return
+    "last": "SUM OF x AN 1",
+    # O RLY? reads IT
+    "read": "BOTH SAEM x AN 0\nO RLY?\nYA RLY\nVISIBLE 1\nOIC\nSUM OF x AN 1",
+    # it can fail, the error has to happen
+    "unsafe": "QUOSHUNT OF x AN 0\nSUM OF x AN 1",
+    # it names an undeclared variable, the compiler reports that
+    "undeclared": "SUM OF y AN 1\nSUM OF x AN 1",
+}
+
+@pytest.mark.parametrize("body", KEPT.values(), ids=KEPT.keys())
+def test_keeps_live_expression_statement(body):
+    stmts, eliminated = optimized(body)
+    assert len(stmts) == body.count("\n") + 1 - body.count("YA RLY") * 3
+    assert eliminated == 0
+
+def test_same_output_as_unoptimized():
+    code = ("HAI\nWAZZUP\nI HAS A x ITZ 2\nBUHBYE\nSUM OF x AN 1\nVISIBLE SUM OF 1 AN PRODUKT OF 2 AN 3\n"
+            "x R MAEK A \"12\" NUMBR\nVISIBLE SUM OF x AN 1\nKTHXBYE\n")
+    outputs = []
+    for optimize in (True, False):
+        lines = []
+        Interpreter(output=lines.append, optimize=optimize).run(*parse_source(code))
+        outputs.append(lines)
+    assert outputs[0] == outputs[1] == ["7", "13"]
+
+def test_run_stats(tmp_path, capsys):
+    path = tmp_path / "fold.lol"
+    path.write_text("HAI\nVISIBLE SUM OF 1 AN 2\nKTHXBYE\n", encoding="utf-8")
+    assert lolterpreter.main(["run", str(path), "--stats", "--no-cache"]) == 0
+    captured = capsys.readouterr()
+    assert captured.out == "3\n"
+    assert captured.err == "optimizer: 2 AST nodes eliminated\n"
+    assert lolterpreter.main(["run", str(path), "--no-cache"]) == 0
+    assert capsys.readouterr().err == ""
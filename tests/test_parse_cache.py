@@ -0,0 +1,82 @@
+import os
+import pytest
+import parse_cache
+from parse_cache import ParseCache, source_version
+from interpreter import parse_source
+
+SOURCE = 'HAI\nWAZZUP\nI HAS A x ITZ 2\nBUHBYE\nVISIBLE SUM OF x AN 1\nKTHXBYE\n'
+
+class Parses:
+    # counts how often the cache falls back to parsing
+    def __init__(self, code=SOURCE):
+        self.code = code
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return parse_source(self.code)
+
+def lookup(cache, parse):
+    return cache.lookup(cache.text_key(parse.code), parse)
+
+def test_disk_hit(tmp_path):
+    parse = Parses()
+    expected = lookup(ParseCache(tmp_path), parse)
+    # a new cache, so nothing in memory: the result comes from the .lolc file
+    cache = ParseCache(tmp_path)
+    assert lookup(cache, parse) == expected
+    assert parse.calls == 1
+    assert (cache.hits, cache.misses) == (1, 0)
+
+def test_memory_only(tmp_path):
+    parse = Parses()
+    cache = ParseCache(None)
+    lookup(cache, parse)
+    lookup(cache, parse)
+    assert parse.calls == 1
+    assert os.listdir(tmp_path) == []
+
+def test_version_mismatch(tmp_path, monkeypatch):
+    parse = Parses()
+    lookup(ParseCache(tmp_path), parse)
+    monkeypatch.setattr(parse_cache, "TAG", "lol0-py00")
+    cache = ParseCache(tmp_path)
+    assert lookup(cache, parse) == parse_source(SOURCE)
+    assert parse.calls == 2
+    assert cache.misses == 1
+
+@pytest.mark.parametrize("content", [b"", b"\xff\x00garbage", b"\xe9\x01\x00\x00\x00"],
+                         ids=["empty", "garbage", "not a pair"])
+def test_corrupt_file(tmp_path, content):
+    parse = Parses()
+    cache = ParseCache(tmp_path)
+    path = cache.path(cache.text_key(SOURCE))
+    os.makedirs(tmp_path, exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+    assert lookup(cache, parse) == parse_source(SOURCE)
+    assert parse.calls == 1
+    # the bad file was replaced by a good one
+    assert lookup(ParseCache(tmp_path), parse) == parse_source(SOURCE)
+    assert parse.calls == 1
+
+def test_symbols_are_copied(tmp_path):
+    cache = ParseCache(tmp_path)
+    ast, symbols = lookup(cache, Parses())
+    symbols["y"] = None
+    assert "y" not in lookup(cache, Parses())[1]
+
+def test_version_follows_parser_source(tmp_path):
+    paths = [os.path.join(parse_cache.HERE, name) for name in parse_cache.PARSER_SOURCES]
+    assert source_version(paths) == parse_cache.PARSER_VERSION
+    copies = []
+    for path in paths:
+        copy = tmp_path / os.path.basename(path)
+        with open(path, "rb") as f:
+            copy.write_bytes(f.read())
+        copies.append(copy)
+    assert source_version(copies) == parse_cache.PARSER_VERSION
+    # any edit to the parser gives a new version
+    with open(copies[1], "ab") as f:
+        f.write(b"\n# changed\n")
+    assert source_version(copies) != parse_cache.PARSER_VERSION
@@ -0,0 +1,99 @@
+import io
+import re
+import pytest
+from interpreter import Interpreter, parse_source
+from profiler import Profiler
+
+PROGRAM = """HAI
+WAZZUP
+    I HAS A n ITZ 0
+    I HAS A i ITZ 0
+BUHBYE
+IM IN YR loop UPPIN YR i TIL BOTH SAEM i AN 200
+    n R SUM OF n AN PRODUKT OF i AN i
+IM OUTTA YR loop
+VISIBLE n
+KTHXBYE
+"""
+
+def profiled(code=PROGRAM):
+    profiler = Profiler()
+    lines = []
+    Interpreter(output=lines.append, profiler=profiler).run(*parse_source(code))
+    return profiler, lines
+
+def test_counts_statements_and_operations():
+    profiler, lines = profiled()
+    assert lines == ["2646700"]
+    calls = {key: calls for key, calls, total, own in profiler.hottest()}
+    assert calls == {
+        (6, 1, "LOOP"): 1,
+        (7, 5, "ASSIGN"): 200,
+        (7, 9, "SUM_OF"): 200,
+        (7, 21, "PRODUKT_OF"): 200,
+        (9, 1, "PRINT"): 1,
+    }
+
+def test_own_and_total_times():
+    profiler, lines = profiled()
+    rows = profiler.hottest()
+    assert [row[3] for row in rows] == sorted((row[3] for row in rows), reverse=True)
+    stats = profiler.stats
+    # an operation's total includes its operands, a statement's its expression
+    assert stats[(7, 9, "SUM_OF")][1] >= stats[(7, 21, "PRODUKT_OF")][1]
+    assert stats[(7, 5, "ASSIGN")][1] >= stats[(7, 9, "SUM_OF")][1]
+    assert stats[(6, 1, "LOOP")][1] >= stats[(7, 5, "ASSIGN")][1]
+    for calls, total, own in stats.values():
+        assert 0 <= own <= total
+
+REPORT_ROW = re.compile(r"^ *\d+\.\d\d +\d+\.\d% +\d+\.\d\d +(\d+)  (\d+:\d+) +(.*)$")
+
+def test_report_lists_hot_lines():
+    profiler, lines = profiled()
+    out = io.StringIO()
+    profiler.report(out, top=3, source=PROGRAM)
+    header, *rows = out.getvalue().splitlines()
+    assert header.split() == ["own", "ms", "own", "%", "total", "ms", "calls", "line:col", "statement"]
+    assert len(rows) == 3
+    shown = {}
+    for row in rows:
+        match = REPORT_ROW.match(row)
+        assert match, row
+        calls, where, text = match.groups()
+        shown[where] = (int(calls), text)
+    expected = {
+        "6:1": (1, "IM IN YR loop UPPIN YR i TIL BOTH SAEM i AN 200"),
+        "7:5": (200, "n R SUM OF n AN PRODUKT OF i AN i"),
+        "7:9": (200, "SUM OF n AN PRODUKT OF i AN i"),
+        "7:21": (200, "PRODUKT OF i AN i"),
+        "9:1": (1, "VISIBLE n"),
+    }
+    for where, row in shown.items():
+        assert row == expected[where]
+
+def test_report_without_source_shows_tags():
+    profiler, lines = profiled()
+    out = io.StringIO()
+    profiler.report(out, top=10)
+    texts = sorted(REPORT_ROW.match(row).group(3) for row in out.getvalue().splitlines()[1:])
+    assert texts == ["ASSIGN", "LOOP", "PRINT", "PRODUKT_OF", "SUM_OF"]
+
+def test_collapsed_stacks():
+    profiler, lines = profiled()
+    out = io.StringIO()
+    profiler.write_collapsed(out)
+    stacks = {}
+    for line in out.getvalue().splitlines():
+        stack, value = line.rsplit(" ", 1)
+        assert value.isdigit()
+        stacks[stack] = int(value)
+    assert sorted(stacks) == [
+        "HAI;LOOP 6:1",
+        "HAI;LOOP 6:1;ASSIGN 7:5",
+        "HAI;LOOP 6:1;ASSIGN 7:5;SUM_OF 7:9",
+        "HAI;LOOP 6:1;ASSIGN 7:5;SUM_OF 7:9;PRODUKT_OF 7:21",
+        "HAI;PRINT 9:1",
+    ]
+    # own time in microseconds, adding up to the whole run
+    total = sum(total for key, calls, total, own in profiler.hottest() if key[2] in ("LOOP", "PRINT"))
+    assert sum(stacks.values()) == pytest.approx(total * 1e6, abs=len(stacks))
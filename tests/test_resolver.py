@@ -0,0 +1,87 @@
+import pytest
+import bytecode
+from interpreter import Interpreter, parse_source
+from resolver import resolve
+
+FUNCTIONS = """HAI
+WAZZUP
+    I HAS A total ITZ 0
+BUHBYE
+HOW IZ I twice YR n
+    FOUND YR PRODUKT OF n AN 2
+IF U SAY SO
+HOW IZ I quad YR n
+    FOUND YR I IZ twice YR I IZ twice YR n
+IF U SAY SO
+HOW IZ I shout YR n
+    VISIBLE n
+    FOUND YR n
+IF U SAY SO
+HOW IZ I ask YR n
+    GIMMEH n
+    FOUND YR n
+IF U SAY SO
+HOW IZ I plus_total YR n
+    FOUND YR SUM OF n AN total
+IF U SAY SO
+HOW IZ I loud_twice YR n
+    FOUND YR I IZ shout YR I IZ twice YR n
+IF U SAY SO
+HOW IZ I even YR n
+    BOTH SAEM n AN 0
+    O RLY?
+        YA RLY
+            FOUND YR WIN
+    OIC
+    FOUND YR I IZ odd YR DIFF OF n AN 1
+IF U SAY SO
+HOW IZ I odd YR n
+    BOTH SAEM n AN 0
+    O RLY?
+        YA RLY
+            FOUND YR FAIL
+    OIC
+    FOUND YR I IZ even YR DIFF OF n AN 1
+IF U SAY SO
+VISIBLE I IZ quad YR 3
+KTHXBYE
+"""
+
+def scope_of(code):
+    ast, symbols = parse_source(code)
+    return ast, resolve(symbols, ast)
+
+def test_slots():
+    # program variables first (IT, then WAZZUP), then every function's IT and parameters
+    ast, scope = scope_of(FUNCTIONS)
+    assert scope.slots == {"IT": 0, "total": 1}
+    twice = scope.functions["twice"]
+    assert (twice.start, twice.count, twice.slots) == (2, 2, {"IT": 2, "n": 3})
+    assert scope.names[:6] == ["IT", "total", "IT", "n", "IT", "n"]
+    assert len(scope.frame()) == 2 + 2 * len(scope.functions)
+
+def test_pure_functions():
+    ast, scope = scope_of(FUNCTIONS)
+    pure = {name for name, function in scope.functions.items() if function.pure}
+    # shout prints, ask reads, plus_total reads a global, loud_twice calls shout
+    assert pure == {"twice", "quad", "even", "odd"}
+
+def test_recursive_functions():
+    ast, scope = scope_of(FUNCTIONS)
+    recursive = {name for name, function in scope.functions.items() if function.recursive}
+    assert recursive == {"even", "odd"}
+
+def test_memo_only_for_pure_functions():
+    ast, scope = scope_of(FUNCTIONS)
+    code = bytecode.compile_program(ast, scope, memoize=True)
+    memoized = {name for name, entry, start, count, memo in code.functions if memo is not None}
+    assert memoized == {name for name, function in scope.functions.items() if function.pure}
+
+@pytest.mark.parametrize("engine", ["closures", "vm"])
+def test_impure_calls_run_every_time(engine):
+    code = FUNCTIONS.replace("VISIBLE I IZ quad YR 3",
+                             "VISIBLE I IZ loud_twice YR 1\nVISIBLE I IZ loud_twice YR 1\nVISIBLE I IZ even YR 7")
+    ast, symbols = parse_source(code)
+    lines = []
+    Interpreter(output=lines.append, engine=engine, memoize=True).run(ast, symbols)
+    assert lines == ["2", "2", "2", "2", "FAIL"]
@@ -0,0 +1,54 @@
+import os
+import pytest
+from interpreter import Interpreter, parse_source
+
+# the programs in project-testcases/, run with piped GIMMEH answers
+TESTCASES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "project-testcases")
+
+def run(name, answers, engine):
+    # the VISIBLE lines the program prints
+    with open(os.path.join(TESTCASES, name), encoding="utf-8") as f:
+        ast, symbols = parse_source(f.read())
+    lines = []
+    answers = iter(answers)
+    Interpreter(output=lines.append, input=lambda name: next(answers), engine=engine).run(ast, symbols)
+    return lines
+
+ENGINES = pytest.mark.parametrize("engine", ["closures", "vm"])
+
+@ENGINES
+def test_comparison(engine):
+    # x >= y, x <= y, x < y, x > y of two GIMMEH answers
+    assert run("06_comparison.lol", ["4", "3"], engine)[2:] == [
+        "FAIL", "WIN", "WIN", "FAIL", "FAIL", "WIN"]
+    assert run("06_comparison.lol", ["3", "3"], engine)[2:] == [
+        "WIN", "FAIL", "WIN", "WIN", "FAIL", "FAIL"]
+
+# GIMMEH choice, then the answer the branch it takes asks for
+MENU = [("1", "Enter birth year: ", "2017"), ("2", "Invalid Input!", None), ("3", "Invalid Input!", None),
+        ("0", "Invalid Input!", None), ("7", "Invalid Input!", None)]
+
+@ENGINES
+@pytest.mark.parametrize("choice, first, last", MENU)
+def test_ifelse(engine, choice, first, last):
+    # without MEBBE (commented out in the file) only 1 is a valid choice
+    lines = run("07_ifelse.lol", [choice, "5"], engine)
+    assert lines[5] == first
+    if last is not None:
+        assert lines[6] == last
+    assert ("Invalid input is > 3." in lines) == (choice == "7")
+
+SWITCH = [("1", ["Enter birth year: ", "2017"]), ("2", ["Enter bill cost: ", "Tip: 0.50"]),
+          ("3", ["Enter width: ", "Square Area: 25"]), ("0", ["Goodbye", "Invalid Input!"]),
+          ("9", ["Invalid Input!"])]
+
+@ENGINES
+@pytest.mark.parametrize("choice, taken", SWITCH)
+def test_switch(engine, choice, taken):
+    # OMG 0 has no GTFO, it falls through to OMGWTF
+    assert run("08_switch.lol", [choice, "5"], engine)[5:] == taken
+
+@ENGINES
+def test_functions(engine):
+    # addNum's FOUND YR, printName's GTFO (NOOB), printNum's argument
+    assert run("10_functions.lol", ["1", "2", "Bob"], engine) == ["3", "Hello, Bob", "NOOB", "3"]
@@ -0,0 +1,449 @@
+import re
+import spans
+from lol_runtime import RuntimeError, yarn_number, located
+
+# numpy is optional, without it batch.py only has the scalar engines
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Vectorized engine for batch.py: straight-line programs (GIMMEH, assignments,
+# math, VISIBLE, no loops) run once over a whole chunk of records, every
+# variable holding a numpy array with one element per record.
+#
+# LOLCODE types are per value, numpy types are per array, so records are
+# first grouped by what their GIMMEH answers are (NUMBR, NUMBAR or other YARN)
+# and each group is run on its own. Inside a group every value then has the
+# same type on every record, and arith/bool_op/compare below only have to
+# pick the numpy operation once per statement.
+#
+# Runtime errors are per record: the record stops printing and keeps the
+# message, located like the scalar engines' (spans.py), the others carry on.
+# Anything numpy can't reproduce exactly
+# (NUMBRs near int64's limits, YARNs of mixed types, ...) raises Fallback and
+# that group goes through the scalar interpreter instead.
+
+class Fallback(Exception): ...
+
+STMT_TAGS = ("INPUT", "ASSIGN", "PERM_CAST", "ARITH_OPERATION", "BOOL_OPERATION", "EXPRESSION", "PRINT")
+ARITH_TAGS = ("SUM_OF", "DIFF_OF", "PRODUKT_OF", "QUOSHUNT_OF", "MOD_OF", "BIGGR_OF", "SMALLR_OF")
+BOOL_TAGS = ("BOTH_OF", "EITHER_OF", "WON_OF")
+LITERAL_TAGS = ("Integer", "Float", "String", "Boolean")
+EXPR_TAGS = ("Identifier", "CAST", "NOT", "ALL_OF", "ANY_OF", "BOTH_SAEM", "DIFFRINT", "CONCATENATE") \
+    + ARITH_TAGS + BOOL_TAGS + LITERAL_TAGS
+
+# NUMBRs stay well inside int64 so no operation can wrap around
+INT_LIMIT = 2 ** 62
+# NUMBRs compared to NUMBARs must convert to float exactly
+EXACT_FLOAT = 2 ** 53
+# deepest expression vectorized
+MAX_DEPTH = 200
+
+def available():
+    return np is not None
+
+def vectorizable(ast):
+    # ("PROGRAM", <declarations>, ("STATEMENT_LIST", ...))
+    for stmt in ast[2][1:]:
+        tag = stmt[0]
+        if tag not in STMT_TAGS:
+            return False
+        if tag == "ASSIGN" and not expr_ok(stmt[2][1]):
+            return False
+        if tag in ("ARITH_OPERATION", "BOOL_OPERATION", "EXPRESSION") and not expr_ok(stmt[1]):
+            return False
+        if tag == "PRINT" and not all(expr_ok(child) for child in stmt[1:]):
+            return False
+    return True
+
+def expr_ok(tup):
+    # Group.expr recurses, so deeply nested expressions are left to the
+    # scalar engines, which don't
+    stack = [(tup, 1)]
+    while stack:
+        tup, depth = stack.pop()
+        if tup[0] not in EXPR_TAGS or depth > MAX_DEPTH:
+            return False
+        if tup[0] in LITERAL_TAGS or tup[0] == "Identifier":
+            continue
+        children = (tup[1],) if tup[0] == "CAST" else tup[1:]
+        stack.extend((child, depth + 1) for child in children)
+    return True
+
+class Column:
+    # one variable's values across a group of records. kind is the LOLCODE
+    # type name, data a numpy array (None for NOOB). A YARN may also carry
+    # numeric, its (kind, data) as a number, or ("ERROR", None) when it isn't one
+    __slots__ = ("kind", "data", "numeric")
+
+    def __init__(self, kind, data, numeric=None):
+        self.kind = kind
+        self.data = data
+        self.numeric = numeric
+
+# GIMMEH answers are sorted into these
+YARN_NUMBR, YARN_NUMBAR, YARN_OTHER = 0, 1, 2
+
+# lol_runtime's NUMBR_YARN and NUMBAR_YARN in one match, group 1 is a NUMBR
+YARN_NUMBER = re.compile(r'(-?\d+)|-?(?:\d+\.\d*|\.\d+)')
+
+def classify(s):
+    m = YARN_NUMBER.fullmatch(s)
+    if m is None: return YARN_OTHER
+    return YARN_NUMBR if m.lastindex else YARN_NUMBAR
+
+def int_array(values):
+    try:
+        data = np.array(values, dtype=np.int64)
+    except OverflowError:
+        raise Fallback()
+    check_ints(data)
+    return data
+
+def check_ints(data):
+    if data.size and (data.max() >= INT_LIMIT or data.min() <= -INT_LIMIT):
+        raise Fallback()
+
+class VectorProgram:
+    def __init__(self, ast, symbols):
+        self.stmts = ast[2][1:]
+        self.positions = spans.unpack(ast)
+        self.symbols = dict(symbols or {})
+        self.gimmehs = sum(1 for stmt in self.stmts if stmt[0] == "INPUT")
+
+    def run_chunk(self, records, scalar):
+        # (output, error) for every record, like batch.RecordRunner.run;
+        # scalar(record) runs one record the ordinary way
+        n = len(records)
+        fields = []
+        signature = np.zeros(n, dtype=np.int64)
+        for k in range(self.gimmehs):
+            answers = [record[k] if k < len(record) else "" for record in records]
+            kinds = np.fromiter(map(classify, answers), dtype=np.int64, count=n)
+            fields.append((np.array(answers, dtype=object), kinds))
+            signature = signature * 3 + kinds
+
+        results = [None] * n
+        keys, group_of = np.unique(signature, return_inverse=True)
+        for g in range(len(keys)):
+            rows = np.flatnonzero(group_of == g)
+            try:
+                inputs = [self.input_column(answers[rows], kinds[rows[0]]) for answers, kinds in fields]
+                with np.errstate(all="ignore"):
+                    group = Group(len(rows), self.positions).run(self.stmts, self.symbols, inputs)
+            except Fallback:
+                group = [scalar(records[i]) for i in rows]
+            for i, result in zip(rows.tolist(), group):
+                results[i] = result
+        return results
+
+    def input_column(self, answers, kind):
+        if kind == YARN_NUMBR:
+            numeric = ("NUMBR", int_array([int(s) for s in answers]))
+        elif kind == YARN_NUMBAR:
+            numeric = ("NUMBAR", np.array([float(s) for s in answers], dtype=np.float64))
+        else:
+            numeric = ("ERROR", None)
+        return Column("YARN", answers, numeric)
+
+class Group:
+    # runs the statements once for n records of the same input types
+    def __init__(self, n, positions=()):
+        self.n = n
+        self.alive = np.ones(n, dtype=bool)
+        self.errors = np.full(n, None, dtype=object)
+        self.constants = {}     # literals, built once per group
+        self.spans = spans.Cursor(positions)
+        self.position = None    # of the operation that fails records
+
+    def run(self, stmts, symbols, inputs):
+        frame = {"IT": self.constant(None)}
+        for name, value in symbols.items():
+            frame[name] = self.constant(value)
+        printed = []    # (line per record, who was still running) per VISIBLE
+        inputs = iter(inputs)
+        for stmt in stmts:
+            if not self.alive.any():
+                break
+            tag = stmt[0]
+            position = self.spans.take(stmt)
+            if tag == "INPUT":
+                frame[stmt[1]] = next(inputs)
+            elif tag == "ASSIGN":
+                frame[stmt[1][1]] = self.expr(stmt[2][1], frame)
+            elif tag == "PERM_CAST":
+                name = stmt[1][1]
+                self.position = position
+                frame[name] = self.cast(frame[name], stmt[2][1])
+            elif tag == "PRINT":
+                parts = [self.yarn_list(self.expr(child, frame)) for child in stmt[1:]]
+                line = parts[0] if len(parts) == 1 else list(map("".join, zip(*parts)))
+                printed.append((line, None if self.alive.all() else self.alive.copy()))
+            else:
+                frame["IT"] = self.expr(stmt[1], frame)
+        return self.results(printed)
+
+    def results(self, printed):
+        lines = [line for line, mask in printed]
+        if self.alive.all():
+            if not lines:
+                return [([], None) for _ in range(self.n)]
+            return [(list(output), None) for output in zip(*lines)]
+        outputs = [list(output) for output in zip(*lines)] if lines else [[] for _ in range(self.n)]
+        # records that stopped early only keep what they printed before that
+        for i in np.flatnonzero(~self.alive).tolist():
+            outputs[i] = [line[i] for line, mask in printed if mask is None or mask[i]]
+        return list(zip(outputs, self.errors.tolist()))
+
+    def fail(self, rows, message):
+        # rows (bool array) stop with message (str or one per record)
+        rows = rows & self.alive
+        if rows.any():
+            if type(message) is str:
+                self.errors[rows] = located(message, self.position)
+            else:
+                self.errors[rows] = np.array([located(m, self.position) for m in message[rows]], dtype=object)
+            self.alive &= ~rows
+
+    # ------------------------------------------------------------ values
+    def constant(self, value):
+        # columns are never changed in place, so one per literal will do;
+        # repr keeps 0.0 and -0.0 apart
+        key = (type(value), repr(value))
+        col = self.constants.get(key)
+        if col is None:
+            col = self.constants[key] = self.new_constant(value)
+        return col
+
+    def new_constant(self, value):
+        t = type(value)
+        n = self.n
+        if value is None:
+            return Column("NOOB", None)
+        if t is bool:
+            return Column("TROOF", np.full(n, value, dtype=bool))
+        if t is int:
+            return Column("NUMBR", int_array([value]).repeat(n))
+        if t is float:
+            return Column("NUMBAR", np.full(n, value, dtype=np.float64))
+        try:
+            number = self.constant(yarn_number(value))
+            numeric = (number.kind, number.data)
+        except RuntimeError:
+            numeric = ("ERROR", None)
+        return Column("YARN", np.full(n, value, dtype=object), numeric)
+
+    def expr(self, tup, frame):
+        tag = tup[0]
+        if tag == "Identifier":
+            return frame[tup[1]]
+        if tag in LITERAL_TAGS:
+            return self.constant(tup[1])
+        position = self.spans.take(tup)
+        if tag in ARITH_TAGS:
+            a = self.expr(tup[1], frame)
+            b = self.expr(tup[2], frame)
+            self.position = position
+            return self.arith(tag, a, b)
+        if tag in BOOL_TAGS:
+            return self.bool_op(tag, self.expr(tup[1], frame), self.expr(tup[2], frame))
+        if tag == "NOT":
+            return Column("TROOF", ~self.troof(self.expr(tup[1], frame)))
+        if tag in ("ALL_OF", "ANY_OF"):
+            values = [self.troof(self.expr(child, frame)) for child in tup[1:]]
+            combine = np.logical_and if tag == "ALL_OF" else np.logical_or
+            return Column("TROOF", combine.reduce(values))
+        if tag in ("BOTH_SAEM", "DIFFRINT"):
+            return self.compare(tag, self.expr(tup[1], frame), self.expr(tup[2], frame))
+        if tag == "CONCATENATE":
+            parts = [self.yarn_list(self.expr(child, frame)) for child in tup[1:]]
+            return Column("YARN", self.strings(map("".join, zip(*parts))))
+        # ("CAST", <expression>, ("Target Type", type))
+        value = self.expr(tup[1], frame)
+        self.position = position
+        return self.cast(value, tup[2][1])
+
+    # ------------------------------------------------------------ math
+    def number(self, col):
+        # lol_runtime.number over a column, (kind, data) with kind NUMBR or NUMBAR
+        kind = col.kind
+        if kind == "NUMBR" or kind == "NUMBAR":
+            return kind, col.data
+        if kind == "TROOF":
+            return "NUMBR", col.data.astype(np.int64)
+        if kind == "NOOB":
+            self.fail(self.alive, "Runtime Error: Cannot implicitly cast NOOB to digit ")
+            return "NUMBR", np.zeros(self.n, dtype=np.int64)
+        numeric = col.numeric or self.parse(col.data)
+        if numeric[0] == "ERROR":
+            messages = np.array([f"Runtime Error: Cannot implicitly cast `{s}` to digit " for s in col.data], dtype=object)
+            self.fail(self.alive, messages)
+            return "NUMBR", np.zeros(self.n, dtype=np.int64)
+        return numeric
+
+    def parse(self, strings):
+        # a YARN built while running (SMOOSH, MAEK ... YARN), one type or give up
+        kinds = set()
+        values = []
+        for s, alive in zip(strings.tolist(), self.alive.tolist()):
+            if not alive:
+                values.append(0)
+                continue
+            try:
+                value = yarn_number(s)
+            except RuntimeError:
+                kinds.add("ERROR")
+                values.append(0)
+                continue
+            kinds.add(type(value))
+            values.append(value)
+        if kinds == {"ERROR"}:
+            return "ERROR", None
+        if kinds == {int}:
+            return "NUMBR", int_array(values)
+        if kinds == {float}:
+            return "NUMBAR", np.array(values, dtype=np.float64)
+        raise Fallback()
+
+    def arith(self, op, a, b):
+        ka, a = self.number(a)
+        kb, b = self.number(b)
+        if ka == "NUMBR" and kb == "NUMBR":
+            return Column("NUMBR", self.int_math(op, a, b))
+        return Column("NUMBAR", self.float_math(op, a.astype(np.float64), b.astype(np.float64)))
+
+    def divisor(self, b):
+        # division by zero stops those records, the rest divide by b
+        zero = b == 0
+        if zero.any():
+            self.fail(zero, "Runtime Error: Division by zero")
+            b = np.where(zero, 1, b)
+        return b
+
+    def int_math(self, op, a, b):
+        # same results as lol_runtime.INT_FUNCS
+        if op == "SUM_OF": result = a + b
+        elif op == "DIFF_OF": result = a - b
+        elif op == "PRODUKT_OF":
+            # checked in floats first, int64 would silently wrap
+            if (np.abs(a.astype(np.float64) * b) >= INT_LIMIT).any():
+                raise Fallback()
+            result = a * b
+        elif op == "BIGGR_OF": result = np.where(b > a, b, a)
+        elif op == "SMALLR_OF": result = np.where(b < a, b, a)
+        else:
+            b = self.divisor(b)
+            q = np.abs(a) // np.abs(b)
+            q = np.where((a < 0) == (b < 0), q, -q)
+            result = q if op == "QUOSHUNT_OF" else a - b * q
+        check_ints(result)
+        return result
+
+    def float_math(self, op, a, b):
+        # same results as lol_runtime.ARITH_FUNCS
+        if op == "SUM_OF": return a + b
+        if op == "DIFF_OF": return a - b
+        if op == "PRODUKT_OF": return a * b
+        if op == "BIGGR_OF": return np.where(b > a, b, a)
+        if op == "SMALLR_OF": return np.where(b < a, b, a)
+        b = self.divisor(b)
+        if op == "QUOSHUNT_OF":
+            return a / b
+        # math.fmod raises on an infinite dividend, np.fmod doesn't
+        if not np.isfinite(a[self.alive]).all():
+            raise Fallback()
+        return np.fmod(a, b)
+
+    # ------------------------------------------------------------ TROOF
+    def troof(self, col):
+        kind = col.kind
+        if kind == "TROOF": return col.data
+        if kind == "NOOB": return np.zeros(self.n, dtype=bool)
+        if kind == "YARN": return col.data != ""
+        return col.data != 0
+
+    def bool_op(self, op, a, b):
+        a = self.troof(a)
+        b = self.troof(b)
+        if op == "BOTH_OF": return Column("TROOF", a & b)
+        if op == "EITHER_OF": return Column("TROOF", a | b)
+        return Column("TROOF", a != b)
+
+    def compared(self, col):
+        # lol_runtime.yarn_compared: a YARN column of numbers as that number
+        if col.kind != "YARN":
+            return col
+        numeric = col.numeric or self.parse(col.data)
+        if numeric[0] == "ERROR":
+            return col
+        return Column(*numeric)
+
+    def saem(self, a, b):
+        # lol_runtime.saem: same type and equal, NUMBR, NUMBAR and numeric
+        # YARNs compare as numbers
+        a = self.compared(a)
+        b = self.compared(b)
+        if a.kind == b.kind:
+            if a.kind == "NOOB":
+                return np.ones(self.n, dtype=bool)
+            return np.asarray(a.data == b.data, dtype=bool)
+        numbers = ("NUMBR", "NUMBAR")
+        if a.kind in numbers and b.kind in numbers:
+            ints = a.data if a.kind == "NUMBR" else b.data
+            if ints.size and np.abs(ints).max() > EXACT_FLOAT:
+                raise Fallback()
+            return a.data == b.data
+        return np.zeros(self.n, dtype=bool)
+
+    def compare(self, op, a, b):
+        same = self.saem(a, b)
+        return Column("TROOF", same if op == "BOTH_SAEM" else ~same)
+
+    # ------------------------------------------------------------ YARN
+    def yarn_list(self, col):
+        # lol_runtime.yarn, as a list of str
+        kind = col.kind
+        if kind == "YARN": return col.data.tolist()
+        if kind == "NUMBR": return list(map(str, col.data.tolist()))
+        if kind == "NUMBAR": return list(map("%.2f".__mod__, col.data.tolist()))
+        if kind == "TROOF": return [("FAIL", "WIN")[v] for v in col.data.tolist()]
+        return ["NOOB"] * self.n
+
+    def yarn(self, col):
+        # the same, as a YARN column's object array
+        if col.kind == "YARN":
+            return col.data
+        return self.strings(self.yarn_list(col))
+
+    def strings(self, values):
+        # object array from an iterable of str, quicker than numpy's own str conversions
+        return np.fromiter(values, dtype=object, count=self.n)
+
+    def cast(self, col, target):
+        # lol_runtime.cast
+        if target == "TROOF":
+            return Column("TROOF", self.troof(col))
+        if target == "NOOB":
+            return Column("NOOB", None)
+        if col.kind == "NOOB":
+            if target == "NUMBR": return self.constant(0)
+            if target == "NUMBAR": return self.constant(0.0)
+            if target == "YARN": return self.constant("")
+            return col
+        if target == "NUMBR":
+            kind, data = self.number(col)
+            if kind == "NUMBAR":
+                data = np.where(self.alive, data, 0)
+                if not np.isfinite(data).all():
+                    raise Fallback()
+                data = np.trunc(data)
+                check_ints(data)
+                data = data.astype(np.int64)
+            return Column("NUMBR", data)
+        if target == "NUMBAR":
+            kind, data = self.number(col)
+            return Column("NUMBAR", data.astype(np.float64))
+        if target == "YARN":
+            return Column("YARN", self.yarn(col))
+        return col